@@ -0,0 +1,52 @@
+import json
+import os
+from typing import Any, Callable
+
+BACKENDS = ('orjson', 'ujson', 'json')     # in order of preference
+
+
+class JsonCodec:
+    """ JSON serialization backend """
+
+    def __init__(self, name: str, loads: Callable[[str | bytes], Any], dumps: Callable[[Any], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return f'<JsonCodec {self.name}>'
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """
+    Build the codec by backend name
+
+    :param name: one of ``BACKENDS``; the fastest installed one if not provided
+    :raise ImportError: if the requested backend isn't installed
+    :raise ValueError: if the backend is unknown
+    """
+    if name is None:
+        for backend in BACKENDS:
+            try:
+                return get_codec(backend)
+            except ImportError:
+                continue
+
+    match name:
+        case 'orjson':
+            import orjson
+            return JsonCodec(
+                name,
+                loads=orjson.loads,
+                dumps=lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode(),
+            )
+        case 'ujson':
+            import ujson
+            return JsonCodec(name, loads=ujson.loads, dumps=lambda obj: ujson.dumps(obj, ensure_ascii=False))
+        case 'json':
+            return JsonCodec(name, loads=json.loads, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+        case _:
+            raise ValueError(f'Unknown JSON backend: {name}')
+
+
+codec = get_codec(os.environ.get('JSON_CODEC'))
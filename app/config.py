@@ -1,48 +1,98 @@
 import os
 from dataclasses import dataclass
-import logging
-import sys
+from functools import cache, cached_property
+from typing import ClassVar
 
 from pathlib import Path
-import ujson
 
 from .exceptions import ArgumentError, ConfigurationError
+from .snapshot import load_with_snapshot, source_digest
 
 DEBUG = False        # False if running by Docker
-if DEBUG:
-    from dotenv import load_dotenv
-    load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / 'app' / 'data'
+HS_ENTITIES_SOURCE = DATA_DIR / 'hs_entities.json'
+HS_ENTITIES_SNAPSHOT = DATA_DIR / 'hs_entities.pickle'
 
 MAX_CARD_NAME_LENGTH = 30
 MAX_CARDS_IN_RESPONSE = 90
 MAX_DECKS_IN_RESPONSE = 90
-
-logger = logging.getLogger('app')
-logging.basicConfig(
-    level=logging.INFO,
-    format='{asctime} | {levelname:^8s} | {name:^34s} : : : {message}',
-    style='{',
-)
+PAGINATION_DEBOUNCE_WINDOW = 0.3     # seconds to coalesce rapid page flips
+CALLBACK_ANSWER_BUDGET = 0.5         # seconds a handler has to answer a callback query by itself
+UPDATE_DEADLINE = 30                 # seconds to process an update before the work is abandoned
+RESPONSE_CACHE_TTL = 600             # seconds a cached API response is fresh
+RESPONSE_CACHE_STALE_TTL = 86400     # seconds a stale API response may be served while the API is down
+RESPONSE_CACHE_SIZE = 2048
+LIST_CACHE_TTL = 60                  # seconds a cached card or deck list is fresh, new cards and decks show up
+LIST_CACHE_STALE_TTL = 600           # seconds a stale list may be served while the API is down
+EVENT_LOOPS = ('asyncio', 'uvloop', 'auto')     # auto is uvloop if it's installed
+PREFETCH_CONCURRENCY = 4             # max API requests in flight for all prefetches
 
 
 @dataclass(frozen=True)
 class TgBot:
     TOKEN: str
     ADMIN_ID: int
+    EVENT_LOOP: str     # one of EVENT_LOOPS
+    DRAIN_TIMEOUT: float    # seconds the shutdown waits for the updates in flight
 
 
 @dataclass(frozen=True)
 class RedisConf:
     PASSWORD: str
     MSG_IDS: list[str]
+    POOL_SIZE: int                  # max connections
+    HEALTH_CHECK_INTERVAL: int      # seconds a connection may idle before it's pinged on use
+    CONNECT_ATTEMPTS: int           # pings on startup before falling back to the memory storage
+    CONNECT_BACKOFF_BASE: float     # seconds, doubled for every next ping
+    CONNECT_BACKOFF_MAX: float      # seconds
+    STATE_TTL: int                  # seconds the state of an idle user is kept, 0 to keep it forever
+
+
+@dataclass(frozen=True)
+class EndpointTimeouts:
+    CONNECT: float      # seconds to establish a connection
+    READ: float         # seconds between chunks of the response
+    TOTAL: float        # seconds for a single attempt
 
 
 @dataclass(frozen=True)
 class HsDeckHelperAPI:
     DOMAIN: str
+    TIMEOUTS: dict[str, EndpointTimeouts]   # by endpoint family, plus ``default``
+    DEADLINE: float             # seconds for the whole request including retries
+    RETRIES: int                # extra attempts for idempotent requests
+    BACKOFF_BASE: float         # seconds, doubled for every next retry
+    BACKOFF_MAX: float          # seconds
+    BREAKER_THRESHOLD: int      # consecutive failures that open the circuit
+    BREAKER_COOLDOWN: float     # seconds before a trial request to the open circuit
+
+
+@dataclass(frozen=True)
+class MonitoringConf:
+    HOST: str
+    PORT: int       # port of the /metrics endpoint, 0 to disable it
+    TRACE_SAMPLE_RATE: float    # share of the update traces logged in OTLP/JSON
+    SLOW_UPDATE: float          # seconds, the span breakdown of slower updates is logged; 0 to disable
+    READINESS_INTERVAL: float   # seconds between the checks of the dependencies served on /ready
+    READINESS_TIMEOUT: float    # seconds for a single check
+
+
+@dataclass(frozen=True)
+class StreamsConf:
+    PREFIX: str         # the updates of partition N go to the stream ``PREFIX:N``
+    PARTITIONS: int     # chats are spread over the partitions, a partition is read by a single worker
+    MAXLEN: int         # approximate max entries kept in a stream
+    BATCH: int          # max entries a worker reads at once
+    CONCURRENCY: int    # max entries a worker handles at once, the entries of a chat are handled in order
+    CLAIM_IDLE: float   # seconds an entry left pending by another worker waits before it's taken over
+
+
+@dataclass(frozen=True)
+class CacheConf:
+    SNAPSHOT_DIR: Path | None   # where the response cache is saved to start warm after a restart; None to disable
+    SNAPSHOT_INTERVAL: float    # seconds between the saves, it's saved on shutdown as well
 
 
 @dataclass(frozen=True)
@@ -50,6 +100,9 @@ class Config:
     bot: TgBot
     storage: RedisConf
     api: HsDeckHelperAPI
+    monitoring: MonitoringConf
+    streams: StreamsConf
+    cache: CacheConf
 
 
 @dataclass(frozen=True)
@@ -98,6 +151,10 @@ class HSEntities:
     card_digit_params: list[str]
     deck_params: list[str]
 
+    # Tables whose entities are referred to by their index (code) in cached responses and FSM state.
+    # Codes are valid for the same hs_entities.json only: the FSM keys and the cache snapshot carry its version
+    CATEGORIES: ClassVar[tuple[str, ...]] = ('types', 'classes', 'rarities', 'sets', 'formats')
+
     def gettype(self, sign: str = None, name: str = None) -> HSType:
         """
         Search card type object by english ``name`` **or** ``sign``.
@@ -136,20 +193,79 @@ class HSEntities:
             return next(r for r in self.rarities if r.en == name)
         raise ArgumentError('One of the parameters (sign, name) must be provided')
 
+    @cached_property
+    def codes(self) -> dict[str, dict[str, int]]:
+        """ Codes of the entities by their english names, for each of ``CATEGORIES`` """
+        return {table: {entity.en: code for code, entity in enumerate(getattr(self, table))}
+                for table in self.CATEGORIES}
+
+    def encode(self, table: str, name: str) -> int | str:
+        """
+        Return the code of the entity
+
+        :param table: one of ``CATEGORIES``, f.e. ``rarities``
+        :param name: english name of the entity
+        :return: code, or the name itself if the entity is unknown
+        """
+        return self.codes[table].get(name, name)
+
+    def entity(self, table: str, value: int | str | None):
+        """
+        Return the entity by its code or english name
+
+        :param table: one of ``CATEGORIES``, f.e. ``rarities``
+        :param value: code or english name
+        :return: HSType, HSRarity etc, or None if the entity is unknown
+        """
+        entities = getattr(self, table)
+        if isinstance(value, str):
+            value = self.codes[table].get(value)
+        if isinstance(value, int) and 0 <= value < len(entities):
+            return entities[value]
+        return None
+
+    def label(self, table: str, value: int | str | None) -> str:
+        """ English name of the entity by its code or name. Unknown names are returned as is """
+        entity = self.entity(table, value)
+        if entity is not None:
+            return entity.en
+        return str(value)
+
+
+def load_timeouts(family: str, default: str) -> EndpointTimeouts:
+    """
+    Load timeouts of the API endpoint family
+
+    :param family: endpoint family, f.e. ``cards``
+    :param default: ``connect,read,total`` seconds used if HDH_API_<FAMILY>_TIMEOUTS isn't set
+    """
+    connect, read, total = map(float, os.environ.get(f'HDH_API_{family.upper()}_TIMEOUTS', default).split(','))
+    return EndpointTimeouts(CONNECT=connect, READ=read, TOTAL=total)
+
 
 def load_config() -> Config:
     """ Load and return bot configuration data """
+    if DEBUG:
+        from dotenv import load_dotenv
+        load_dotenv()
+
     token = os.environ.get('TOKEN')
     admin_id = os.environ.get('ADMIN_ID')
     api_domain = os.environ.get('HDH_API_DOMAIN')
     redis_password = os.environ.get('REDIS_HOST_PASSWORD')
     if not all([token, admin_id, api_domain]):
         raise ConfigurationError("Couldn't load environment variables")
+    event_loop = os.environ.get('EVENT_LOOP', 'asyncio')
+    if event_loop not in EVENT_LOOPS:
+        raise ConfigurationError(f'EVENT_LOOP must be one of {", ".join(EVENT_LOOPS)}, got {event_loop!r}')
+    snapshot_dir = os.environ.get('CACHE_SNAPSHOT_DIR', str(BASE_DIR / 'snapshots'))
 
     return Config(
         bot=TgBot(
             TOKEN=token,
             ADMIN_ID=int(admin_id),
+            EVENT_LOOP=event_loop,
+            DRAIN_TIMEOUT=float(os.environ.get('DRAIN_TIMEOUT', 20)),
         ),
         storage=RedisConf(
             PASSWORD=redis_password,
@@ -160,42 +276,104 @@ def load_config() -> Config:
                 'deck_request_msg_id',
                 'deck_prompt_msg_id',
                 'deck_response_msg_id',
-            ]
+            ],
+            POOL_SIZE=int(os.environ.get('REDIS_POOL_SIZE', 10)),
+            HEALTH_CHECK_INTERVAL=int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+            CONNECT_ATTEMPTS=int(os.environ.get('REDIS_CONNECT_ATTEMPTS', 5)),
+            CONNECT_BACKOFF_BASE=float(os.environ.get('REDIS_CONNECT_BACKOFF_BASE', 0.5)),
+            CONNECT_BACKOFF_MAX=float(os.environ.get('REDIS_CONNECT_BACKOFF_MAX', 5)),
+            STATE_TTL=int(os.environ.get('REDIS_STATE_TTL', 7 * 24 * 3600)),
         ),
         api=HsDeckHelperAPI(
             DOMAIN=api_domain,
-        )
+            TIMEOUTS={
+                'default': load_timeouts('default', '3,10,10'),
+                'cards': load_timeouts('cards', '3,5,5'),
+                'decks': load_timeouts('decks', '3,10,10'),
+            },
+            DEADLINE=float(os.environ.get('HDH_API_DEADLINE', 10)),
+            RETRIES=int(os.environ.get('HDH_API_RETRIES', 2)),
+            BACKOFF_BASE=float(os.environ.get('HDH_API_BACKOFF_BASE', 0.2)),
+            BACKOFF_MAX=float(os.environ.get('HDH_API_BACKOFF_MAX', 2)),
+            BREAKER_THRESHOLD=int(os.environ.get('HDH_API_BREAKER_THRESHOLD', 5)),
+            BREAKER_COOLDOWN=float(os.environ.get('HDH_API_BREAKER_COOLDOWN', 30)),
+        ),
+        monitoring=MonitoringConf(
+            HOST=os.environ.get('MONITORING_HOST', '0.0.0.0'),
+            PORT=int(os.environ.get('MONITORING_PORT', 9100)),
+            TRACE_SAMPLE_RATE=float(os.environ.get('TRACE_SAMPLE_RATE', 0)),
+            SLOW_UPDATE=float(os.environ.get('SLOW_UPDATE_THRESHOLD', 5)),
+            READINESS_INTERVAL=float(os.environ.get('READINESS_INTERVAL', 15)),
+            READINESS_TIMEOUT=float(os.environ.get('READINESS_TIMEOUT', 2)),
+        ),
+        streams=StreamsConf(
+            PREFIX=os.environ.get('STREAM_PREFIX', 'updates'),
+            PARTITIONS=int(os.environ.get('STREAM_PARTITIONS', 16)),
+            MAXLEN=int(os.environ.get('STREAM_MAXLEN', 100_000)),
+            BATCH=int(os.environ.get('STREAM_BATCH', 10)),
+            CONCURRENCY=int(os.environ.get('STREAM_CONCURRENCY', 32)),
+            CLAIM_IDLE=float(os.environ.get('STREAM_CLAIM_IDLE', 60)),
+        ),
+        cache=CacheConf(
+            SNAPSHOT_DIR=Path(snapshot_dir) if snapshot_dir else None,
+            SNAPSHOT_INTERVAL=float(os.environ.get('CACHE_SNAPSHOT_INTERVAL', 300)),
+        ),
     )
 
 
 def load_hearthstone_data() -> HSEntities:
-    """ Load and return Hearthstone-specific static data """
-    with open(DATA_DIR / 'hs_entities.json', encoding='utf-8') as f:
-        ent = ujson.load(f)
-        classes = [HSClass(en=cls['enUS'], ru=cls['ruRU']) for cls in ent['classes'].values()]
-        types = [HSType(en=t['enUS'], ru=t['ruRU'], sign=t['sign'], emoji=t['emoji'])
-                 for t in ent['types'].values()]
-        rars = [HSRarity(en=r['enUS'], ru=r['ruRU'], sign=r['sign'], emoji=r['emoji'])
-                for r in ent['rarities'].values()]
-        sets = [HSSet(en=s['enUS'], ru=s['ruRU']) for s in ent['sets'].values()]
-        formats = [HSFormat(en=f['name_en'], ru=f['name_ru'], num=f['num']) for f in ent['formats']]
-        card_digit_params = ['cost', 'attack', 'health', 'durability', 'armor']
-        card_params = ['name', 'ctype', 'classes', 'cset', 'rarity'] + card_digit_params
-        deck_params = ['dformat', 'dclass', 'deck_created_after', 'deck_cards']
-        return HSEntities(types=types, classes=classes, rarities=rars, sets=sets, formats=formats,
-                          card_params=card_params, card_digit_params=card_digit_params, deck_params=deck_params)
-
-
-try:
-    logger.info('Load configuration...')
-    config = load_config()
-    hs_data = load_hearthstone_data()
-
-    BASE_URL = f'http://{config.api.DOMAIN}'
-    BASE_API_URL = f'{BASE_URL}/api/v1/'
-    CARD_RENDER_BASE_URL = f'http://{config.api.DOMAIN}/media/cards/'
-except Exception as e:
-    logger.error(f'Configuration error: {e}')
-    sys.exit()
-else:
-    logger.info('Successfully configured')
+    """ Load and return Hearthstone-specific static data, from the snapshot if it's up to date """
+    return load_with_snapshot(HS_ENTITIES_SOURCE, HS_ENTITIES_SNAPSHOT, parse_hearthstone_data)
+
+
+def parse_hearthstone_data(raw: bytes) -> HSEntities:
+    """ Build Hearthstone-specific static data from ``hs_entities.json`` content """
+    from .codec import codec    # not needed while the snapshot is up to date
+
+    ent = codec.loads(raw)
+    classes = [HSClass(en=cls['enUS'], ru=cls['ruRU']) for cls in ent['classes'].values()]
+    types = [HSType(en=t['enUS'], ru=t['ruRU'], sign=t['sign'], emoji=t['emoji'])
+             for t in ent['types'].values()]
+    rars = [HSRarity(en=r['enUS'], ru=r['ruRU'], sign=r['sign'], emoji=r['emoji'])
+            for r in ent['rarities'].values()]
+    sets = [HSSet(en=s['enUS'], ru=s['ruRU']) for s in ent['sets'].values()]
+    formats = [HSFormat(en=f['name_en'], ru=f['name_ru'], num=f['num']) for f in ent['formats']]
+    card_digit_params = ['cost', 'attack', 'health', 'durability', 'armor']
+    card_params = ['name', 'ctype', 'classes', 'cset', 'rarity'] + card_digit_params
+    deck_params = ['dformat', 'dclass', 'deck_created_after', 'deck_cards']
+    return HSEntities(types=types, classes=classes, rarities=rars, sets=sets, formats=formats,
+                      card_params=card_params, card_digit_params=card_digit_params, deck_params=deck_params)
+
+
+@cache
+def get_config() -> Config:
+    """
+    Bot configuration, loaded on the first call
+
+    :raise ConfigurationError: if the environment variables aren't set
+    """
+    return load_config()
+
+
+@cache
+def get_hs_data() -> HSEntities:
+    """ Hearthstone-specific static data, loaded on the first call """
+    return load_hearthstone_data()
+
+
+@cache
+def get_hs_version() -> str:
+    """ Short hash of ``hs_entities.json``, stored codes of the entities are valid for the same version only """
+    return source_digest(HS_ENTITIES_SOURCE.read_bytes()).hex()[:12]
+
+
+def get_base_url() -> str:
+    return f'http://{get_config().api.DOMAIN}'
+
+
+def get_base_api_url() -> str:
+    return f'{get_base_url()}/api/v1/'
+
+
+def get_card_render_base_url() -> str:
+    return f'{get_base_url()}/media/cards/'
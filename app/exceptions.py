@@ -12,3 +12,11 @@ class EmptyRequestError(Exception):
 
 class DeckstringError(Exception):
     pass
+
+
+class ApiUnavailableError(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
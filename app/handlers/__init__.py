@@ -1,5 +1,6 @@
 from aiogram import Dispatcher
 
+from .admin import register_admin_handlers
 from .common import register_common_handlers
 from .card_request import register_card_request_handlers
 from .card_response import register_card_response_handlers
@@ -9,6 +10,7 @@ from .deck_response import register_deck_response_handlers
 
 
 def register_handlers(dp: Dispatcher):
+    register_admin_handlers(dp)
     register_common_handlers(dp)
     register_card_request_handlers(dp)
     register_card_response_handlers(dp)
@@ -0,0 +1,63 @@
+from aiogram import Dispatcher, types
+from aiogram.utils import markdown as md
+
+import io
+import logging
+from datetime import datetime
+
+from app.config import get_config
+from app.services.messages import AdminMessage
+from app.services.metrics import storage_duration
+from app.services.profiler import profiler, Profile
+
+logger = logging.getLogger('app')
+
+
+def profile_report(profile: Profile) -> types.InputFile:
+    """ Collapsed stacks as a document, ready for ``flamegraph.pl`` or speedscope """
+    filename = f'profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed.txt'
+    return types.InputFile(io.BytesIO(profile.collapsed().encode('utf-8')), filename=filename)
+
+
+async def cmd_profile_start(message: types.Message):
+    """ Start sampling the event loop """
+    if profiler.running:
+        await message.answer(text=AdminMessage.PROFILER_RUNNING)
+        return
+    profiler.start()
+    logger.info('Profiler started by the admin')
+    await message.answer(text=AdminMessage.PROFILER_STARTED)
+
+
+async def cmd_profile_stop(message: types.Message):
+    """ Stop sampling and send the report """
+    if not profiler.running:
+        await message.answer(text=AdminMessage.PROFILER_NOT_RUNNING)
+        return
+    profile = profiler.stop()
+    logger.info(f'Profiler stopped by the admin: {profile.samples} samples in {profile.duration:.1f}s')
+    hot = '\n'.join(f'{count} {md.quote_html(label)}' for label, count in profile.hot_functions())
+    await message.answer_document(
+        document=profile_report(profile),
+        caption=AdminMessage.PROFILER_REPORT_.format(profile.samples, profile.duration, hot or '-'),
+    )
+
+
+async def cmd_storage_latency(message: types.Message):
+    """ Percentiles of the FSM storage operations, estimated from the metric buckets """
+    rows = []
+    for labels in sorted(storage_duration.label_sets(), key=lambda l: l['operation']):
+        p50, p95, p99 = (storage_duration.quantile(q, **labels) * 1000 for q in (0.5, 0.95, 0.99))
+        rows.append(f'<code>{labels["operation"]}</code> x{storage_duration.count(**labels)}: '
+                    f'p50 {p50:.1f}, p95 {p95:.1f}, p99 {p99:.1f}')
+    if not rows:
+        await message.answer(text=AdminMessage.STORAGE_IDLE)
+        return
+    await message.answer(text=AdminMessage.STORAGE_LATENCY_.format('\n'.join(rows)))
+
+
+def register_admin_handlers(dp: Dispatcher):
+    admin_id = get_config().bot.ADMIN_ID
+    dp.register_message_handler(cmd_profile_start, commands='profile_start', user_id=admin_id, state='*')
+    dp.register_message_handler(cmd_profile_stop, commands='profile_stop', user_id=admin_id, state='*')
+    dp.register_message_handler(cmd_storage_latency, commands='storage_latency', user_id=admin_id, state='*')
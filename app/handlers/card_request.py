@@ -1,19 +1,20 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text
-from aiohttp import ClientResponseError
 from aiogram.utils.exceptions import MessageNotModified, MessageToEditNotFound, BadRequest
 
 from contextlib import suppress
 import logging
 
 from app.services.keyboards import cardparam_cd, command_cd, deckparam_cd
-from app.services.utils import is_positive_integer, clear_all, clear_prompt, paginate_list, check_card_name
+from app.services.utils import is_positive_integer, clear_all, clear_prompt, paginate_list, check_card_name, transition
 from app.services.answer_builders import AnswerBuilder
-from app.services.api import RequestCards
+from app.services.callbacks import answer_callback
+from app.services.api import RequestCards, API_ERRORS
+from app.services.prefetch import prefetch_card_details, drop_prefetches
 from app.services.messages import CommonMessage
 from app.states import BuildCardRequest, WaitCardNumericParam, CardResponse, BuildDeckRequest, STATES
-from app.config import hs_data, MAX_CARDS_IN_RESPONSE
+from app.config import get_hs_data, MAX_CARDS_IN_RESPONSE
 from app.exceptions import EmptyRequestError
 
 logger = logging.getLogger('app')
@@ -41,12 +42,12 @@ async def card_search_start(message: types.message, state: FSMContext):
     answer = AnswerBuilder(data).cards.request_info()
 
     request_message = await message.reply(text=answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.base.set()
-    await state.update_data(card_request_msg_id=request_message.message_id)
+    await transition(state, BuildCardRequest.base, card_request_msg_id=request_message.message_id)
 
 
 async def card_search_start_from_main_menu(message: types.Message, state: FSMContext):
     """ Update data, call ``card_search_start`` """
+    drop_prefetches(message.chat.id)
     await state.update_data(on_close='')
 
     # To remove ReplyKeyboard
@@ -85,9 +86,8 @@ async def card_search_name_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).cards.wait_param('name')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.wait_name.set()
-    await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildCardRequest.wait_name, card_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def card_search_name_entered(message: types.Message, state: FSMContext):
@@ -97,8 +97,7 @@ async def card_search_name_entered(message: types.Message, state: FSMContext):
 
     if check_card_name(message.text):
         await clear_prompt(message, data, state)
-        await BuildCardRequest.base.set()
-        await state.update_data(name=message.text)
+        await transition(state, BuildCardRequest.base, name=message.text)
 
         await update_card_request(message, state, data)
     else:
@@ -118,9 +117,8 @@ async def card_search_type_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).cards.wait_param('ctype')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.wait_type.set()
-    await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildCardRequest.wait_type, card_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def card_search_type_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
@@ -142,8 +140,7 @@ async def card_search_type_chosen(call: types.CallbackQuery, callback_data: dict
             await state.update_data(attack=None, armor=None, durability=None)
 
     await clear_prompt(call.message, data, state)
-    await BuildCardRequest.base.set()
-    await state.update_data(ctype=type_sign)
+    await transition(state, BuildCardRequest.base, ctype=type_sign)
 
     await update_card_request(call.message, state, data)
 
@@ -153,9 +150,8 @@ async def card_search_class_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).cards.wait_param('classes')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.wait_class.set()
-    await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildCardRequest.wait_class, card_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def card_search_class_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
@@ -170,8 +166,7 @@ async def card_search_class_chosen(call: types.CallbackQuery, callback_data: dic
     if callback_data['param'] not in current_classes:
         current_classes.append(callback_data['param'])
     await clear_prompt(call.message, data, state)
-    await BuildCardRequest.base.set()
-    await state.update_data(classes=current_classes)
+    await transition(state, BuildCardRequest.base, classes=current_classes)
 
     await update_card_request(call.message, state, data)
 
@@ -181,17 +176,15 @@ async def card_search_set_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).cards.wait_param('cset')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.wait_set.set()
-    await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildCardRequest.wait_set, card_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def card_search_set_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
     """ Process the selected card set """
     data = await state.get_data()
     await clear_prompt(call.message, data, state)
-    await BuildCardRequest.base.set()
-    await state.update_data(cset=callback_data['param'])
+    await transition(state, BuildCardRequest.base, cset=callback_data['param'])
 
     await update_card_request(call.message, state, data)
 
@@ -201,17 +194,15 @@ async def card_search_rarity_input(call: types.CallbackQuery, state: FSMContext)
     data = await state.get_data()
     answer = AnswerBuilder(data).cards.wait_param('rarity')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildCardRequest.wait_rarity.set()
-    await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildCardRequest.wait_rarity, card_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def card_search_rarity_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
     """ Process the selected card rarity """
     data = await state.get_data()
     await clear_prompt(call.message, data, state)
-    await BuildCardRequest.base.set()
-    await state.update_data(rarity=callback_data['param'])
+    await transition(state, BuildCardRequest.base, rarity=callback_data['param'])
 
     await update_card_request(call.message, state, data)
 
@@ -241,7 +232,7 @@ async def card_search_digit_param_input(call: types.CallbackQuery, callback_data
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
 
     await state.update_data(card_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await answer_callback(call)
 
 
 async def card_search_digit_param_entered(message: types.Message, state: FSMContext):
@@ -251,8 +242,7 @@ async def card_search_digit_param_entered(message: types.Message, state: FSMCont
     data = await state.get_data()
     if is_positive_integer(message.text):
         await clear_prompt(message, data, state)
-        await BuildCardRequest.base.set()
-        await state.update_data({param: message.text})
+        await transition(state, BuildCardRequest.base, {param: message.text})
 
         await update_card_request(message, state, data)
     else:
@@ -270,12 +260,12 @@ async def card_search_digit_param_entered(message: types.Message, state: FSMCont
 
 async def card_search_language_input(call: types.CallbackQuery):
     """ Prepare to receive a language """
-    await call.answer('Currently, only English is available')
+    await answer_callback(call, 'Currently, only English is available')
 
 
 async def card_search_collectible_input(call: types.CallbackQuery):
     """ Prepare to receive a collectibility """
-    await call.answer('Coming soon. Or not')
+    await answer_callback(call, 'Coming soon. Or not')
 
 
 # ----------------------------------------------------------------------------------------------------------
@@ -305,9 +295,9 @@ async def card_search_clear(call: types.CallbackQuery, state: FSMContext):
 
     Called when Clear button of CardRequestInfoMessage is pressed
     """
-    await state.update_data(**dict.fromkeys(hs_data.card_params, None))
+    await state.update_data(**dict.fromkeys(get_hs_data().card_params, None))
     data = await state.get_data()
-    await call.answer()
+    await answer_callback(call)
     await update_card_request(call.message, state, data)
 
 
@@ -320,28 +310,30 @@ async def card_search(call: types.CallbackQuery, state: FSMContext):
 
     data = await state.get_data()
 
+    request = RequestCards(data)
     try:
-        cards = await RequestCards(data).get()
-    except ClientResponseError as e:
+        cards = await request.get()
+    except API_ERRORS as e:
         logger.error(f'HS Deck Helper API is unreachable: {e}')
-        await call.answer(CommonMessage.SERVER_UNAVAILABLE)
+        await answer_callback(call, CommonMessage.SERVER_UNAVAILABLE)
         return
     except EmptyRequestError as e:
         logger.warning(e)
-        await call.answer(CommonMessage.EMPTY_REQUEST_HINT)
+        await answer_callback(call, CommonMessage.EMPTY_REQUEST_HINT)
         return
 
     amount = len(cards)
     if amount > MAX_CARDS_IN_RESPONSE:
-        await call.answer(CommonMessage.TOO_MANY_RESULTS_HINT_.format(amount))
+        await answer_callback(call, CommonMessage.TOO_MANY_RESULTS_HINT_.format(amount))
         return
 
-    cards = list(paginate_list(cards, 9))
+    cards = list(paginate_list([card.as_dict() for card in cards], 9))
 
-    await state.update_data(cardlist={'cards': cards, 'page': 1, 'total': amount})
+    await state.update_data(cardlist={'cards': cards, 'page': 1, 'total': amount, 'outdated': request.outdated_age})
 
     data = await state.get_data()
     response = AnswerBuilder(data).cards.result_list()
+    prefetch_card_details(call.message.chat.id, data['cardlist'])
 
     try:
         resp_msg = await call.message.reply(text=response.text, reply_markup=response.keyboard)
@@ -356,7 +348,7 @@ async def card_search(call: types.CallbackQuery, state: FSMContext):
         )
     await state.update_data(card_response_msg_id=resp_msg.message_id)
     await CardResponse.list.set()
-    await call.answer()
+    await answer_callback(call)
 
 
 def register_card_request_handlers(dp: Dispatcher):
@@ -1,15 +1,17 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
-from aiohttp import ClientResponseError
 from aiogram.utils.exceptions import MessageNotModified
 
 from contextlib import suppress
 import logging
 
 from app.services.keyboards import command_cd, cardlist_cd
-from app.services.utils import flip_page
+from app.services.utils import shift_page
+from app.services.pagination import page_flips
 from app.services.answer_builders import AnswerBuilder
-from app.services.api import RequestSingleCard
+from app.services.callbacks import answer_callback
+from app.services.api import RequestSingleCard, API_ERRORS
+from app.services.prefetch import prefetch_card_details, drop_prefetches
 from app.services.messages import CommonMessage
 from app.states import BuildCardRequest, CardResponse
 
@@ -22,15 +24,26 @@ async def card_list_pages(call: types.CallbackQuery, callback_data: dict, state:
     match action:
         case 'left' | 'right':
             # Send another page of CardList
+            await answer_callback(call)
+
+            # Rapid presses are coalesced, only the first one of a burst edits the message
+            offset = await page_flips.push(
+                (call.message.chat.id, call.message.message_id),
+                1 if action == 'right' else -1,
+            )
+            if not offset:
+                return
+
             data = await state.get_data()
             try:
                 cardlist = data['cardlist']
-                cardlist['page'] = flip_page(action, cardlist['page'], len(cardlist['cards']))
+                cardlist['page'] = shift_page(cardlist['page'], offset, len(cardlist['cards']))
             except KeyError as e:
                 logger.error(e)
-                await call.answer(CommonMessage.UNKNOWN_ERROR)
+                await answer_callback(call, CommonMessage.UNKNOWN_ERROR)
                 return
             await state.update_data(cardlist=cardlist)
+            prefetch_card_details(call.message.chat.id, cardlist)
             data = await state.get_data()
             if data.get('card_response_msg_id'):
                 response = AnswerBuilder(data).cards.result_list()
@@ -43,9 +56,10 @@ async def card_list_pages(call: types.CallbackQuery, callback_data: dict, state:
                     )
         case 'pages':
             # Show tooltip
-            await call.answer(text='This button does nothing')
+            await answer_callback(call, 'This button does nothing')
         case 'close':
             # Delete CardList message
+            drop_prefetches(call.message.chat.id, 'cards')
             await call.message.delete()
             await BuildCardRequest.base.set()
 
@@ -74,17 +88,18 @@ async def card_list_get_card(call: types.CallbackQuery, callback_data: dict, sta
 
     dbf_id = callback_data.get('id')
     if not dbf_id:
-        await call.answer("Something went wrong. Couldn't get detail info for this card")
+        await answer_callback(call, "Something went wrong. Couldn't get detail info for this card")
         return
 
+    request = RequestSingleCard(dbf_id)
     try:
-        card = await RequestSingleCard(dbf_id).get()
-    except ClientResponseError as e:
+        card = await request.get()
+    except API_ERRORS as e:
         logger.error(f'HS Deck Helper API is unreachable: {e}')
-        await call.answer('The server is unavailable. Please try again later.')
+        await answer_callback(call, 'The server is unavailable. Please try again later.')
         return
 
-    await state.update_data(card_detail=card)
+    await state.update_data(card_detail=card.as_dict(), card_detail_outdated=request.outdated_age)
     data = await state.get_data()
     if data.get('card_response_msg_id'):
         response = AnswerBuilder(data).cards.result_detail()
@@ -116,9 +131,9 @@ async def card_detail_find_decks(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     card = data.get('card_detail')
     if not card:
-        await call.answer(CommonMessage.UNKNOWN_ERROR)
+        await answer_callback(call, CommonMessage.UNKNOWN_ERROR)
         return
-    await call.answer(f'Coming soon!')
+    await answer_callback(call, f'Coming soon!')
 
 
 def register_card_response_handlers(dp: Dispatcher):
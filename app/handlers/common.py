@@ -1,12 +1,19 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
 
+import logging
+
+from app.exceptions import DeadlineExceeded
 from app.services.utils import clear_all
+from app.services.prefetch import drop_prefetches
 from app.services.answer_builders import AnswerBuilder
 
+logger = logging.getLogger('app')
+
 
 async def cmd_start(message: types.Message, state: FSMContext):
     """ Main menu """
+    drop_prefetches(message.chat.id)
     await state.finish()
     response = AnswerBuilder({}).common.start()
     await message.answer(text=response.text, reply_markup=response.keyboard)
@@ -19,6 +26,13 @@ async def cmd_cancel(message: types.Message, state: FSMContext):
     await message.answer(text=response.text, reply_markup=response.keyboard)
 
 
+async def deadline_exceeded(update: types.Update, exception: DeadlineExceeded) -> bool:
+    """ The update has been processed for too long, the user has given up waiting """
+    logger.warning(f'Update {update.update_id} abandoned: {exception}')
+    return True
+
+
 def register_common_handlers(dp: Dispatcher):
+    dp.register_errors_handler(deadline_exceeded, exception=DeadlineExceeded)
     dp.register_message_handler(cmd_start, commands='start', state='*')
     dp.register_message_handler(cmd_cancel, commands='cancel', state='*')
@@ -1,18 +1,19 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext, filters
 from aiogram.utils.exceptions import MessageNotModified, MessageToEditNotFound, BadRequest
-from aiohttp import ClientResponseError
 
 import logging
 from contextlib import suppress
 
 from app.services.answer_builders import AnswerBuilder
+from app.services.callbacks import answer_callback
 from app.services.messages import CommonMessage
 from app.services.keyboards import command_cd, deckparam_cd, cardlist_cd
-from app.services.utils import clear_prompt, check_date, clear_all, paginate_list, card_in_query
-from app.services.api import RequestDecks
+from app.services.utils import clear_prompt, check_date, clear_all, paginate_list, card_in_query, transition
+from app.services.api import RequestDecks, API_ERRORS
+from app.services.prefetch import prefetch_deck_details, drop_prefetches
 from app.states import BuildDeckRequest, DeckResponse, CardResponse, BuildCardRequest
-from app.config import hs_data, MAX_DECKS_IN_RESPONSE
+from app.config import get_hs_data, MAX_DECKS_IN_RESPONSE
 
 logger = logging.getLogger('app')
 
@@ -35,6 +36,7 @@ async def update_deck_request(message: types.Message, state: FSMContext, request
 
 async def deck_search_start(message: types.Message, state: FSMContext):
     """ Start a new deck request, send DeckRequestInfoMessage """
+    drop_prefetches(message.chat.id)
     data = await state.get_data()
     answer = AnswerBuilder(data).decks.request_info()
 
@@ -42,8 +44,7 @@ async def deck_search_start(message: types.Message, state: FSMContext):
     await message.answer(text=CommonMessage.NEW_DECK_SEARCH, reply_markup=types.ReplyKeyboardRemove())
 
     request_message = await message.answer(text=answer.text, reply_markup=answer.keyboard)
-    await BuildDeckRequest.base.set()
-    await state.update_data(deck_request_msg_id=request_message.message_id, on_close='')
+    await transition(state, BuildDeckRequest.base, deck_request_msg_id=request_message.message_id, on_close='')
 
 
 async def deck_search_param_cancel(call: types.CallbackQuery, state: FSMContext):
@@ -70,17 +71,15 @@ async def deck_search_format_input(call: types.CallbackQuery, state: FSMContext)
     data = await state.get_data()
     answer = AnswerBuilder(data).decks.wait_param('dformat')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildDeckRequest.wait_format.set()
-    await state.update_data(deck_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildDeckRequest.wait_format, deck_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def deck_search_format_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
     """ Process the selected deck format """
     data = await state.get_data()
     await clear_prompt(call.message, data, state)
-    await BuildDeckRequest.base.set()
-    await state.update_data(dformat=callback_data['param'])
+    await transition(state, BuildDeckRequest.base, dformat=callback_data['param'])
     await update_deck_request(call.message, state, data)
 
 
@@ -89,17 +88,15 @@ async def deck_search_class_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).decks.wait_param('dclass')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildDeckRequest.wait_class.set()
-    await state.update_data(deck_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildDeckRequest.wait_class, deck_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def deck_search_class_chosen(call: types.CallbackQuery, callback_data: dict, state: FSMContext):
     """ Process the selected deck class """
     data = await state.get_data()
     await clear_prompt(call.message, data, state)
-    await BuildDeckRequest.base.set()
-    await state.update_data(dclass=callback_data['param'])
+    await transition(state, BuildDeckRequest.base, dclass=callback_data['param'])
     await update_deck_request(call.message, state, data)
 
 
@@ -108,9 +105,8 @@ async def deck_search_date_input(call: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     answer = AnswerBuilder(data).decks.wait_param('deck_created_after')
     prompt = await call.message.reply(answer.text, reply_markup=answer.keyboard)
-    await BuildDeckRequest.wait_date.set()
-    await state.update_data(deck_prompt_msg_id=prompt.message_id)
-    await call.answer()
+    await transition(state, BuildDeckRequest.wait_date, deck_prompt_msg_id=prompt.message_id)
+    await answer_callback(call)
 
 
 async def deck_search_date_entered(message: types.Message, state: FSMContext):
@@ -120,8 +116,7 @@ async def deck_search_date_entered(message: types.Message, state: FSMContext):
 
     if check_date(message.text):
         await clear_prompt(message, data, state)
-        await BuildDeckRequest.base.set()
-        await state.update_data(deck_created_after=message.text)
+        await transition(state, BuildDeckRequest.base, deck_created_after=message.text)
         await update_deck_request(message, state, data)
     else:
         if data.get('deck_prompt_msg_id'):
@@ -170,6 +165,7 @@ async def deck_search_add_card(call: types.CallbackQuery, callback_data: dict, s
             )
 
     # Back to card search
+    drop_prefetches(call.message.chat.id, 'cards')
     await call.message.delete()
     await BuildCardRequest.base.set()
     if data.get('card_request_msg_id'):
@@ -184,7 +180,7 @@ async def deck_search_add_card(call: types.CallbackQuery, callback_data: dict, s
 
 async def deck_search_language_input(call: types.CallbackQuery):
     """ Prepare to receive a language """
-    await call.answer('Currently, only English is available')
+    await answer_callback(call, 'Currently, only English is available')
 
 
 async def deck_search_close(call: types.CallbackQuery, state: FSMContext):
@@ -205,33 +201,35 @@ async def deck_search_clear(call: types.CallbackQuery, state: FSMContext):
 
     Called when Clear button of DeckRequestInfoMessage is pressed
     """
-    await state.update_data(**dict.fromkeys(hs_data.deck_params, None))
+    await state.update_data(**dict.fromkeys(get_hs_data().deck_params, None))
     data = await state.get_data()
-    await call.answer()
+    await answer_callback(call)
     await update_deck_request(call.message, state, data)
 
 
 async def request_decks(call: types.CallbackQuery, state: FSMContext):
     """ Perform request, send deck_list """
     data = await state.get_data()
+    request = RequestDecks(data)
     try:
-        decks = await RequestDecks(data).get()
-    except ClientResponseError as e:
+        decks = await request.get()
+    except API_ERRORS as e:
         logger.error(f'HS Deck Helper API is unreachable: {e}')
-        await call.answer(CommonMessage.SERVER_UNAVAILABLE)
+        await answer_callback(call, CommonMessage.SERVER_UNAVAILABLE)
         return
 
     amount = len(decks)
     if amount > MAX_DECKS_IN_RESPONSE:
-        await call.answer(CommonMessage.TOO_MANY_RESULTS_HINT_.format(amount))
+        await answer_callback(call, CommonMessage.TOO_MANY_RESULTS_HINT_.format(amount))
         return
 
-    decks = list(paginate_list(decks, 9))
+    decks = list(paginate_list([deck.as_dict() for deck in decks], 9))
 
-    await state.update_data(deck_list={'decks': decks, 'page': 1, 'total': amount})
+    await state.update_data(deck_list={'decks': decks, 'page': 1, 'total': amount, 'outdated': request.outdated_age})
 
     data = await state.get_data()
     response = AnswerBuilder(data).decks.result_list()
+    prefetch_deck_details(call.message.chat.id, data['deck_list'])
 
     try:
         resp_msg = await call.message.reply(text=response.text, reply_markup=response.keyboard)
@@ -246,7 +244,7 @@ async def request_decks(call: types.CallbackQuery, state: FSMContext):
         )
     await state.update_data(deck_response_msg_id=resp_msg.message_id)
     await DeckResponse.list.set()
-    await call.answer()
+    await answer_callback(call)
 
 
 async def deck_search(call: types.CallbackQuery, state: FSMContext):
@@ -260,7 +258,7 @@ async def deck_search_from_card_detail(call: types.CallbackQuery, callback_data:
     """ Search decks from Card Detail """
     dbf_id = callback_data.get('id')
     if not dbf_id:
-        await call.answer("Something went wrong. Couldn't get card data")
+        await answer_callback(call, "Something went wrong. Couldn't get card data")
         return
 
     data = await state.get_data()
@@ -1,15 +1,17 @@
 from aiogram import Dispatcher, types
 from aiogram.dispatcher import FSMContext
-from aiohttp import ClientResponseError
 from aiogram.utils.exceptions import MessageNotModified
 
 from contextlib import suppress
 import logging
 
 from app.services.keyboards import command_cd, decklist_cd
-from app.services.utils import flip_page
+from app.services.utils import shift_page
+from app.services.pagination import page_flips
 from app.services.answer_builders import AnswerBuilder
-from app.services.api import RequestSingleDeck
+from app.services.callbacks import answer_callback
+from app.services.api import RequestSingleDeck, API_ERRORS
+from app.services.prefetch import prefetch_deck_details, drop_prefetches
 from app.services.messages import CommonMessage
 from app.states import DeckResponse, STATES
 
@@ -22,15 +24,26 @@ async def deck_list_pages(call: types.CallbackQuery, callback_data: dict, state:
     match action:
         case 'left' | 'right':
             # Send another page of DeckList
+            await answer_callback(call)
+
+            # Rapid presses are coalesced, only the first one of a burst edits the message
+            offset = await page_flips.push(
+                (call.message.chat.id, call.message.message_id),
+                1 if action == 'right' else -1,
+            )
+            if not offset:
+                return
+
             data = await state.get_data()
             try:
                 deck_list = data['deck_list']
-                deck_list['page'] = flip_page(action, deck_list['page'], len(deck_list['decks']))
+                deck_list['page'] = shift_page(deck_list['page'], offset, len(deck_list['decks']))
             except KeyError as e:
                 logger.error(e)
-                await call.answer(CommonMessage.UNKNOWN_ERROR)
+                await answer_callback(call, CommonMessage.UNKNOWN_ERROR)
                 return
             await state.update_data(deck_list=deck_list)
+            prefetch_deck_details(call.message.chat.id, deck_list)
             data = await state.get_data()
             if data.get('deck_response_msg_id'):
                 response = AnswerBuilder(data).decks.result_list()
@@ -43,12 +56,13 @@ async def deck_list_pages(call: types.CallbackQuery, callback_data: dict, state:
                     )
         case 'pages':
             # Show tooltip
-            await call.answer(text='This button does nothing')
+            await answer_callback(call, 'This button does nothing')
         case 'close':
             data = await state.get_data()
             on_close = data.get('on_close', 'decks_base')
 
             # Delete DeckList message
+            drop_prefetches(call.message.chat.id, 'decks')
             await call.message.delete()
 
             # Set the state depending on where the decks were searched from
@@ -88,17 +102,18 @@ async def deck_list_get_deck(call: types.CallbackQuery, callback_data: dict, sta
 
     deck_id = callback_data.get('id')
     if not deck_id:
-        await call.answer("Something went wrong. Couldn't get detail info for this deck")
+        await answer_callback(call, "Something went wrong. Couldn't get detail info for this deck")
         return
 
+    request = RequestSingleDeck(deck_id)
     try:
-        deck = await RequestSingleDeck(deck_id).get()
-    except ClientResponseError as e:
+        deck = await request.get()
+    except API_ERRORS as e:
         logger.error(f'HS Deck Helper API is unreachable: {e}')
-        await call.answer('The server is unavailable. Please try again later.')
+        await answer_callback(call, 'The server is unavailable. Please try again later.')
         return
 
-    await state.update_data(deck_detail=deck)
+    await state.update_data(deck_detail=deck.as_dict(), deck_detail_outdated=request.outdated_age)
     data = await state.get_data()
     if data.get('deck_response_msg_id'):
         response = AnswerBuilder(data).decks.result_detail()
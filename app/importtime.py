@@ -0,0 +1,90 @@
+import builtins
+import importlib.util
+import logging
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ImportRecord:
+    name: str
+    self_time: float        # seconds spent in the module itself
+    cumulative: float       # seconds including the modules it has imported
+
+
+class ImportTimer:
+    """
+    Measure the time of module imports, like ``python -X importtime`` does,
+    but reporting through the bot log so cold-start regressions are visible in production.
+
+    Only the first import of a module is timed. Imports made through ``importlib`` aren't seen
+    """
+
+    def __init__(self):
+        self.records: list[ImportRecord] = []
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        self.__stack: list[float] = []      # time of nested imports of every unfinished import
+        self.__original = builtins.__import__
+
+    @classmethod
+    def install(cls) -> 'ImportTimer':
+        """ Start timing imports """
+        timer = cls()
+        builtins.__import__ = timer.__import
+        return timer
+
+    def uninstall(self):
+        """ Stop timing imports """
+        builtins.__import__ = self.__original
+        self.finished_at = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        """ Seconds between installing and uninstalling the timer """
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def by_package(self) -> list[tuple[str, float]]:
+        """ Self time of imports summed by top-level package, slowest first """
+        packages = defaultdict(float)
+        for record in self.records:
+            packages[record.name.partition('.')[0]] += record.self_time
+        return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+    def report(self, logger: logging.Logger, top: int = 10):
+        """
+        Log the import-time breakdown
+
+        :param logger: where to log
+        :param top: number of the slowest packages and ``app`` modules to list
+        """
+        packages = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.by_package()[:top])
+        logger.info(f'Imports took {self.total * 1000:.0f}ms: {packages}')
+        own = sorted((r for r in self.records if r.name.split('.')[0] == 'app'),
+                     key=lambda r: r.self_time, reverse=True)
+        modules = ', '.join(f'{r.name} {r.self_time * 1000:.1f}ms' for r in own[:top])
+        logger.info(f'Slowest app modules: {modules}')
+
+    def __import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        fullname = name
+        if level:
+            package = (globals or {}).get('__package__') or ''
+            try:
+                fullname = importlib.util.resolve_name('.' * level + name, package)
+            except (ImportError, ValueError):
+                pass
+        if fullname in sys.modules:
+            return self.__original(name, globals, locals, fromlist, level)
+
+        self.__stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.__original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.__stack.pop()
+            if self.__stack:
+                self.__stack[-1] += elapsed
+            self.records.append(ImportRecord(fullname, self_time=elapsed - nested, cumulative=elapsed))
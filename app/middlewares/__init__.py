@@ -0,0 +1,14 @@
+from aiogram import Dispatcher
+
+from app.config import CALLBACK_ANSWER_BUDGET, UPDATE_DEADLINE
+from .callback_answer import CallbackAnswerMiddleware
+from .deadline import DeadlineMiddleware
+from .metrics import MetricsMiddleware
+from .tracing import TracingMiddleware
+
+
+def setup_middlewares(dp: Dispatcher):
+    dp.middleware.setup(DeadlineMiddleware(timeout=UPDATE_DEADLINE))
+    dp.middleware.setup(TracingMiddleware())
+    dp.middleware.setup(MetricsMiddleware())
+    dp.middleware.setup(CallbackAnswerMiddleware(budget=CALLBACK_ANSWER_BUDGET))
@@ -0,0 +1,39 @@
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+import asyncio
+
+from app.services.callbacks import CallbackAck, current_ack
+
+
+class CallbackAnswerMiddleware(BaseMiddleware):
+    """
+    Answer callback queries within a time budget, so the client spinner stops
+    even if the handler waits for the API.
+
+    Handlers that answer in time show their hints as usual.
+    Later hints are delivered by ``answer_callback`` as messages.
+    """
+
+    def __init__(self, budget: float):
+        """
+        :param budget: seconds the handler has to answer the query by itself
+        """
+        super().__init__()
+        self.budget = budget
+
+    async def on_pre_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        ack = CallbackAck(call)
+        current_ack.set(ack)
+        if self.budget > 0:
+            ack.timer = asyncio.create_task(ack.answer_later(self.budget))
+        else:
+            await ack.answer()
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        ack = current_ack.get(None)
+        if ack is None or ack.call is not call:
+            return
+        if ack.timer:
+            ack.timer.cancel()
+        await ack.answer()
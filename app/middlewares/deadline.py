@@ -0,0 +1,21 @@
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from app.services.deadline import set_deadline
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Set the deadline of the update when it arrives.
+    API and storage calls of its handlers are abandoned once the deadline passes
+    """
+
+    def __init__(self, timeout: float):
+        """
+        :param timeout: seconds to process an update
+        """
+        super().__init__()
+        self.timeout = timeout
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        set_deadline(self.timeout)
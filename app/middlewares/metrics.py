@@ -0,0 +1,34 @@
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+import time
+
+from app.services.metrics import handler_duration
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """ Observe the duration of every handler, labelled by the handler function name """
+
+    @staticmethod
+    def start(data: dict):
+        handler = current_handler.get(None)
+        data['metrics_handler'] = getattr(handler, '__name__', 'unknown')
+        data['metrics_started_at'] = time.perf_counter()
+
+    @staticmethod
+    def finish(data: dict):
+        if 'metrics_started_at' in data:
+            handler_duration.observe(time.perf_counter() - data['metrics_started_at'], handler=data['metrics_handler'])
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self.start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self.finish(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self.start(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self.finish(data)
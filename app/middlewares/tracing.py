@@ -0,0 +1,41 @@
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from app.services.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """ Open a trace for every update and a child span for its handler """
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        kind = next((key for key in update.values if key != 'update_id'), 'unknown')
+        data['trace_span'] = tracer.start_trace('update', update_id=update.update_id, update_type=kind)
+
+    async def on_post_process_update(self, update: types.Update, results: list, data: dict):
+        tracer.end(data.get('trace_span'))
+
+    @staticmethod
+    def start(data: dict):
+        skipped = data.get('handler_span')
+        if skipped is not None:     # the hook runs again for the next handler if the previous one raised SkipHandler
+            skipped.set_attribute('skipped', True)
+            tracer.end(skipped)
+        handler = current_handler.get(None)
+        data['handler_span'] = tracer.start_span('handler', handler=getattr(handler, '__name__', 'unknown'))
+
+    @staticmethod
+    def finish(data: dict):
+        tracer.end(data.get('handler_span'))
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self.start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self.finish(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self.start(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self.finish(data)
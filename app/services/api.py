@@ -1,52 +1,246 @@
-from aiohttp import ClientSession, ClientResponseError
+from aiohttp import ClientSession, ClientResponseError, ClientError, ClientConnectionError, ClientTimeout
 
+import asyncio
 import logging
-
-from app.config import hs_data, BASE_API_URL
-from app.exceptions import EmptyRequestError
+import time
+from functools import partial
+
+from app.codec import codec
+from app.config import get_config, get_hs_data, get_base_api_url, EndpointTimeouts, LIST_CACHE_TTL, LIST_CACHE_STALE_TTL
+from app.exceptions import EmptyRequestError, ApiUnavailableError, DeadlineExceeded, DeckstringError
+from .cache import response_cache, shared_cache
+from .deadline import time_left
+from .metrics import api_request_duration
+from .models import CardSummary, Card, DeckSummary, Deck
+from .resilience import CircuitBreaker, backoff_delay
+from .tracing import tracer
 
 logger = logging.getLogger('app')
 
+API_ERRORS = (ClientError, asyncio.TimeoutError, ApiUnavailableError)   # everything a handler has to expect
+
+breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(family: str) -> CircuitBreaker:
+    """ Return the circuit breaker of the endpoint family, f.e. ``cards`` or ``decks`` """
+    if family not in breakers:
+        api = get_config().api
+        breakers[family] = CircuitBreaker(family, threshold=api.BREAKER_THRESHOLD, cooldown=api.BREAKER_COOLDOWN)
+    return breakers[family]
+
+
+def is_transient(error: Exception) -> bool:
+    """ Whether the request may succeed if repeated """
+    if isinstance(error, ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (ClientConnectionError, asyncio.TimeoutError))
+
+
+def error_status(error: Exception) -> str:
+    """ Status label of the failed request attempt """
+    if isinstance(error, ClientResponseError):
+        return str(error.status)
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    return 'error'
+
 
 class Request:
     """ API request """
 
+    cacheable = False   # whether responses are stored in the response cache
+    cache_ttl: float | None = None          # seconds a GET response is fresh, the cache default if None
+    cache_stale_ttl: float | None = None    # seconds a GET response may be served stale, the cache default if None
+
     def __init__(self, endpoint: str):
         """
         :param endpoint: without first slash, f.e. `decode_deck/`
         """
-        self.base_url = BASE_API_URL
+        self.base_url = get_base_api_url()
         self.endpoint = endpoint
+        self.outdated_age: float | None = None   # age of the cached response served because the API is down
 
     @property
     def params(self) -> dict:
         """ Actual request parameters """
         return {}
 
+    @property
+    def family(self) -> str:
+        """ Endpoint family sharing a circuit breaker """
+        return self.endpoint.split('/')[0]
+
+    @property
+    def timeouts(self) -> EndpointTimeouts:
+        """ Timeouts of the endpoint family """
+        timeouts = get_config().api.TIMEOUTS
+        return timeouts.get(self.family, timeouts['default'])
+
+    @property
+    def cache_key(self) -> str:
+        """ Key of the GET response in the response cache """
+        params = '&'.join(f'{key}={value}' for key, value in sorted(self.params.items()))
+        return f'{self.endpoint}?{params}'
+
     async def get(self):
         """
-        Perform **GET** request
+        Perform **GET** request, or take its response from the cache
 
         :return: JSON response
         """
-        async with ClientSession(raise_for_status=True) as session:
-            async with session.get(f'{self.base_url}{self.endpoint}', params=self.params) as resp:
-                return await resp.json()
+        if not self.cacheable:
+            return await self.fetch()
+        return await self.cached(self.cache_key, self.fetch, self.cache_ttl, self.cache_stale_ttl)
+
+    async def fetch(self):
+        """
+        Perform **GET** request bypassing the cache. Transient errors are retried
+
+        :return: parsed response
+        :raise ApiUnavailableError: if the circuit is open or the deadline is exceeded
+        :raise ClientError: if the request failed
+        """
+        response = await self.shared(
+            self.cache_key, 'GET', ttl=self.cache_ttl, retries=get_config().api.RETRIES, params=self.params,
+        )
+        return self.parse(response)
 
     async def post(self, data):
         """
-        Perform **POST** request
+        Perform **POST** request, or take its response from the cache
+
+        :return: JSON response
+        """
+        if not self.cacheable:
+            return await self.submit(data)
+        return await self.cached(self.submitted_key(data), partial(self.submit, data))
+
+    def submitted_key(self, data) -> str:
+        """ Key of the POST response in the response cache """
+        key = '&'.join(f'{key}={value}' for key, value in sorted(data.items()))
+        return f'{self.endpoint}<-{key}'
+
+    async def submit(self, data):
+        """
+        Perform **POST** request bypassing the cache
+
+        :return: parsed response
+        :raise ApiUnavailableError: if the circuit is open or the deadline is exceeded
+        :raise ClientError: if the request failed
+        """
+        response = await self.shared(self.submitted_key(data), 'POST', retries=0, data=data)
+        return self.parse_submitted(response)
+
+    def parse(self, response):
+        """ Build domain objects from **GET** JSON response """
+        return response
+
+    def parse_submitted(self, response):
+        """ Build domain objects from **POST** JSON response """
+        return response
+
+    async def cached(self, key: str, fetch, ttl: float | None = None, stale_ttl: float | None = None):
+        """ Take the response from the cache, remember whether it's outdated """
+        response = await response_cache.get_or_fetch(key, fetch, ttl, stale_ttl)
+        self.outdated_age = response_cache.outdated_age(key)
+        return response
+
+    async def shared(self, key: str, method: str, ttl: float | None = None, **kwargs):
+        """
+        Take the raw response from the cache shared by the bot processes, or request and share it
+
+        :param ttl: seconds the response is shared, the cache default if None
+        """
+        if not (self.cacheable and shared_cache.enabled):
+            return await self.call(method, **kwargs)
+        response = await shared_cache.get(key)
+        if response is None:
+            response = await self.call(method, **kwargs)
+            await shared_cache.set(key, response, ttl)
+        return response
+
+    async def call(self, method: str, retries: int, **kwargs):
+        """
+        Send the request through the circuit breaker, retry transient errors with backoff
+
+        :param method: HTTP method
+        :param retries: max number of extra attempts
+        :param kwargs: passed to ``send``
+        :return: JSON response
+        :raise DeadlineExceeded: if the deadline of the current update has passed
+        """
+        api = get_config().api
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + api.DEADLINE
+        update_left = time_left()
+        update_bound = update_left is not None and update_left < api.DEADLINE   # the update has less time
+        if update_bound:
+            deadline = loop.time() + update_left
+        breaker = get_breaker(self.family)
+        timeouts = self.timeouts
+        attempt = 0
+        while True:
+            time_left()
+            if not breaker.allow():
+                raise ApiUnavailableError(f'Circuit "{breaker.name}" is open')
+            remaining = deadline - loop.time()
+            capped = update_bound and remaining < timeouts.TOTAL
+            timeout = ClientTimeout(
+                total=min(timeouts.TOTAL, remaining),
+                sock_connect=timeouts.CONNECT,
+                sock_read=timeouts.READ,
+            )
+            started_at = time.perf_counter()
+            try:
+                with tracer.span(f'api.{type(self).__name__}', method=method, attempt=attempt):
+                    result = await self.send(method, timeout=timeout, **kwargs)
+            except (ClientError, asyncio.TimeoutError) as e:
+                self.observe(started_at, error_status(e))
+                if capped and isinstance(e, asyncio.TimeoutError):
+                    # the update ran out of time, not the upstream: neither a failure nor worth a retry
+                    breaker.release_trial()
+                    raise DeadlineExceeded('The update is being processed for too long') from e
+                if not is_transient(e):
+                    breaker.record_success()    # the upstream is alive, the request is wrong
+                    raise
+                breaker.record_failure()
+                delay = backoff_delay(attempt, api.BACKOFF_BASE, api.BACKOFF_MAX)
+                if attempt >= retries or loop.time() + delay >= deadline:
+                    raise
+                logger.warning(f'{method} {self.endpoint} failed ({e!r}), retry in {delay:.2f}s')
+                attempt += 1
+                await asyncio.sleep(delay)
+            except BaseException:
+                breaker.release_trial()     # cancelled or failed unexpectedly, the circuit must not stay stuck
+                raise
+            else:
+                self.observe(started_at, 'ok')
+                breaker.record_success()
+                return result
+
+    def observe(self, started_at: float, status: str):
+        """ Record the latency of the request attempt """
+        api_request_duration.observe(time.perf_counter() - started_at, request=type(self).__name__, status=status)
+
+    async def send(self, method: str, timeout: ClientTimeout, **kwargs):
+        """
+        Perform a single HTTP request
 
         :return: JSON response
         """
-        async with ClientSession(raise_for_status=True) as session:
-            async with session.post(f'{self.base_url}{self.endpoint}', data=data) as resp:
-                return await resp.json(encoding='utf-8')
+        async with ClientSession(raise_for_status=True, timeout=timeout) as session:
+            async with session.request(method, f'{self.base_url}{self.endpoint}', **kwargs) as resp:
+                return await resp.json(encoding='utf-8', loads=codec.loads)
 
 
 class RequestCards(Request):
     """ **GET card list** request """
 
+    cacheable = True
+    cache_ttl = LIST_CACHE_TTL
+    cache_stale_ttl = LIST_CACHE_STALE_TTL
+
     def __init__(self, data: dict):
         self.data = data
         super().__init__(endpoint='cards')
@@ -55,9 +249,9 @@ class RequestCards(Request):
     def params(self) -> dict:
         clean_data = {}
         for key, value in self.data.items():
-            if key not in hs_data.card_params or value is None:
+            if key not in get_hs_data().card_params or value is None:
                 continue
-            if key in hs_data.card_digit_params:
+            if key in get_hs_data().card_digit_params:
                 clean_data[f'{key}_min'] = value
                 clean_data[f'{key}_max'] = value
                 continue
@@ -69,6 +263,9 @@ class RequestCards(Request):
             raise EmptyRequestError('Attempt to receive all Hearthstone cards')
         return clean_data
 
+    def parse(self, response) -> list[CardSummary]:
+        return [CardSummary.from_api(card) for card in response]
+
     async def post(self, data):
         raise NotImplementedError
 
@@ -76,9 +273,14 @@ class RequestCards(Request):
 class RequestSingleCard(Request):
     """ **GET single card** request """
 
+    cacheable = True
+
     def __init__(self, dbf_id: int):
         super().__init__(endpoint=f'cards/{dbf_id}/')
 
+    def parse(self, response) -> Card:
+        return Card.from_api(response)
+
     async def post(self, data):
         raise NotImplementedError
 
@@ -96,6 +298,10 @@ class RequestSingleCard(Request):
 class RequestDecks(Request):
     """ **GET deck list** request """
 
+    cacheable = True
+    cache_ttl = LIST_CACHE_TTL          # decoded decks keep the cache defaults
+    cache_stale_ttl = LIST_CACHE_STALE_TTL
+
     def __init__(self, data: dict):
         self.data = data
         super().__init__(endpoint='decks/')
@@ -104,7 +310,7 @@ class RequestDecks(Request):
     def params(self) -> dict:
         clean_data = {}
         for key, value in self.data.items():
-            if key not in hs_data.deck_params or value is None:
+            if key not in get_hs_data().deck_params or value is None:
                 continue
             if key == 'deck_created_after':
                 clean_data['date_after'] = self.format_date(value)
@@ -117,6 +323,19 @@ class RequestDecks(Request):
 
         return clean_data
 
+    def parse(self, response) -> list[DeckSummary]:
+        return [DeckSummary.from_api(deck) for deck in response]
+
+    def parse_submitted(self, response) -> Deck:
+        """
+        Build the decoded deck
+
+        :raise DeckstringError: if the API couldn't decode the deck
+        """
+        if 'error' in response:
+            raise DeckstringError(response['error'])
+        return Deck.from_api(response)
+
     @staticmethod
     def format_date(date: str) -> str:
         """
@@ -137,8 +356,13 @@ class RequestDecks(Request):
 class RequestSingleDeck(Request):
     """ **GET single card** request """
 
+    cacheable = True
+
     def __init__(self, deck_id: int):
         super().__init__(endpoint=f'decks/{deck_id}/')
 
+    def parse(self, response) -> Deck:
+        return Deck.from_api(response)
+
     async def post(self, data):
         raise NotImplementedError
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from app.codec import codec
+from app.config import HS_ENTITIES_SOURCE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_STALE_TTL, RESPONSE_CACHE_SIZE
+from app.snapshot import read_snapshot, source_digest, write_snapshot
+
+logger = logging.getLogger('app')
+
+
+class CacheEntry:
+    """ Cached value with its storing time """
+
+    __slots__ = ('value', 'stored_at', 'refresh_failed')
+
+    def __init__(self, value: Any, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+        self.refresh_failed = False     # the last attempt to refresh the stale value has failed
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class Flight:
+    """ Fetch of a missing key that is awaited by one or more callers """
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of API responses.
+
+    An entry is fresh for ``ttl`` seconds. After that it is stale but still served
+    for ``stale_ttl`` seconds, while a background refresh replaces it (stale-while-revalidate).
+    If the refresh fails, the stale value keeps being served, so the bot survives upstream outages.
+
+    Concurrent requests for the same missing key share a single fetch.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_size: int):
+        """
+        :param ttl: seconds an entry stays fresh
+        :param stale_ttl: seconds an entry may be served at all, counting from its storing
+        :param max_size: max number of entries, least recently used ones are evicted first
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        self.max_size = max_size
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.__flights: dict[str, Flight] = {}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def entry(self, key: str, stale_ttl: float | None = None) -> CacheEntry | None:
+        """
+        Return the entry that still may be served, or None
+
+        :param stale_ttl: shorter one for the key, ``stale_ttl`` of the cache if None
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        if entry.age > (self.stale_ttl if stale_ttl is None else min(self.stale_ttl, stale_ttl)):
+            del self.__entries[key]
+            return None
+        self.__entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str) -> Any | None:
+        """ Return fresh value or None if it's missing or stale """
+        entry = self.entry(key)
+        if entry is None or entry.age > self.ttl:
+            return None
+        return entry.value
+
+    def set(self, key: str, value: Any):
+        """ Store value, evict the least recently used entry if the cache is full """
+        self.__entries[key] = CacheEntry(value, stored_at=time.monotonic())
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        """ Share of lookups served from the cache, stale values included """
+        lookups = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / lookups if lookups else 0.0
+
+    def clear(self):
+        self.__entries.clear()
+
+    def export(self) -> list[tuple[str, Any, float]]:
+        """ Keys, values and ages of the entries that still may be served, the least recently used first """
+        return [(key, entry.value, entry.age) for key, entry in self.__entries.items() if entry.age <= self.stale_ttl]
+
+    def restore(self, entries: list[tuple[str, Any, float]]) -> int:
+        """
+        Put back the exported entries with their ages. The ones too old to be served are skipped,
+        the ones stored meanwhile are kept
+
+        :return: number of the restored entries
+        """
+        now = time.monotonic()
+        restored = 0
+        for key, value, age in entries:
+            if age > self.stale_ttl or key in self.__entries:
+                continue
+            self.__entries[key] = CacheEntry(value, stored_at=now - age)
+            restored += 1
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+        return restored
+
+    def outdated_age(self, key: str) -> float | None:
+        """ Age of the entry if it's served only because refreshing it has failed, otherwise None """
+        entry = self.__entries.get(key)
+        if entry is None or not entry.refresh_failed:
+            return None
+        return entry.age
+
+    def ages(self) -> list[float]:
+        """ Ages of all entries in seconds """
+        return [entry.age for entry in self.__entries.values()]
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                           ttl: float | None = None, stale_ttl: float | None = None) -> Any:
+        """
+        Return cached value, or fetch and cache it.
+        Stale value is returned at once, and refreshed in background
+
+        :param key: cache key
+        :param fetch: coroutine function that receives the actual value
+        :param ttl: seconds the value of the key is fresh, ``ttl`` of the cache if None
+        :param stale_ttl: seconds it may be served at all, ``stale_ttl`` of the cache if None
+        :raise: anything ``fetch`` raises
+        """
+        entry = self.entry(key, stale_ttl)
+        if entry is not None:
+            if entry.age > (self.ttl if ttl is None else ttl):
+                self.stale_hits += 1
+                self.__refresh(key, fetch)
+            else:
+                self.hits += 1
+            return entry.value
+
+        self.misses += 1
+        flight = self.__start(key, fetch)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Nobody needs the result anymore
+                flight.task.cancel()
+
+    def __start(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Flight:
+        flight = self.__flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.create_task(self.__fetch(key, fetch)))
+            self.__flights[key] = flight
+        return flight
+
+    def __refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        """ Replace the stale entry in background """
+        if key in self.__flights:
+            return
+        flight = self.__start(key, fetch)
+        flight.task.add_done_callback(lambda t: t.cancelled() or t.exception())   # the error is already logged
+
+    async def __fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception as e:
+            stale = self.__entries.get(key)
+            if stale is not None:
+                logger.warning(f'Serving stale {key} ({stale.age:.0f}s old): refresh failed with {e!r}')
+                stale.refresh_failed = True
+            raise
+        else:
+            self.set(key, value)
+            return value
+        finally:
+            self.__flights.pop(key, None)
+
+
+class SharedCache:
+    """
+    Raw API responses in Redis, shared by the processes of the bot.
+    It's the second tier behind the in-memory cache of every process, which keeps parsed objects:
+    a process fetches from the API only what none of them has fetched within ``ttl``.
+    Off until configured, and a failing Redis only means a miss
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.prefix = 'cache'
+        self.ttl = 0
+
+    def configure(self, redis, ttl: float, prefix: str = 'cache'):
+        """
+        :param redis: ``aioredis.Redis`` client decoding the responses
+        :param ttl: seconds a response is kept
+        :param prefix: of the keys
+        """
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    async def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+        try:
+            raw = await self.redis.get(f'{self.prefix}:{key}')
+        except Exception as e:
+            logger.warning(f'Shared cache is unavailable: {e!r}')
+            return None
+        return codec.loads(raw) if raw else None
+
+    async def set(self, key: str, response: Any, ttl: float | None = None):
+        """ :param ttl: seconds the response is kept, ``ttl`` of the cache if None """
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            await self.redis.set(f'{self.prefix}:{key}', codec.dumps(response), ex=max(int(ttl), 1))
+        except Exception as e:
+            logger.warning(f'Shared cache is unavailable: {e!r}')
+
+
+class CacheSnapshot:
+    """
+    The response cache saved to a file periodically and on shutdown, so a restarted bot starts warm.
+    Entries keep their ages across the restart. Cached objects hold the codes of ``HSEntities``,
+    so the snapshot is used only with the ``hs_entities.json`` it was saved with
+    """
+
+    FORMAT = b'1'   # bump when the cached classes change
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self.path: Path | None = None
+        self.interval = 300
+        self.digest = b''
+        self.__task: asyncio.Task | None = None
+        self.__lock = threading.Lock()     # a periodic save may still be writing when the final one starts
+
+    def configure(self, path: Path | None, interval: float):
+        """
+        :param path: snapshot file, None to disable the snapshots
+        :param interval: seconds between the saves, 0 to save on shutdown only
+        """
+        self.path = path
+        self.interval = interval
+        self.digest = source_digest(self.FORMAT + HS_ENTITIES_SOURCE.read_bytes()) if path else b''
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def load(self) -> int:
+        """
+        Restore the cache from the snapshot. A missing, outdated or broken snapshot is ignored
+
+        :return: number of the restored entries
+        """
+        if not self.enabled:
+            return 0
+        snapshot = read_snapshot(self.path, self.digest)
+        if snapshot is None:
+            logger.info(f'No usable snapshot of the response cache in {self.path}')
+            return 0
+        saved_at, entries = snapshot
+        downtime = max(time.time() - saved_at, 0)
+        restored = self.cache.restore([(key, value, age + downtime) for key, value, age in entries])
+        logger.info(f'Restored {restored} of {len(entries)} cached responses, saved {downtime:.0f}s ago')
+        return restored
+
+    async def save(self):
+        if not self.enabled:
+            return
+        snapshot = (time.time(), self.cache.export())
+        try:
+            await asyncio.to_thread(self.__write, snapshot)
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning(f"Couldn't save the response cache to {self.path}: {e!r}")
+
+    def __write(self, snapshot: tuple[float, list]):
+        with self.__lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            write_snapshot(self.path, self.digest, snapshot)
+
+    def start(self):
+        if self.enabled and self.interval > 0 and self.__task is None:
+            self.__task = asyncio.create_task(self.__run(), name='cache-snapshot')
+
+    async def stop(self):
+        """ Stop the periodic saves and save the cache for the next start """
+        if self.__task is not None:
+            self.__task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.__task
+            self.__task = None
+        await self.save()
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, stale_ttl=RESPONSE_CACHE_STALE_TTL, max_size=RESPONSE_CACHE_SIZE)
+shared_cache = SharedCache()
+cache_snapshot = CacheSnapshot(response_cache)
@@ -0,0 +1,60 @@
+from aiogram import types
+from aiogram.utils.exceptions import InvalidQueryID
+
+import asyncio
+import time
+from contextlib import suppress
+from contextvars import ContextVar
+
+from .metrics import callback_answer_duration
+
+
+class CallbackAck:
+    """ Acknowledgement of a single callback query. Makes sure the query is answered only once """
+
+    def __init__(self, call: types.CallbackQuery):
+        self.call = call
+        self.received_at = time.monotonic()
+        self.answered = False
+        self.gap: float | None = None
+        self.timer: asyncio.Task | None = None
+
+    async def answer(self, text: str = None) -> bool:
+        """
+        Answer the callback query if it hasn't been answered yet
+
+        :param text: hint shown to the user as a toast
+        :return: True if the query has been answered by this call
+        """
+        if self.answered:
+            return False
+        self.answered = True
+        self.gap = time.monotonic() - self.received_at
+        callback_answer_duration.observe(self.gap)
+        with suppress(InvalidQueryID):
+            await self.call.answer(text)
+        return True
+
+    async def answer_later(self, delay: float):
+        """ Answer the callback query with no hint after ``delay`` seconds """
+        await asyncio.sleep(delay)
+        await self.answer()
+
+
+current_ack: ContextVar[CallbackAck] = ContextVar('current_ack')
+
+
+async def answer_callback(call: types.CallbackQuery, text: str = None):
+    """
+    Answer the callback query, or deliver the hint as a message if it's already been answered
+
+    :param call: callback query from handler
+    :param text: hint for the user
+    """
+    ack = current_ack.get(None)
+    if ack is None or ack.call is not call:
+        await call.answer(text)
+        return
+
+    if not await ack.answer(text) and text:
+        await call.bot.send_message(chat_id=call.message.chat.id, text=text, disable_notification=True)
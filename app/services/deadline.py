@@ -0,0 +1,49 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, TypeVar
+
+from app.exceptions import DeadlineExceeded
+
+T = TypeVar('T')
+
+current_deadline: ContextVar[float] = ContextVar('current_deadline')
+
+
+def set_deadline(timeout: float):
+    """ Set the deadline of the current update ``timeout`` seconds from now """
+    current_deadline.set(asyncio.get_running_loop().time() + timeout)
+
+
+def time_left() -> float | None:
+    """
+    Seconds left until the deadline of the current update, or None if there is no deadline
+
+    :raise DeadlineExceeded: if the deadline has passed
+    """
+    deadline = current_deadline.get(None)
+    if deadline is None:
+        return None
+    left = deadline - asyncio.get_running_loop().time()
+    if left <= 0:
+        raise DeadlineExceeded('The update is being processed for too long')
+    return left
+
+
+async def within_deadline(aw: Awaitable[T]) -> T:
+    """
+    Await ``aw``, abandon it when the deadline of the current update passes
+
+    :raise DeadlineExceeded: if the deadline passes
+    """
+    try:
+        timeout = time_left()
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise
+    if timeout is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded('The update is being processed for too long') from None
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+import platform
+
+from app.config import EVENT_LOOPS
+
+logger = logging.getLogger('app')
+
+
+def install_event_loop_policy(name: str = 'asyncio') -> str:
+    """
+    Set the event loop policy for ``asyncio.run``
+
+    :param name: ``asyncio``, ``uvloop``, or ``auto`` for uvloop if it's installed.
+        Without uvloop installed, the asyncio loop is used with a warning
+    :return: name of the loop in use
+    :raise ValueError: if the name is unknown
+    """
+    if name not in EVENT_LOOPS:
+        raise ValueError(f'Unknown event loop {name!r}, expected one of {", ".join(EVENT_LOOPS)}')
+    if platform.system() == 'Windows':     # uvloop doesn't support Windows
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return 'asyncio'
+    if name == 'asyncio':
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+
+    try:
+        import uvloop
+    except ImportError:
+        if name == 'uvloop':
+            logger.warning('uvloop is not installed, using the asyncio event loop')
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
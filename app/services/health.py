@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from .resilience import backoff_delay
+
+logger = logging.getLogger('app')
+
+Check = Callable[[], Awaitable]     # raises or returns a falsy value when the dependency is unavailable
+
+
+async def run_check(check: Check, timeout: float) -> bool:
+    try:
+        return await asyncio.wait_for(check(), timeout) is not False
+    except Exception as e:
+        logger.debug(f'Health check failed: {e!r}')
+        return False
+
+
+async def wait_available(check: Check, attempts: int, timeout: float, backoff_base: float, backoff_max: float) -> bool:
+    """
+    Run the check until it passes
+
+    :param check: f.e. ``RedisStorage.ping``
+    :param attempts: total number of attempts
+    :param timeout: seconds for a single attempt
+    :param backoff_base: seconds, doubled for every next attempt
+    :param backoff_max: seconds
+    :return: whether the check passed
+    """
+    for attempt in range(attempts):
+        if await run_check(check, timeout):
+            return True
+        if attempt + 1 < attempts:
+            delay = backoff_delay(attempt, backoff_base, backoff_max)
+            logger.warning(f'Health check failed ({attempt + 1}/{attempts}), retrying in {delay:.1f}s')
+            await asyncio.sleep(delay)
+    return False
+
+
+class ReadinessProbe:
+    """
+    Runs the checks of the dependencies in the background, so ``/ready`` answers
+    with the latest results at once instead of probing on every request
+    """
+
+    def __init__(self, interval: float = 15, timeout: float = 2):
+        """
+        :param interval: seconds between the rounds of checks
+        :param timeout: seconds for a single check
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self.checks: dict[str, Check] = {}
+        self.results: dict[str, bool] = {}
+        self.checked_at: float | None = None    # monotonic time of the last round
+        self.__task: asyncio.Task | None = None
+
+    def configure(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+
+    def add(self, name: str, check: Check):
+        self.checks[name] = check
+        self.results[name] = True   # passed on startup
+
+    @property
+    def ready(self) -> bool:
+        return all(self.results.values())
+
+    async def run_checks(self):
+        names = list(self.checks)
+        results = await asyncio.gather(*(run_check(self.checks[name], self.timeout) for name in names))
+        for name, result in zip(names, results):
+            if result != self.results.get(name):
+                log = logger.info if result else logger.warning
+                log(f'Dependency "{name}" is {"available" if result else "unavailable"}')
+            self.results[name] = result
+        self.checked_at = time.monotonic()
+
+    def start(self):
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__run(), name='readiness-probe')
+
+    async def stop(self):
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_checks()
+
+
+probe = ReadinessProbe()
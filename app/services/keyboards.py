@@ -1,7 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from aiogram.utils.callback_data import CallbackData
 
-from app.config import hs_data
+from app.config import get_hs_data
 
 KeyboardMarkup = ReplyKeyboardMarkup | InlineKeyboardMarkup | ReplyKeyboardRemove | None
 Btns = list[tuple[str | InlineKeyboardButton, ...] | str]
@@ -159,19 +159,19 @@ class CardKeyboardBuilder(KeyboardBuilder):
                 buttons = []
             case 'ctype':
                 type_btns = [InlineKeyboardButton(t.en, callback_data=cardparam_cd.new(param=t.sign, action='submit'))
-                             for t in hs_data.types]
+                             for t in get_hs_data().types]
                 buttons = self.group_buttons(type_btns)
             case 'classes':
                 class_btns = [InlineKeyboardButton(c.en, callback_data=cardparam_cd.new(param=c.en, action='submit'))
-                              for c in hs_data.classes]
+                              for c in get_hs_data().classes]
                 buttons = self.group_buttons(class_btns)
             case 'cset':
                 set_btns = [InlineKeyboardButton(s.en, callback_data=cardparam_cd.new(param=s.en, action='submit'))
-                            for s in hs_data.sets]
+                            for s in get_hs_data().sets]
                 buttons = self.group_buttons(set_btns)
             case 'rarity':
                 rarity_btns = [InlineKeyboardButton(r.en, callback_data=cardparam_cd.new(param=r.sign, action='submit'))
-                               for r in hs_data.rarities]
+                               for r in get_hs_data().rarities]
                 buttons = self.group_buttons(rarity_btns)
             case _:
                 raise ValueError(f'Unknown card parameter: {param}')
@@ -316,11 +316,11 @@ class DeckKeyboardBuilder(KeyboardBuilder):
                 buttons = []
             case 'dformat':
                 fmt_btns = [InlineKeyboardButton(f.en, callback_data=deckparam_cd.new(param=f.en, action='submit'))
-                            for f in hs_data.formats]
+                            for f in get_hs_data().formats]
                 buttons = self.group_buttons(fmt_btns)
             case 'dclass':
                 class_btns = [InlineKeyboardButton(c.en, callback_data=deckparam_cd.new(param=c.en, action='submit'))
-                              for c in hs_data.classes if c.en.lower() != 'neutral']
+                              for c in get_hs_data().classes if c.en.lower() != 'neutral']
                 buttons = self.group_buttons(class_btns)
             case _:
                 raise ValueError(f'Unknown deck parameter: {param}')
@@ -337,9 +337,11 @@ class DeckKeyboardBuilder(KeyboardBuilder):
         all_decks = self.data['deck_list']['decks']
         total_pages = len(all_decks)
         page_decks = all_decks[page - 1] if all_decks else []
+        hs_data = get_hs_data()
 
         deck_buttons = [
-            InlineKeyboardButton(f'{i}. id{deck["id"]} {deck["deck_format"]} {deck["deck_class"]}',
+            InlineKeyboardButton(f'{i}. id{deck["id"]} {hs_data.label("formats", deck["deck_format"])} '
+                                 f'{hs_data.label("classes", deck["deck_class"])}',
                                  callback_data=decklist_cd.new(id=deck['id'], action='get'))
             for i, deck in enumerate(page_decks, start=1)
         ]
@@ -1,6 +1,7 @@
 from aiogram.utils import markdown as md
 
-from app.config import hs_data, CARD_RENDER_BASE_URL, BASE_URL
+from app.config import get_hs_data, get_card_render_base_url, get_base_url
+from .tracing import traced
 
 
 class TextBuilder:
@@ -19,6 +20,25 @@ class TextBuilder:
             return '--empty--'
         return '\n'.join(self.rows)
 
+    @staticmethod
+    def outdated_note(age: float) -> str:
+        """ Return a note for the content cached ``age`` seconds ago and served while the server is down """
+        if age < 3600:
+            verbose_age = f'{max(int(age // 60), 1)} min'
+        else:
+            verbose_age = f'{int(age // 3600)} h'
+        return CommonMessage.OUTDATED_.format(verbose_age)
+
+
+def card_prefix(card: dict) -> str:
+    """ Emojis of the card type and rarity, given as codes or names """
+    hs_data = get_hs_data()
+    ctype = hs_data.entity('types', card.get('card_type'))
+    rarity = hs_data.entity('rarities', card.get('rarity'))
+    if ctype is None or rarity is None:
+        return '❓ ❔'
+    return f'{ctype.emoji} {rarity.emoji}'
+
 
 class CardRequestInfo(TextBuilder):
     """ Encapsulates text of CardRequestInfoMessage """
@@ -48,7 +68,7 @@ class CardRequestInfo(TextBuilder):
             self.rows.append(self.name.format(self.data['name']))
         if self.data.get('ctype'):
             try:
-                verbose_type = hs_data.gettype(sign=self.data['ctype']).en
+                verbose_type = get_hs_data().gettype(sign=self.data['ctype']).en
             except StopIteration:
                 verbose_type = 'Unknown ❗️'
             self.rows.append(self.ctype.format(verbose_type))
@@ -59,7 +79,7 @@ class CardRequestInfo(TextBuilder):
             self.rows.append(self.cset.format(self.data['cset']))
         if self.data.get('rarity'):
             try:
-                verbose_rarity = hs_data.getrarity(sign=self.data['rarity']).en
+                verbose_rarity = get_hs_data().getrarity(sign=self.data['rarity']).en
             except StopIteration:
                 verbose_rarity = 'Unknown ❗️'
             self.rows.append(self.rarity.format(verbose_rarity))
@@ -74,6 +94,7 @@ class CardRequestInfo(TextBuilder):
         if self.data.get('armor'):
             self.rows.append(self.armor.format(self.data['armor']))
 
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -87,6 +108,7 @@ class CardListInfo(TextBuilder):
         self.__cardlist: list[list[dict]] = data['cardlist']['cards']
         self.page: int = data['cardlist']['page']
         self.total = data['cardlist']['total']
+        self.outdated = data['cardlist'].get('outdated')
         self.__cards: list[dict] = self.__cardlist[self.page - 1] if self.__cardlist else []
         self.header = f'Cards found: <b>{self.total}</b>\n'
         super().__init__()
@@ -96,16 +118,10 @@ class CardListInfo(TextBuilder):
 
         if self.__cards:
             for idx, card in enumerate(self.__cards, start=1):
-                try:
-                    rarity = hs_data.getrarity(name=card['rarity'])
-                    ctype = hs_data.gettype(name=card['card_type'])
-                    prefix = f'{ctype.emoji} {rarity.emoji}'
-                except (KeyError, StopIteration):
-                    prefix = '❓ ❔'
                 row = md.text(
                     f'{idx}.',
-                    prefix,
-                    md.hlink(card['name'], url=f'{CARD_RENDER_BASE_URL}en/{card["card_id"]}.png'),
+                    card_prefix(card),
+                    md.hlink(card['name'], url=f'{get_card_render_base_url()}en/{card["card_id"]}.png'),
                 )
                 self.rows.append(row)
 
@@ -113,6 +129,10 @@ class CardListInfo(TextBuilder):
         else:
             self.rows.append('Try changing the request parameters.')
 
+        if self.outdated:
+            self.rows.append(self.outdated_note(self.outdated))
+
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -123,13 +143,15 @@ class CardDetailInfo(TextBuilder):
     """ Encapsulates text of CardDetailMessage """
 
     def __init__(self, data: dict):
+        hs_data = get_hs_data()
         self.__card = data['card_detail']
+        self.outdated = data.get('card_detail_outdated')
         self.header = f'<b>{self.__card["name"]}</b>'
         self.id = f'ID: {self.__card["dbf_id"]}'
-        self.ctype = f'<b>{self.__card["card_type"]}</b>'
-        self.classes = ' | '.join(f'<b>{c}</b>' for c in self.__card["card_class"])
-        self.cset = f'Set: <i>{self.__card["card_set"]}</i>'
-        self.rarity = f'<b>{self.__card["rarity"]}</b>'
+        self.ctype = f'<b>{hs_data.label("types", self.__card["card_type"])}</b>'
+        self.classes = ' | '.join(f'<b>{hs_data.label("classes", c)}</b>' for c in self.__card["card_class"])
+        self.cset = f'Set: <i>{hs_data.label("sets", self.__card["card_set"])}</i>'
+        self.rarity = f'<b>{hs_data.label("rarities", self.__card["rarity"])}</b>'
         self.stats = self.__make_stats()
         self.text = self.__card["text"]
 
@@ -182,17 +204,18 @@ class CardDetailInfo(TextBuilder):
         if self.artist:
             self.rows.append(self.artist)
 
+        if self.outdated:
+            self.rows.append(self.outdated_note(self.outdated))
+
     def __make_stats(self) -> str:
         """ Return string for numeric parameters depending on card type """
         cost = self.__card.get('cost', '?')
 
-        try:
-            card_type = self.__card['card_type']
-            card_type_sign = hs_data.gettype(name=card_type).sign
-        except (KeyError, StopIteration):
+        card_type = get_hs_data().entity('types', self.__card.get('card_type'))
+        if card_type is None:
             return f'{cost} mana ?/?'
 
-        match card_type_sign:
+        match card_type.sign:
             case 'M':
                 attack = self.__card.get('attack', '?')
                 health = self.__card.get('health', '?')
@@ -212,6 +235,7 @@ class CardDetailInfo(TextBuilder):
             case _:
                 return f'{cost} mana ?/?'
 
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -224,31 +248,26 @@ class DeckDetailInfo(TextBuilder):
     def __init__(self, data: dict):
         super().__init__()
         self.deck: dict = data['deck_detail']
-        self.dformat = self.deck.get('deck_format', 'UNKNOWN')
-        self.dclass = self.deck.get('deck_class', 'UNKNOWN')
+        self.outdated = data.get('deck_detail_outdated')
+        self.dformat = get_hs_data().label('formats', self.deck.get('deck_format', 'UNKNOWN'))
+        self.dclass = get_hs_data().label('classes', self.deck.get('deck_class', 'UNKNOWN'))
         self.date = self.deck.get('created', '??.??.????')
         self.cards: list[dict] = self.deck['cards']
         self.string = self.deck['string']
 
     def format(self):
         deck_id = self.deck["id"]
-        link = md.hlink(f'{self.dformat} {self.dclass} deck (id{deck_id})', url=f'{BASE_URL}/en/decks/{deck_id}')
+        link = md.hlink(f'{self.dformat} {self.dclass} deck (id{deck_id})', url=f'{get_base_url()}/en/decks/{deck_id}')
         self.rows.append(f'<b>►►► {link} ◄◄◄</b>')
         self.rows.append(f'\nCreated: <b>{self.date}</b>\n')
 
         for card in self.cards:
             cost = card["card"]["cost"]
-            url = f'{CARD_RENDER_BASE_URL}en/{card["card"]["card_id"]}.png'
-            try:
-                rarity = hs_data.getrarity(name=card['card']['rarity'])
-                ctype = hs_data.gettype(name=card['card']['card_type'])
-                prefix = f'{ctype.emoji} {rarity.emoji}'
-            except (KeyError, StopIteration):
-                prefix = '❓ ❔'
+            url = f'{get_card_render_base_url()}en/{card["card"]["card_id"]}.png'
             row = md.text(
                 f'{card["number"]}x',
                 f'({cost}){"  " if cost < 10 else ""}',
-                prefix,
+                card_prefix(card['card']),
                 f'{md.hlink(card["card"]["name"], url=url)}',
             )
             self.rows.append(row)
@@ -256,6 +275,10 @@ class DeckDetailInfo(TextBuilder):
         self.rows.append('')
         self.rows.append(md.hcode(self.string))
 
+        if self.outdated:
+            self.rows.append(self.outdated_note(self.outdated))
+
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -289,10 +312,11 @@ class DeckRequestInfo(TextBuilder):
             for card in self.data['deck_cards']:
                 row = md.text(
                     '-',
-                    md.hlink(card['name'], url=f'{CARD_RENDER_BASE_URL}en/{card["card_id"]}.png'),
+                    md.hlink(card['name'], url=f'{get_card_render_base_url()}en/{card["card_id"]}.png'),
                 )
                 self.rows.append(row)
 
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -306,6 +330,7 @@ class DeckListInfo(TextBuilder):
         self.__decklist: list[list[dict]] = data['deck_list']['decks']
         self.page: int = data['deck_list']['page']
         self.total = data['deck_list']['total']
+        self.outdated = data['deck_list'].get('outdated')
         self.__decks: list[dict] = self.__decklist[self.page - 1] if self.__decklist else []
         self.header = f'Decks found: <b>{self.total}</b>\n'
         super().__init__()
@@ -314,13 +339,16 @@ class DeckListInfo(TextBuilder):
         self.rows.append(self.header)
 
         if self.__decks:
+            hs_data = get_hs_data()
             for idx, deck in enumerate(self.__decks, start=1):
+                dformat = hs_data.label('formats', deck['deck_format'])
+                dclass = hs_data.label('classes', deck['deck_class'])
                 row = md.text(
                     md.text(
                         f'{idx}.',
                         md.hlink(
-                            f'{deck["deck_format"]} {deck["deck_class"]} deck (id{deck["id"]})',
-                            url=f'{BASE_URL}/en/decks/{deck["id"]}'
+                            f'{dformat} {dclass} deck (id{deck["id"]})',
+                            url=f'{get_base_url()}/en/decks/{deck["id"]}'
                         ),
                     ),
                     md.hbold(deck["created"]),
@@ -334,6 +362,10 @@ class DeckListInfo(TextBuilder):
         else:
             self.rows.append('Try changing the request parameters.')
 
+        if self.outdated:
+            self.rows.append(self.outdated_note(self.outdated))
+
+    @traced
     def as_text(self) -> str:
         if not self.rows:
             self.format()
@@ -388,11 +420,22 @@ class CommonMessage:
     INVALID_DECKLIST = '❗️ Couldn\'t extract the deck code'
 
     SERVER_UNAVAILABLE = 'The server is unavailable. Please try again later'
+    OUTDATED_ = '🕓 <i>Cached {} ago, the server is unavailable now</i>'
     EMPTY_REQUEST_HINT = 'You must provide at least 1 parameter for the search'
     TOO_MANY_RESULTS_HINT_ = 'Too many results ({}). Please specify more parameters'
     UNKNOWN_ERROR = 'Unknown error :('
 
 
+class AdminMessage:
+    """ Replies to the admin commands """
+    PROFILER_STARTED = '🔬 Profiler started. Send /profile_stop to get the report'
+    PROFILER_RUNNING = 'Profiler is already running'
+    PROFILER_NOT_RUNNING = 'Profiler is not running. Send /profile_start first'
+    PROFILER_REPORT_ = '<b>{} samples</b> in {:.1f}s\n\nHot functions:\n{}'
+    STORAGE_LATENCY_ = '<b>FSM storage latency</b> since the start, ms:\n{}'
+    STORAGE_IDLE = 'No FSM storage operations yet'
+
+
 class InvalidInput:
     """ Hints on how to enter the parameter correctly """
     NAME_TOO_LONG = 'Name <b>must not</b> exceed <i>30</i> characters. Try again:'
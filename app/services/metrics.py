@@ -0,0 +1,211 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from .cache import response_cache
+from .health import probe
+
+LabelValues = tuple[str, ...]
+Sample = tuple[str, dict[str, str], float]     # name suffix, labels, value
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+def escape(value: str, quotes: bool = True) -> str:
+    """ Escape the label value, or the HELP text (where quotes are left as is) """
+    value = value.replace('\\', r'\\').replace('\n', r'\n')
+    return value.replace('"', r'\"') if quotes else value
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """ Metric in the Prometheus text exposition format """
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Callable[[], dict[LabelValues, float]] = None):
+        """
+        :param name: metric name, f.e. ``hdh_api_request_duration_seconds``
+        :param documentation: HELP text
+        :param labelnames: names of the labels
+        :param function: returns the values by label values on every scrape, instead of the stored ones
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: dict[LabelValues, float] = {}
+
+    def label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Sample]:
+        values = self.function() if self.function else self._values
+        for label_values, value in values.items():
+            yield '', dict(zip(self.labelnames, label_values)), value
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {escape(self.documentation, quotes=False)}', f'# TYPE {self.name} {self.TYPE}']
+        for suffix, labels, value in self.samples():
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+            label_text = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{self.name}{suffix}{label_text} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self.label_values(labels)] = value
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(set(buckets) | {math.inf}))
+        self.__counts: dict[LabelValues, list[int]] = {}
+        self.__sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.label_values(labels)
+        counts = self.__counts.setdefault(key, [0] * len(self.buckets))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self.__sums[key] = self.__sums.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observe the duration of the block """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        counts = self.__counts.get(self.label_values(labels))
+        return counts[-1] if counts else 0
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """
+        Estimate the quantile from the buckets, interpolating within the bucket
+        as ``histogram_quantile`` of Prometheus does
+
+        :param q: from 0 to 1, f.e. 0.95
+        :return: None if nothing is observed
+        """
+        counts = self.__counts.get(self.label_values(labels))
+        if not counts or not counts[-1]:
+            return None
+        rank = q * counts[-1]
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in zip(self.buckets, counts):
+            if count >= rank and count > lower_count:
+                if bound == math.inf:   # the highest finite bound is the best guess
+                    return lower_bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+    def label_sets(self) -> list[dict[str, str]]:
+        """ Labels of the observed series """
+        return [dict(zip(self.labelnames, key)) for key in self.__counts]
+
+    def samples(self) -> Iterable[Sample]:
+        for key, counts in self.__counts.items():
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield '_bucket', labels | {'le': format_value(bound)}, count
+            yield '_sum', labels, self.__sums[key]
+            yield '_count', labels, counts[-1]
+
+
+class Registry:
+    """ Metrics exposed on ``/metrics`` """
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+registry = Registry()
+
+handler_duration = registry.register(Histogram(
+    'hdh_handler_duration_seconds', 'Time spent in update handlers', ['handler'],
+))
+api_request_duration = registry.register(Histogram(
+    'hdh_api_request_duration_seconds', 'HS Deck Helper API request attempts', ['request', 'status'],
+))
+storage_duration = registry.register(Histogram(
+    'hdh_storage_duration_seconds', 'FSM storage operations', ['operation'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+))
+telegram_request_duration = registry.register(Histogram(
+    'hdh_telegram_request_duration_seconds', 'Telegram Bot API calls', ['method'],
+))
+callback_answer_duration = registry.register(Histogram(
+    'hdh_callback_answer_seconds', 'Time from receiving a callback query to answering it',
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10),
+))
+telegram_retry_after = registry.register(Counter(
+    'hdh_telegram_retry_after_total', 'Telegram Bot API calls rejected by flood control (429)', ['method'],
+))
+stream_entries = registry.register(Counter(
+    'hdh_stream_entries_total', 'Updates pushed into the Redis streams and acknowledged by the workers', ['stage'],
+))
+registry.register(Counter(
+    'hdh_response_cache_lookups_total', 'Response cache lookups by result', ['result'],
+    function=lambda: {
+        ('hit',): response_cache.hits,
+        ('stale',): response_cache.stale_hits,
+        ('miss',): response_cache.misses,
+    },
+))
+registry.register(Gauge(
+    'hdh_response_cache_hit_ratio', 'Share of response cache lookups served from the cache',
+    function=lambda: {(): response_cache.hit_ratio},
+))
+registry.register(Gauge(
+    'hdh_response_cache_entries', 'Entries in the response cache',
+    function=lambda: {(): len(response_cache)},
+))
+registry.register(Gauge(
+    'hdh_response_cache_oldest_entry_seconds', 'Age of the oldest entry in the response cache',
+    function=lambda: {(): max(response_cache.ages(), default=0)},
+))
+registry.register(Gauge(
+    'hdh_dependency_up', 'Whether the last readiness check of the dependency passed', ['dependency'],
+    function=lambda: {(name,): float(result) for name, result in probe.results.items()},
+))
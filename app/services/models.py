@@ -0,0 +1,129 @@
+import sys
+from typing import Any
+
+from app.config import get_hs_data
+
+
+def intern_value(value: Any) -> Any:
+    """ Intern the string, or every string of the list """
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(sys.intern(v) if isinstance(v, str) else v for v in value)
+    return value
+
+
+def encode_value(table: str, value: Any) -> Any:
+    """ Replace the entity name, or every name of the list, with its code in the ``HSEntities`` table """
+    hs_data = get_hs_data()
+    if isinstance(value, (list, tuple)):
+        return intern_value([hs_data.encode(table, v) for v in value])
+    if value is None:
+        return None
+    return intern_value(hs_data.encode(table, value))   # unknown names stay as interned strings
+
+
+class Model:
+    """
+    Compact domain object built from an API response.
+
+    Keeps only the fields the bot renders. Categorical fields (``CODED``) are replaced with
+    the codes of ``HSEntities``, so renderers index the tables instead of searching by name.
+    Other enum-like strings (``INTERNED``) are interned, so thousands of cached cards
+    share a handful of string objects. ``as_dict`` returns the plain form stored in the FSM state
+    """
+
+    __slots__ = ()
+    FIELDS: tuple[str, ...] = ()            # all slots, collected from the class hierarchy
+    CODED: dict[str, str] = {}              # field -> HSEntities table; lists are stored as tuples
+    INTERNED: frozenset[str] = frozenset()  # lists among them are stored as tuples
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = tuple(field for klass in reversed(cls.__mro__) for field in klass.__dict__.get('__slots__', ()))
+
+    @classmethod
+    def from_api(cls, data: dict):
+        """ Build the object from JSON response, drop unused fields """
+        obj = cls.__new__(cls)
+        for field in cls.FIELDS:
+            value = data.get(field)
+            if field in cls.CODED:
+                value = encode_value(cls.CODED[field], value)
+            elif field in cls.INTERNED:
+                value = intern_value(value)
+            setattr(obj, field, value)
+        return obj
+
+    def as_dict(self) -> dict:
+        """ Plain representation with the API field names. Missing fields are None, as the renderers expect them """
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            data[field] = list(value) if isinstance(value, tuple) else value
+        return data
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.FIELDS)
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDS[:3])
+        return f'{type(self).__name__}({fields}, ...)'
+
+
+class CardSummary(Model):
+    """ Card as an item of the CardList or the deck """
+
+    __slots__ = ('dbf_id', 'card_id', 'name', 'card_type', 'rarity', 'cost')
+    CODED = {'card_type': 'types', 'rarity': 'rarities'}
+
+
+class Card(CardSummary):
+    """ Card with the details shown in CardDetail """
+
+    __slots__ = ('card_class', 'card_set', 'attack', 'health', 'durability', 'armor',
+                 'text', 'flavor', 'tribe', 'spell_school', 'artist', 'mechanic')
+    CODED = CardSummary.CODED | {'card_class': 'classes', 'card_set': 'sets'}
+    INTERNED = frozenset({'tribe', 'spell_school', 'mechanic'})
+
+
+class DeckEntry(Model):
+    """ Card of the deck with the number of its copies """
+
+    __slots__ = ('card', 'number')
+
+    @classmethod
+    def from_api(cls, data: dict) -> 'DeckEntry':
+        entry = cls.__new__(cls)
+        entry.card = CardSummary.from_api(data['card'])
+        entry.number = data['number']
+        return entry
+
+    def as_dict(self) -> dict:
+        return {'card': self.card.as_dict(), 'number': self.number}
+
+
+class DeckSummary(Model):
+    """ Deck as an item of the DeckList """
+
+    __slots__ = ('id', 'deck_format', 'deck_class', 'created', 'string')
+    CODED = {'deck_format': 'formats', 'deck_class': 'classes'}
+
+
+class Deck(DeckSummary):
+    """ Deck with its cards """
+
+    __slots__ = ('cards',)
+
+    @classmethod
+    def from_api(cls, data: dict) -> 'Deck':
+        deck = super().from_api(data)
+        deck.cards = tuple(DeckEntry.from_api(entry) for entry in data.get('cards') or ())
+        return deck
+
+    def as_dict(self) -> dict:
+        data = super().as_dict()
+        data['cards'] = [entry.as_dict() for entry in self.cards]
+        return data
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Hashable
+
+from app.config import PAGINATION_DEBOUNCE_WINDOW
+from .turns import step_aside
+
+
+class PageFlipDebouncer:
+    """
+    Coalesce rapid page flips of a paginated message into a single edit.
+
+    The first flip of a message opens a short window and waits for it to pass.
+    Flips that arrive within the window only add their offset to the pending one and return at once,
+    so the whole burst is applied by the first flip. While it waits, it steps aside
+    for the next updates of its chat, which are handled one after another by the stream workers.
+    """
+
+    def __init__(self, window: float):
+        """
+        :param window: debounce window in seconds
+        """
+        self.window = window
+        self.__pending: dict[Hashable, int] = {}
+
+    async def push(self, key: Hashable, offset: int) -> int | None:
+        """
+        Register a page flip
+
+        :param key: paginated message identifier, f.e. ``(chat_id, message_id)``
+        :param offset: number of pages to flip, negative for flipping to the left
+        :return: accumulated offset if the caller must apply it, None if the flip is coalesced
+        """
+        if key in self.__pending:
+            self.__pending[key] += offset
+            return None
+
+        self.__pending[key] = offset
+        try:
+            async with step_aside():
+                await asyncio.sleep(self.window)
+        finally:
+            offset = self.__pending.pop(key)
+        return offset
+
+
+page_flips = PageFlipDebouncer(window=PAGINATION_DEBOUNCE_WINDOW)
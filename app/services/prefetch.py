@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Hashable
+
+from app.config import PREFETCH_CONCURRENCY
+from app.exceptions import DeadlineExceeded
+from .api import Request, RequestSingleCard, RequestSingleDeck, API_ERRORS
+
+logger = logging.getLogger('app')
+
+
+class Prefetcher:
+    """
+    Warm the response cache in background, so that detail views open from the cache.
+
+    Prefetches are grouped by key (f.e. chat id): scheduling a new group cancels the previous one.
+    Requests wait in a priority queue ordered by their position in the group,
+    so the first items of every group are fetched before the rest.
+    """
+
+    def __init__(self, concurrency: int):
+        """
+        :param concurrency: max number of requests in flight for all groups
+        """
+        self.concurrency = concurrency
+        self.__queue: list[tuple[int, int, Hashable, Request]] = []
+        self.__order = itertools.count()
+        self.__running: dict[Hashable, set[asyncio.Task]] = {}
+        self.__in_flight = 0
+
+    def schedule(self, key: Hashable, requests: list[Request]):
+        """
+        Cancel prefetches of the group ``key`` and queue the new ones
+
+        :param key: group identifier
+        :param requests: requests ordered by priority, the first one is the most wanted
+        """
+        self.cancel(key)
+        for position, request in enumerate(requests):
+            heapq.heappush(self.__queue, (position, next(self.__order), key, request))
+        self.__pump()
+
+    def cancel(self, key: Hashable):
+        """ Drop queued prefetches of the group ``key`` and cancel the running ones """
+        if any(item[2] == key for item in self.__queue):
+            self.__queue = [item for item in self.__queue if item[2] != key]
+            heapq.heapify(self.__queue)
+        for task in self.__running.pop(key, ()):
+            task.cancel()
+
+    def clear(self):
+        """ Drop all the queued prefetches and cancel the running ones, f.e. on shutdown """
+        self.__queue.clear()
+        for key in list(self.__running):
+            self.cancel(key)
+
+    def pending(self, key: Hashable) -> int:
+        """ Number of queued and running prefetches of the group ``key`` """
+        queued = sum(1 for item in self.__queue if item[2] == key)
+        return queued + len(self.__running.get(key, ()))
+
+    def __pump(self):
+        """ Start queued prefetches while there are free slots """
+        while self.__queue and self.__in_flight < self.concurrency:
+            *_, key, request = heapq.heappop(self.__queue)
+            task = asyncio.create_task(self.__warm(request))
+            self.__in_flight += 1
+            self.__running.setdefault(key, set()).add(task)
+            task.add_done_callback(lambda t, k=key: self.__done(k, t))
+
+    def __done(self, key: Hashable, task: asyncio.Task):
+        self.__in_flight -= 1
+        tasks = self.__running.get(key)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self.__running[key]
+        self.__pump()
+
+    @staticmethod
+    async def __warm(request: Request):
+        try:
+            await request.get()
+        except (*API_ERRORS, DeadlineExceeded) as e:
+            logger.debug(f'Prefetch of {request.endpoint} failed: {e}')
+
+
+prefetcher = Prefetcher(concurrency=PREFETCH_CONCURRENCY)
+
+
+def neighbour_pages(page: int, npages: int) -> list[int]:
+    """ Return the page and the next one, wrapping around like ``shift_page`` """
+    next_page = page % npages + 1
+    return [page] if next_page == page else [page, next_page]
+
+
+def prefetch_card_details(chat_id: int, cardlist: dict):
+    """
+    Warm the cache with the cards of the displayed page and the next one
+
+    :param chat_id: chat where the CardList is displayed
+    :param cardlist: ``cardlist`` from the state context
+    """
+    pages: list[list[dict]] = cardlist['cards']
+    if not pages:
+        return
+    cards = [card for page in neighbour_pages(cardlist['page'], len(pages)) for card in pages[page - 1]]
+    prefetcher.schedule(('cards', chat_id), [RequestSingleCard(card['dbf_id']) for card in cards])
+
+
+def prefetch_deck_details(chat_id: int, deck_list: dict):
+    """
+    Warm the cache with the decks of the displayed page and the next one
+
+    :param chat_id: chat where the DeckList is displayed
+    :param deck_list: ``deck_list`` from the state context
+    """
+    pages: list[list[dict]] = deck_list['decks']
+    if not pages:
+        return
+    decks = [deck for page in neighbour_pages(deck_list['page'], len(pages)) for deck in pages[page - 1]]
+    prefetcher.schedule(('decks', chat_id), [RequestSingleDeck(deck['id']) for deck in decks])
+
+
+def drop_prefetches(chat_id: int, *scopes: str):
+    """
+    Cancel prefetches for the lists that are no longer displayed
+
+    :param chat_id: chat where the lists were displayed
+    :param scopes: ``cards`` and/or ``decks``; both if not provided
+    """
+    for scope in scopes or ('cards', 'decks'):
+        prefetcher.cancel((scope, chat_id))
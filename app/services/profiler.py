@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from types import FrameType
+
+from app.config import BASE_DIR
+
+
+def frame_label(frame: FrameType) -> str:
+    """ ``function (path:line)``, the path is relative to the project or to site-packages """
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(str(BASE_DIR)):
+        path = os.path.relpath(path, BASE_DIR)
+    elif 'site-packages' in path:
+        path = path.split('site-packages', 1)[1].lstrip(os.sep)
+    else:
+        path = os.path.basename(path)
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+def collapse(frame: FrameType | None) -> str:
+    """ Stack of the frame in the collapsed form, root first """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+@dataclass(frozen=True)
+class Profile:
+    """ Aggregated samples of a profiling window """
+    stacks: Counter[str]
+    duration: float     # seconds
+    interval: float     # seconds between samples
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """ Stacks in the format of ``flamegraph.pl`` and speedscope, the heaviest first """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def hot_functions(self, top: int = 5) -> list[tuple[str, int]]:
+        """ Functions on top of the stack in most samples """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(top)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread records the stack of the profiled thread
+    every ``interval`` seconds. The profiled code isn't instrumented, so the overhead
+    is the cost of walking a stack a few hundred times per second
+    """
+
+    def __init__(self, interval: float = 0.005, max_duration: float = 600):
+        """
+        :param interval: seconds between samples
+        :param max_duration: seconds, sampling stops by itself if the profiler is forgotten
+        """
+        self.interval = interval
+        self.max_duration = max_duration
+        self.__stacks: Counter[str] = Counter()
+        self.__thread: threading.Thread | None = None
+        self.__stopped = threading.Event()
+        self.__started_at = 0.0
+        self.__finished_at: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None
+
+    def start(self, thread_id: int = None):
+        """
+        Start sampling
+
+        :param thread_id: thread to profile, the calling one (the event loop) by default
+        :raise RuntimeError: if already running
+        """
+        if self.running:
+            raise RuntimeError('Profiler is already running')
+        target = thread_id or threading.get_ident()
+        self.__stacks = Counter()
+        self.__stopped.clear()
+        self.__started_at = time.perf_counter()
+        self.__finished_at = None
+        self.__thread = threading.Thread(target=self.__sample, args=(target,), name='sampling-profiler', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> Profile:
+        """
+        Stop sampling
+
+        :return: samples collected since the start
+        :raise RuntimeError: if not running
+        """
+        if not self.running:
+            raise RuntimeError('Profiler is not running')
+        self.__stopped.set()
+        self.__thread.join()
+        self.__thread = None
+        finished_at = self.__finished_at or time.perf_counter()
+        return Profile(stacks=self.__stacks, duration=finished_at - self.__started_at, interval=self.interval)
+
+    def __sample(self, thread_id: int):
+        deadline = self.__started_at + self.max_duration
+        while not self.__stopped.wait(self.interval):
+            if time.perf_counter() >= deadline:
+                self.__finished_at = time.perf_counter()
+                return
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:   # the thread is gone
+                return
+            self.__stacks[collapse(frame)] += 1
+            del frame
+
+
+profiler = SamplingProfiler()
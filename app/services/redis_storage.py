@@ -0,0 +1,85 @@
+from aiogram.contrib.fsm_storage.redis import RedisStorage2, STATE_KEY, STATE_DATA_KEY, STATE_BUCKET_KEY
+
+import typing
+
+from app.codec import codec
+
+
+class RedisStorage(RedisStorage2):
+    """
+    ``RedisStorage2`` serializing state data and buckets with the bot JSON codec.
+    Writes touching several keys are sent at once instead of a command per key
+    """
+
+    async def ping(self) -> bool:
+        """ Check the server is available, without scanning the keys as ``get_states_list`` does """
+        redis = await (await self._get_adapter()).get_redis()
+        return await redis.ping()
+
+    async def update_state_data(self, *, chat: typing.Union[str, int, None] = None,
+                                user: typing.Union[str, int, None] = None, state: typing.Optional[str] = None,
+                                data: typing.Dict = None, **kwargs):
+        """
+        Set the state and update the data: the data is read, then both keys are written in one transaction.
+        Two round trips instead of three for ``set_state`` followed by ``update_data``
+        """
+        chat, user = self.check_address(chat=chat, user=user)
+        temp_data = await self.get_data(chat=chat, user=user)
+        temp_data.update(data or {}, **kwargs)
+
+        state_key = self.generate_key(chat, user, STATE_KEY)
+        data_key = self.generate_key(chat, user, STATE_DATA_KEY)
+        redis = await (await self._get_adapter()).get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            if state is None:
+                pipe.delete(state_key)
+            else:
+                pipe.set(state_key, self.resolve_state(state), ex=self._state_ttl or None)
+            if temp_data:
+                pipe.set(data_key, codec.dumps(temp_data), ex=self._data_ttl or None)
+            else:
+                pipe.delete(data_key)
+            await pipe.execute()
+
+    async def reset_state(self, *, chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None, with_data: typing.Optional[bool] = True):
+        """ Remove the state and the data with a single command, it's what ``finish`` does """
+        if not with_data:
+            await self.set_state(chat=chat, user=user, state=None)
+            return
+        chat, user = self.check_address(chat=chat, user=user)
+        redis = await self._get_adapter()
+        await redis.delete(self.generate_key(chat, user, STATE_KEY), self.generate_key(chat, user, STATE_DATA_KEY))
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        return await self.__get(STATE_DATA_KEY, chat, user, default)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        await self.__set(STATE_DATA_KEY, chat, user, data, ttl=self._data_ttl)
+
+    async def get_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        return await self.__get(STATE_BUCKET_KEY, chat, user, default)
+
+    async def set_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        await self.__set(STATE_BUCKET_KEY, chat, user, bucket, ttl=self._bucket_ttl)
+
+    async def __get(self, kind: str, chat, user, default: dict | None) -> dict:
+        chat, user = self.check_address(chat=chat, user=user)
+        redis = await self._get_adapter()
+        raw_result = await redis.get(self.generate_key(chat, user, kind))
+        if raw_result:
+            return codec.loads(raw_result)
+        return default or {}
+
+    async def __set(self, kind: str, chat, user, value: dict | None, ttl: int | None):
+        chat, user = self.check_address(chat=chat, user=user)
+        key = self.generate_key(chat, user, kind)
+        redis = await self._get_adapter()
+        if value:
+            await redis.set(key, codec.dumps(value), ex=ttl)
+        else:
+            await redis.delete(key)
@@ -0,0 +1,81 @@
+import logging
+import random
+import time
+
+logger = logging.getLogger('app')
+
+
+class CircuitBreaker:
+    """
+    Stop calling the failing upstream for a while.
+
+    The circuit opens after ``threshold`` consecutive failures. After ``cooldown`` seconds
+    a single trial request is let through: its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, threshold: int, cooldown: float):
+        """
+        :param name: protected endpoint family, for logging
+        :param threshold: consecutive failures that open the circuit
+        :param cooldown: seconds before a trial request
+        """
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """ Whether the request may be sent now """
+        match self.state:
+            case self.CLOSED:
+                return True
+            case self.HALF_OPEN if not self.trial:
+                self.trial = True
+                return True
+            case _:
+                return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f'Circuit "{self.name}" is closed')
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def release_trial(self):
+        """ The trial request ended telling nothing about the upstream (f.e. it was cancelled), let another one try """
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial or (self.opened_at is None and self.failures >= self.threshold):
+            if self.opened_at is None:
+                logger.warning(f'Circuit "{self.name}" is open after {self.failures} failures')
+            self.opened_at = time.monotonic()
+        self.trial = False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter
+
+    :param attempt: number of the failed attempt, starting from 0
+    :param base: delay after the first attempt before jitter
+    :param cap: max delay
+    :return: seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,46 @@
+import logging
+
+from aiohttp import web
+
+from .health import probe
+from .metrics import registry
+
+logger = logging.getLogger('app')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+async def metrics(request: web.Request) -> web.Response:
+    """ Prometheus scrape endpoint """
+    return web.Response(body=registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def ready(request: web.Request) -> web.Response:
+    """ Readiness endpoint: the latest results of the background checks, 503 if any failed """
+    body = ''.join(f'{name} {"ok" if result else "fail"}\n' for name, result in probe.results.items())
+    return web.Response(text=body or 'ok\n', status=200 if probe.ready else 503)
+
+
+def make_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/ready', ready)
+    return app
+
+
+async def start_server(host: str, port: int) -> web.AppRunner | None:
+    """
+    Serve the monitoring endpoints next to the polling loop.
+
+    :param host: interface to listen on
+    :param port: port to listen on, 0 disables the server
+    :return: runner to clean up on shutdown
+    """
+    if not port:
+        logger.info('Monitoring server is disabled')
+        return None
+    runner = web.AppRunner(make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f'Serving metrics on {host}:{port}/metrics, readiness on /ready')
+    return runner
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import signal
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+from aiogram import Dispatcher, types
+
+logger = logging.getLogger('app')
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class DrainingDispatcher(Dispatcher):
+    """
+    Dispatcher counting the updates being processed, so the shutdown waits for them
+    instead of cancelling the handlers in the middle of their state writes
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+
+    async def process_updates(self, updates: list[types.Update], fast: bool = True):
+        self.in_flight += len(updates)
+        self.__idle.clear()
+        try:
+            return await super().process_updates(updates, fast)
+        finally:
+            self.in_flight -= len(updates)
+            if not self.in_flight:
+                self.__idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Wait for the updates in flight
+
+        :param timeout: seconds, the handlers still running afterwards are abandoned
+        :return: whether all of them finished in time
+        """
+        started = time.monotonic()
+        pending = self.in_flight
+        if pending:
+            try:
+                await asyncio.wait_for(self.__idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'{self.in_flight} of {pending} updates in flight did not finish in {timeout}s')
+                return False
+        logger.info(f'Drained {pending} updates in flight in {time.monotonic() - started:.2f}s')
+        return True
+
+
+async def run_until_stopped(intake: Awaitable, stop: Callable[[], None] | None = None, timeout: float | None = None):
+    """
+    Take the updates until SIGINT or SIGTERM. The handlers of the signals are removed afterwards,
+    so the second signal stops the process at once
+
+    :param intake: f.e. polling, it ends by itself only if it fails
+    :param stop: asks the intake to finish; it's cancelled without one
+    :param timeout: seconds the intake has to finish after ``stop``, it's cancelled afterwards
+    :raise: the error the intake failed with
+    """
+    task = asyncio.ensure_future(intake)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in STOP_SIGNALS:
+        with suppress(NotImplementedError):     # Windows, KeyboardInterrupt stops the bot there
+            loop.add_signal_handler(sig, stopping.set)
+    waiter = asyncio.create_task(stopping.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+        for sig in STOP_SIGNALS:
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+    if task.done():
+        return task.result()
+
+    logger.info('Stopping, no more updates are taken')
+    if stop is not None:
+        stop()
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
@@ -0,0 +1,84 @@
+from aiogram.dispatcher.storage import BaseStorage
+
+from typing import Any, Awaitable
+
+from .deadline import within_deadline
+from .metrics import storage_duration
+from .tracing import tracer
+
+
+class StorageProxy(BaseStorage):
+    """
+    FSM storage that delegates everything to the wrapped one.
+    Operations are abandoned when the deadline of the current update passes,
+    so a slow Redis can't hold the handler forever. Their latency is observed and traced
+    """
+
+    def __init__(self, storage: BaseStorage):
+        """
+        :param storage: actual storage, f.e. ``RedisStorage2``
+        """
+        self.storage = storage
+
+    def __getattr__(self, name: str) -> Any:
+        # Storage-specific methods, f.e. ``get_states_list``
+        return getattr(self.storage, name)
+
+    async def __call(self, operation: str, aw: Awaitable) -> Any:
+        with tracer.span(f'storage.{operation}'), storage_duration.time(operation=operation):
+            return await within_deadline(aw)
+
+    async def close(self):
+        await self.storage.close()
+
+    async def wait_closed(self):
+        await self.storage.wait_closed()
+
+    async def get_state(self, **kwargs):
+        return await self.__call('get_state', self.storage.get_state(**kwargs))
+
+    async def get_data(self, **kwargs):
+        return await self.__call('get_data', self.storage.get_data(**kwargs))
+
+    async def set_state(self, **kwargs):
+        await self.__call('set_state', self.storage.set_state(**kwargs))
+
+    async def set_data(self, **kwargs):
+        await self.__call('set_data', self.storage.set_data(**kwargs))
+
+    async def update_data(self, **kwargs):
+        await self.__call('update_data', self.storage.update_data(**kwargs))
+
+    async def update_state_data(self, *, chat=None, user=None, state=None, data: dict = None, **kwargs):
+        """ Set the state and update the data, in a single write if the storage can do it """
+        if hasattr(self.storage, 'update_state_data'):
+            await self.__call('update_state_data', self.storage.update_state_data(
+                chat=chat, user=user, state=state, data=data, **kwargs,
+            ))
+            return
+        await self.set_state(chat=chat, user=user, state=state)
+        await self.update_data(chat=chat, user=user, data=data, **kwargs)
+
+    async def reset_state(self, **kwargs):
+        await self.__call('reset_state', self.storage.reset_state(**kwargs))
+
+    async def reset_data(self, **kwargs):
+        await self.__call('reset_data', self.storage.reset_data(**kwargs))
+
+    async def finish(self, **kwargs):
+        await self.__call('finish', self.storage.finish(**kwargs))
+
+    def has_bucket(self):
+        return self.storage.has_bucket()
+
+    async def get_bucket(self, **kwargs):
+        return await self.__call('get_bucket', self.storage.get_bucket(**kwargs))
+
+    async def set_bucket(self, **kwargs):
+        await self.__call('set_bucket', self.storage.set_bucket(**kwargs))
+
+    async def update_bucket(self, **kwargs):
+        await self.__call('update_bucket', self.storage.update_bucket(**kwargs))
+
+    async def reset_bucket(self, **kwargs):
+        await self.__call('reset_bucket', self.storage.reset_bucket(**kwargs))
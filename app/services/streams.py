@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.utils.exceptions import NetworkError, TelegramAPIError
+
+from app.codec import codec
+from .metrics import stream_entries
+from .turns import Turn, current_turn
+
+logger = logging.getLogger('app')
+
+GROUP = 'workers'       # consumer group of every partition stream
+
+
+def update_chat_id(update: dict) -> int | None:
+    """ Chat of the raw update, the user for updates outside of a chat (f.e. inline queries) """
+    for kind in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if kind in update:
+            return update[kind]['chat']['id']
+    query = update.get('callback_query')
+    if query is not None:
+        return query['message']['chat']['id'] if 'message' in query else query['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return None
+
+
+def partition(chat_id: int | None, partitions: int) -> int:
+    """ Partition of the chat, the same in every process """
+    return (chat_id or 0) % partitions
+
+
+def owned_partitions(index: int, workers: int, partitions: int) -> list[int]:
+    """ Partitions read by the worker: every ``workers``-th one, starting from its index """
+    if not 0 <= index < workers <= partitions:
+        raise ValueError(f'Worker {index} of {workers} can not share {partitions} partitions')
+    return list(range(index, partitions, workers))
+
+
+async def poll_updates(bot: Bot, push: Callable[[list[dict]], Awaitable], timeout: int = 20, limit: int = 100,
+                       relax: float = 0.1):
+    """
+    Long polling handing the raw updates over to ``push``. Telegram forgets the updates
+    only when the next offset is requested, so nothing is lost if the push fails:
+    the same updates are fetched again
+    """
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, limit=limit, timeout=timeout)
+            await push([update.to_python() for update in updates])
+        except (NetworkError, TelegramAPIError, ConnectionError, OSError) as e:
+            logger.error(f'Polling failed: {e!r}')
+            await asyncio.sleep(15)
+            continue
+        if updates:
+            offset = updates[-1].update_id + 1
+        elif relax:
+            await asyncio.sleep(relax)
+
+
+class StreamIngress:
+    """ Pushes the raw updates into the stream of their chat's partition """
+
+    def __init__(self, redis, prefix: str, partitions: int, maxlen: int):
+        """
+        :param redis: ``aioredis.Redis`` client
+        :param prefix: streams are named ``prefix:partition``
+        :param partitions: number of the streams
+        :param maxlen: approximate max entries kept in a stream
+        """
+        self.redis = redis
+        self.prefix = prefix
+        self.partitions = partitions
+        self.maxlen = maxlen
+
+    def stream(self, update: dict) -> str:
+        return f'{self.prefix}:{partition(update_chat_id(update), self.partitions)}'
+
+    async def push(self, updates: list[dict]):
+        """ Add the updates in a single round trip, keeping their order """
+        if not updates:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for update in updates:
+                pipe.xadd(self.stream(update), {'update': codec.dumps(update)}, maxlen=self.maxlen)
+            await pipe.execute()
+        stream_entries.inc(len(updates), stage='pushed')
+
+
+class StreamWorker:
+    """
+    Runs the handlers for the updates of its partitions.
+
+    A partition is read by this worker only. The entries of different chats are handled concurrently,
+    the ones of a chat one after another, so a slow update holds up its chat only.
+    Entries are acknowledged as soon as they're handled; the ones a crashed worker left unacknowledged
+    are read again when it's restarted under the same name, or taken over by the worker
+    the partition has moved to when the number of the workers has changed
+    """
+
+    def __init__(self, dp: Dispatcher, redis, prefix: str, partitions: list[int], consumer: str,
+                 batch: int = 10, block: int = 5000, concurrency: int = 32, claim_idle: int = 60000):
+        """
+        :param dp: dispatcher with the handlers
+        :param redis: ``aioredis.Redis`` client, a connection per partition is held by the blocking reads
+        :param prefix: streams are named ``prefix:partition``
+        :param partitions: partitions of this worker
+        :param consumer: name of the worker in the consumer groups, stable across restarts
+        :param batch: max entries read at once
+        :param block: milliseconds a read waits for new entries
+        :param concurrency: max entries being handled at once. Entries waiting for their chat don't count,
+            but reading stops while ``4 * concurrency`` entries are not handled yet
+        :param claim_idle: milliseconds an entry of another consumer is pending before it's taken over
+        """
+        self.dp = dp
+        self.redis = redis
+        self.streams = [f'{prefix}:{p}' for p in partitions]
+        self.consumer = consumer
+        self.batch = batch
+        self.block = block
+        self.claim_idle = claim_idle
+        self.stopped = False
+        self.__slots = asyncio.Semaphore(concurrency)
+        self.__backlog = asyncio.Semaphore(4 * concurrency)
+        self.__tasks: set[asyncio.Task] = set()
+        self.__chats: dict[int, tuple[asyncio.Lock, int]] = {}     # lock of the chat, entries using it
+
+    async def setup(self):
+        for stream in self.streams:
+            try:
+                await self.redis.xgroup_create(stream, GROUP, id='0', mkstream=True)
+            except Exception as e:
+                if 'BUSYGROUP' not in str(e):   # the group exists already
+                    raise
+
+    async def run(self):
+        await self.setup()
+        logger.info(f'{self.consumer} reads {", ".join(self.streams)}')
+        await asyncio.gather(*(self.consume(stream) for stream in self.streams))
+        await self.wait_handled()
+
+    def stop(self):
+        """
+        Finish the entries being handled and return from ``run`` once the reads are over,
+        the blocking ones in ``block`` milliseconds. Entries read but not handled stay pending
+        """
+        self.stopped = True
+
+    async def claim(self, stream: str) -> int:
+        """
+        Take over the entries other consumers have left pending, f.e. the ones of a retired worker.
+        They're added to the own pending entries, so they're read again with them
+
+        :return: number of the claimed entries
+        """
+        claimed = 0
+        start = '-'
+        count = self.batch * 10
+        while True:
+            pending = await self.redis.xpending_range(stream, GROUP, min=start, max='+', count=count)
+            ids = [entry['message_id'] for entry in pending
+                   if entry['consumer'] != self.consumer and entry['time_since_delivered'] >= self.claim_idle]
+            if ids:     # the idle time is checked again by Redis, in case another worker has just claimed them
+                claimed += len(await self.redis.xclaim(stream, GROUP, self.consumer, self.claim_idle, ids,
+                                                       justid=True))
+            if len(pending) < count:
+                break
+            start = f'({pending[-1]["message_id"]}'     # exclusive
+        if claimed:
+            logger.info(f'{self.consumer} claimed {claimed} pending entries of {stream}')
+        return claimed
+
+    async def consume(self, stream: str):
+        await self.claim(stream)
+        last_id = '0'   # own pending entries first, then the new ones
+        while not self.stopped:
+            block = self.block if last_id == '>' else None
+            response = await self.redis.xreadgroup(GROUP, self.consumer, {stream: last_id},
+                                                   count=self.batch, block=block)
+            entries = response[0][1] if response else []
+            if last_id != '>':
+                if not entries:
+                    last_id = '>'
+                    continue
+                logger.info(f'Redelivering {len(entries)} pending entries of {stream}')
+                last_id = entries[-1][0]
+            for entry_id, fields in entries:
+                await self.__backlog.acquire()
+                if self.stopped:    # redelivered after the restart
+                    self.__backlog.release()
+                    break
+                self.schedule(stream, entry_id, fields)
+
+    def schedule(self, stream: str, entry_id: str, fields: dict):
+        """ Handle the entry in the turn of its chat, the caller has taken a place in the backlog """
+        try:
+            chat_id = update_chat_id(codec.loads(fields['update']))
+        except Exception:   # broken, ``handle`` logs and acknowledges it
+            chat_id = None
+        task = asyncio.create_task(self.__handle_in_turn(chat_id, stream, entry_id, fields))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__done)
+
+    async def wait_handled(self):
+        """ Wait for the entries being handled """
+        while self.__tasks:
+            await asyncio.wait(set(self.__tasks))
+
+    def __done(self, task: asyncio.Task):
+        self.__tasks.discard(task)
+        self.__backlog.release()
+
+    async def __handle_in_turn(self, chat_id: int | None, stream: str, entry_id: str, fields: dict):
+        # The tasks start in the order of the entries, so they take the lock of the chat in that order
+        lock, users = self.__chats.get(chat_id) or (asyncio.Lock(), 0)
+        self.__chats[chat_id] = lock, users + 1
+        turn = Turn(lock, self.__slots)
+        try:
+            await turn.take()
+            current_turn.set(turn)  # the handler may step aside, see ``turns.step_aside``
+            if self.stopped:    # redelivered after the restart, as well as the next entries of the chat
+                return
+            await self.handle(stream, entry_id, fields)
+        finally:
+            turn.give_up()
+            lock, users = self.__chats[chat_id]
+            if users > 1:
+                self.__chats[chat_id] = lock, users - 1
+            else:
+                del self.__chats[chat_id]
+
+    async def handle(self, stream: str, entry_id: str, fields: dict):
+        try:
+            update = types.Update(**codec.loads(fields['update']))
+            await self.dp.process_updates([update])
+        except Exception as e:  # not retried, a broken update would block the chat
+            logger.exception(f'Entry {entry_id} of {stream} failed: {e!r}')
+        await self.redis.xack(stream, GROUP, entry_id)
+        stream_entries.inc(stage='acked')
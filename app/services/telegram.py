@@ -0,0 +1,17 @@
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+from .metrics import telegram_request_duration, telegram_retry_after
+from .tracing import tracer
+
+
+class MeteredBot(Bot):
+    """ Bot observing the latency of Telegram Bot API calls, tracing them, and flood control rejections """
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        with tracer.span(f'telegram.{method}'), telegram_request_duration.time(method=method):
+            try:
+                return await super().request(method, data, files, **kwargs)
+            except RetryAfter:
+                telegram_retry_after.inc(method=method)
+                raise
@@ -0,0 +1,252 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from functools import wraps
+from typing import Any, Iterator
+
+from app.codec import codec
+
+logger = logging.getLogger('app')
+
+
+class Trace:
+    """ Spans of a single update """
+
+    __slots__ = ('trace_id', 'sampled', 'spans', 'finished')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f'{random.getrandbits(128):032x}'
+        self.sampled = sampled      # whether the trace goes to the exporters
+        self.spans: list[Span] = []
+        self.finished = False       # spans of tasks outliving the update are dropped
+
+
+class Span:
+    """ Timed operation, modelled after the OpenTelemetry span """
+
+    __slots__ = ('name', 'trace', 'span_id', 'parent', 'attributes', 'start_time', 'end_time', 'error', 'token')
+
+    def __init__(self, name: str, trace: Trace, parent: 'Span | None', attributes: dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent = parent
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.end_time: int | None = None
+        self.error: str | None = None
+        self.token: Token | None = None
+
+    @property
+    def duration(self) -> float:
+        """ Seconds, up to now if the span isn't finished """
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e9
+
+    @property
+    def depth(self) -> int:
+        return 0 if self.parent is None else self.parent.depth + 1
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        """ Span in the OTLP/JSON encoding """
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,      # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_time),
+            'endTimeUnixNano': str(self.end_time),
+            'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 0},
+        }
+        if self.parent is not None:
+            span['parentSpanId'] = self.parent.span_id
+        return span
+
+    def __repr__(self):
+        return f'Span({self.name!r}, {self.duration:.3f}s)'
+
+
+def otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+current_span: ContextVar[Span | None] = ContextVar('current_span', default=None)
+
+
+class Exporter:
+    """ Receives the spans of every finished trace it's interested in """
+
+    only_sampled = True     # whether unsampled traces are skipped
+
+    def export(self, trace: Trace):
+        raise NotImplementedError
+
+
+class InMemoryExporter(Exporter):
+    """ Keeps finished traces, for tests """
+
+    def __init__(self, only_sampled: bool = True):
+        self.only_sampled = only_sampled
+        self.traces: list[Trace] = []
+
+    def export(self, trace: Trace):
+        self.traces.append(trace)
+
+    def clear(self):
+        self.traces.clear()
+
+
+class OtlpLogExporter(Exporter):
+    """ Logs every trace as an OTLP/JSON ``resourceSpans`` document, for a collector tailing the logs """
+
+    def __init__(self, service_name: str = 'hdh-api-bot'):
+        self.service_name = service_name
+
+    def export(self, trace: Trace):
+        document = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': otlp_value(self.service_name)}]},
+            'scopeSpans': [{'scope': {'name': 'app'}, 'spans': [span.to_otlp() for span in trace.spans]}],
+        }]}
+        logger.info(codec.dumps(document))
+
+
+class SlowUpdateLogger(Exporter):
+    """ Logs the span breakdown of every update slower than the threshold, sampled or not """
+
+    only_sampled = False
+
+    def __init__(self, threshold: float):
+        """
+        :param threshold: seconds
+        """
+        self.threshold = threshold
+
+    def export(self, trace: Trace):
+        root = trace.spans[0]
+        if root.duration < self.threshold:
+            return
+        logger.warning(f'Slow update ({root.duration:.3f}s):\n{breakdown(trace)}')
+
+
+def breakdown(trace: Trace) -> str:
+    """ Spans as an indented tree, in the start order """
+    rows = []
+    for span in sorted(trace.spans, key=lambda s: s.start_time):
+        attributes = ' '.join(f'{key}={value}' for key, value in span.attributes.items())
+        error = f' !{span.error}' if span.error else ''
+        rows.append(f'{"  " * span.depth}{span.name} {span.duration * 1000:.1f}ms {attributes}{error}'.rstrip())
+    return '\n'.join(rows)
+
+
+class Tracer:
+    """
+    Opens a trace for every update and child spans for the work done on its behalf.
+
+    Nothing is recorded unless some exporter needs it: unsampled traces are recorded
+    only for the exporters looking at every update, f.e. ``SlowUpdateLogger``
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporters: list[Exporter] = None):
+        """
+        :param sample_rate: share of the traces passed to the exporters of sampled traces
+        :param exporters: receivers of the finished traces
+        """
+        self.sample_rate = sample_rate
+        self.exporters = exporters or []
+
+    def configure(self, sample_rate: float, exporters: list[Exporter]):
+        self.sample_rate = sample_rate
+        self.exporters = exporters
+
+    @property
+    def records_all(self) -> bool:
+        return any(not exporter.only_sampled for exporter in self.exporters)
+
+    def start_trace(self, name: str, **attributes) -> Span | None:
+        """
+        Open the root span and make it current
+
+        :return: the span, None if the trace is not recorded
+        """
+        sampled = random.random() < self.sample_rate
+        if not (sampled or self.records_all) or not self.exporters:
+            return None
+        return self.__start(Span(name, Trace(sampled), None, attributes))
+
+    def start_span(self, name: str, **attributes) -> Span | None:
+        """
+        Open the child of the current span and make it current
+
+        :return: the span, None if there is no trace to join
+        """
+        parent = current_span.get()
+        if parent is None or parent.trace.finished:
+            return None
+        return self.__start(Span(name, parent.trace, parent, attributes))
+
+    def end(self, span: Span | None, error: BaseException = None):
+        """ Close the span, export the trace if it's the root one """
+        if span is None:
+            return
+        span.end_time = time.time_ns()
+        if error is not None:
+            span.error = repr(error)
+        try:
+            current_span.reset(span.token)
+        except ValueError:      # ended in another context
+            pass
+        if span.parent is None:
+            span.trace.finished = True
+            self.__export(span.trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span | None]:
+        """ Child span of the block """
+        span = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, error=e)
+            raise
+        else:
+            self.end(span)
+
+    def __start(self, span: Span) -> Span:
+        span.trace.spans.append(span)
+        span.token = current_span.set(span)
+        return span
+
+    def __export(self, trace: Trace):
+        for exporter in self.exporters:
+            if exporter.only_sampled and not trace.sampled:
+                continue
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.error(f'{type(exporter).__name__} failed: {e!r}')
+
+
+tracer = Tracer()
+
+
+def traced(function):
+    """ Decorator running the function in a span named after it """
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with tracer.span(name):
+            return function(*args, **kwargs)
+
+    return wrapper
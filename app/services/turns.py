@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+
+class Turn:
+    """
+    The right of an update to run: the turn of its chat, so the updates of a chat are handled one after another,
+    and a slot of the worker, so a few chats can't take all of them
+    """
+
+    def __init__(self, chat: asyncio.Lock | None, slots: asyncio.Semaphore):
+        """
+        :param chat: lock of the chat, None if the update doesn't wait for other ones
+        :param slots: shared by all the updates of the worker
+        """
+        self.chat = chat
+        self.slots = slots
+        self.held = False
+
+    async def take(self):
+        """ Wait for the turn. The updates of the chat take it in the order they called ``take`` """
+        if self.chat is not None:
+            await self.chat.acquire()
+        try:
+            await self.slots.acquire()
+        except BaseException:
+            if self.chat is not None:
+                self.chat.release()
+            raise
+        self.held = True
+
+    def give_up(self):
+        if not self.held:
+            return
+        self.held = False
+        self.slots.release()
+        if self.chat is not None:
+            self.chat.release()
+
+
+current_turn: ContextVar[Turn | None] = ContextVar('current_turn', default=None)
+
+
+@asynccontextmanager
+async def step_aside():
+    """
+    Let the next updates of the chat run while the handler waits, f.e. for the page flips to coalesce.
+    The turn is taken back afterwards, after the updates that took it meanwhile.
+    Does nothing when the updates aren't ordered, f.e. with polling
+    """
+    turn = current_turn.get()
+    if turn is None or not turn.held:
+        yield
+        return
+    turn.give_up()
+    try:
+        yield
+    finally:
+        await turn.take()
@@ -1,7 +1,7 @@
 from aiogram import types
 from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State
 from aiogram.utils.exceptions import MessageToDeleteNotFound
-from aiohttp import ClientResponseError
 
 from contextlib import suppress
 import logging
@@ -9,8 +9,9 @@ import re
 from datetime import datetime
 
 from app.exceptions import DeckstringError
-from app.config import config, MAX_CARD_NAME_LENGTH
-from .api import RequestDecks
+from app.config import get_config, MAX_CARD_NAME_LENGTH
+from .api import RequestDecks, API_ERRORS
+from .prefetch import drop_prefetches
 from .answer_builders import AnswerBuilder
 from .messages import CommonMessage
 
@@ -61,22 +62,18 @@ def paginate_list(lst: list, n: int):
         yield page
 
 
-def flip_page(direction: str, current_page: int, npages: int) -> int:
+def shift_page(current_page: int, offset: int, npages: int) -> int:
     """
-    :param direction: "left" or "right"
+    Flip several pages at once, the last page is followed by the first one
+
     :param current_page: page number before flipping
+    :param offset: number of pages to flip, negative for flipping to the left
     :param npages: total number of pages
-    :return: new page number
-    :raise ValueError: if direction is unsupported
+    :return: new page number, the current one if there are no pages
     """
-
-    match direction:
-        case 'left':
-            return current_page - 1 if current_page > 1 else npages
-        case 'right':
-            return current_page + 1 if current_page < npages else 1
-        case _:
-            raise ValueError(f'Unknown page flipping direction: {direction}')
+    if not npages:
+        return current_page
+    return (current_page - 1 + offset) % npages + 1
 
 
 def extract_deckstring(decklist: str) -> str:
@@ -113,14 +110,31 @@ def card_in_query(card: dict, query: list[dict]) -> bool:
 
 async def clear_all(message: types.Message, state: FSMContext):
     """ Delete all stored messages """
+    drop_prefetches(message.chat.id)
     data = await state.get_data()
-    for key in config.storage.MSG_IDS:
+    for key in get_config().storage.MSG_IDS:
         if data.get(key):
             with suppress(MessageToDeleteNotFound):
                 await message.bot.delete_message(chat_id=message.chat.id, message_id=data[key])
     await state.finish()
 
 
+async def transition(state: FSMContext, new_state: State, data: dict = None, **kwargs):
+    """
+    Set the state and update the data, as a single write to storages able to pipeline it
+
+    :param state: FSM context of the update
+    :param new_state: state to set
+    :param data: items to update the data with, as in ``FSMContext.update_data``
+    """
+    if hasattr(state.storage, 'update_state_data'):
+        await state.storage.update_state_data(chat=state.chat, user=state.user, state=new_state.state,
+                                              data=data, **kwargs)
+        return
+    await state.set_state(new_state)
+    await state.update_data(data, **kwargs)
+
+
 async def clear_prompt(message: types.Message, data: dict, state: FSMContext):
     """ Delete message for request parameter clarification, then forget it """
     for key in ['card_prompt_msg_id', 'deck_prompt_msg_id']:
@@ -139,19 +153,19 @@ async def deck_decode(message: types.Message, state: FSMContext, deckstring: str
     :param deckstring: valid deck code
     """
 
+    request = RequestDecks({})
     try:
-        deck = await RequestDecks({}).post({'string': deckstring})
-    except ClientResponseError as e:
+        deck = await request.post({'string': deckstring})
+    except API_ERRORS as e:
         logger.error(f'HS Deck Helper API is unreachable: {e}')
         await message.reply(CommonMessage.SERVER_UNAVAILABLE)
         return
-
-    if 'error' in deck:
-        logger.warning(f'DecodeError: {deck["error"]}. Deckstring: {message.text}')
+    except DeckstringError as e:
+        logger.warning(f'DecodeError: {e}. Deckstring: {message.text}')
         await message.reply(CommonMessage.DECODE_ERROR)
         return
 
-    await state.update_data(deck_detail=deck)
+    await state.update_data(deck_detail=deck.as_dict(), deck_detail_outdated=request.outdated_age)
     data = await state.get_data()
     response = AnswerBuilder(data).decks.deck_detail()
     await message.reply(text=response.text)
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import defaultdict
+from multiprocessing.connection import Connection
+from typing import Callable
+
+from aiogram import Dispatcher, types
+
+from app.codec import codec
+from .streams import partition, update_chat_id
+
+logger = logging.getLogger('app')
+
+Target = Callable[[int, Connection], None]     # entry point of a child: its index and the end of the pipe
+
+
+class WorkerPool:
+    """
+    Child processes running the handlers, each with its own event loop.
+    The parent hands the updates over through pipes; the updates of a chat always go to the same child,
+    so the FSM state of the chat may even stay in the memory of that child
+    """
+
+    def __init__(self, size: int, target: Target):
+        """
+        :param size: number of the children
+        :param target: picklable function run in the child
+        """
+        self.size = size
+        self.target = target
+        self.context = multiprocessing.get_context('spawn')     # no event loop state is inherited
+        self.processes: list[multiprocessing.Process | None] = [None] * size
+        self.connections: list[Connection | None] = [None] * size
+
+    def start(self):
+        for index in range(self.size):
+            self.spawn(index)
+
+    def spawn(self, index: int):
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=self.target, args=(index, receiver), name=f'worker-{index}', daemon=True)
+        process.start()
+        receiver.close()    # the child has its own copy
+        self.processes[index] = process
+        self.connections[index] = sender
+        logger.info(f'Started worker {index} (pid {process.pid})')
+
+    async def push(self, updates: list[dict]):
+        """ Send the updates to the children, a batch per child, keeping the order of every chat """
+        batches = defaultdict(list)
+        for update in updates:
+            batches[partition(update_chat_id(update), self.size)].append(update)
+        await asyncio.gather(*(self.send(index, batch) for index, batch in batches.items()))
+
+    async def send(self, index: int, batch: list[dict]):
+        payload = codec.dumps(batch).encode('utf-8')
+        try:
+            await asyncio.to_thread(self.connections[index].send_bytes, payload)
+        except OSError as e:    # the child is gone, f.e. killed by OOM
+            logger.error(f'Worker {index} is gone ({e!r}), restarting it')
+            self.connections[index].close()
+            self.spawn(index)
+            await asyncio.to_thread(self.connections[index].send_bytes, payload)
+
+    def stop(self, timeout: float = 10):
+        """ Close the pipes, the children finish their updates and exit """
+        for connection in self.connections:
+            if connection is not None:
+                connection.close()
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f'Worker {index} did not exit in {timeout}s, terminating it')
+                process.terminate()
+
+
+async def process(dp: Dispatcher, updates: list[types.Update]):
+    try:
+        await dp.process_updates(updates)
+    except Exception as e:
+        logger.exception(f'Updates {[update.update_id for update in updates]} failed: {e!r}')
+
+
+async def serve_pipe(connection: Connection, dp: Dispatcher):
+    """
+    Run the handlers for the updates coming from the parent, until it closes the pipe.
+    A batch is processed the way polling processes it, concurrently and without waiting for it,
+    the updates still in flight are left for ``DrainingDispatcher.drain``
+    """
+    tasks = set()
+    while True:
+        try:
+            payload = await asyncio.to_thread(connection.recv_bytes)
+        except (EOFError, OSError):
+            break
+        updates = [types.Update(**update) for update in codec.loads(payload)]
+        task = asyncio.create_task(process(dp, updates))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
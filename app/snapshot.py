@@ -0,0 +1,90 @@
+"""
+Precompiled snapshots of static data files.
+
+A snapshot is the pickled result of parsing the source file, prefixed with the hash of the source.
+It's used while the hash matches, and rebuilt from the source otherwise.
+
+Build the snapshot of Hearthstone entities beforehand: ``python -m app.snapshot``
+"""
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+from pathlib import Path
+from typing import Callable, TypeVar
+
+T = TypeVar('T')
+
+FORMAT_VERSION = b'1'       # bump when the pickled classes change
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+logger = logging.getLogger('app')
+
+
+def source_digest(raw: bytes) -> bytes:
+    return hashlib.sha256(FORMAT_VERSION + raw).digest()
+
+
+def read_snapshot(path: Path, digest: bytes) -> object | None:
+    """
+    Load the snapshot memory-mapping the file
+
+    :param path: snapshot file
+    :param digest: hash of the actual source
+    :return: unpickled object, or None if the snapshot is missing, outdated or broken
+    """
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:DIGEST_SIZE] != digest:
+                return None
+            with memoryview(mm) as view:
+                return pickle.loads(view[DIGEST_SIZE:])
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.debug(f'Snapshot {path.name} is unusable: {e!r}')
+        return None
+
+
+def write_snapshot(path: Path, digest: bytes, obj: object):
+    """ Atomically replace the snapshot """
+    tmp = path.with_suffix(f'{path.suffix}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(digest)
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load_with_snapshot(source: Path, snapshot: Path, parse: Callable[[bytes], T]) -> T:
+    """
+    Load the data from the snapshot, or parse the source and rebuild the snapshot if the source has changed
+
+    :param source: source file, f.e. JSON
+    :param snapshot: snapshot file
+    :param parse: builds the data from raw source
+    """
+    raw = source.read_bytes()
+    digest = source_digest(raw)
+    data = read_snapshot(snapshot, digest)
+    if data is not None:
+        return data
+
+    logger.info(f'Building snapshot of {source.name}')
+    data = parse(raw)
+    try:
+        write_snapshot(snapshot, digest, data)
+    except OSError as e:
+        logger.warning(f"Couldn't write snapshot {snapshot}: {e}")
+    return data
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    from app.config import HS_ENTITIES_SOURCE, HS_ENTITIES_SNAPSHOT, parse_hearthstone_data
+
+    raw = HS_ENTITIES_SOURCE.read_bytes()
+    write_snapshot(HS_ENTITIES_SNAPSHOT, source_digest(raw), parse_hearthstone_data(raw))
+    logger.info(f'Snapshot {HS_ENTITIES_SNAPSHOT} is built')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare JSON backends on representative API payloads and FSM state.
+
+Usage: python -m benchmarks.bench_codec [-n NUMBER]
+"""
+import argparse
+import timeit
+from pathlib import Path
+
+from app.codec import BACKENDS, get_codec
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'data'
+MAX_CARDS_IN_RESPONSE = 90
+
+
+def load_payloads() -> dict[str, str]:
+    """ Raw JSON as it comes from the API, and FSM state data as it's stored in Redis """
+    codec = get_codec('json')
+    fixtures = {name: codec.loads((DATA_DIR / f'{name}_fixture.json').read_text(encoding='utf-8'))
+                for name in ('cardlist', 'carddetail', 'decklist', 'deckdetail')}
+
+    cards = [card for page in fixtures['cardlist']['cardlist']['cards'] for card in page]
+    cards = (cards * (MAX_CARDS_IN_RESPONSE // len(cards) + 1))[:MAX_CARDS_IN_RESPONSE]
+    return {
+        'card_list': codec.dumps(cards),
+        'card_detail': codec.dumps(fixtures['carddetail']['card_detail']),
+        'deck_list': codec.dumps(fixtures['decklist']['deck_list']['decks']),
+        'deck_detail': codec.dumps(fixtures['deckdetail']['deck_detail']),
+        'fsm_state': codec.dumps({
+            'cardlist': {'cards': [cards[i:i + 10] for i in range(0, len(cards), 10)], 'page': 1, 'total': len(cards)},
+            'deck_detail': fixtures['deckdetail']['deck_detail'],
+        }),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=2000, help='iterations per measurement')
+    args = parser.parse_args()
+
+    payloads = load_payloads()
+    codecs = []
+    for name in BACKENDS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            print(f'{name} is not installed, skipped')
+
+    print(f'{"payload":<14}{"bytes":>8}  ' + ''.join(f'{c.name + " load/dump, us":>28}' for c in codecs))
+    for name, raw in payloads.items():
+        row = f'{name:<14}{len(raw.encode()):>8}  '
+        obj = codecs[0].loads(raw)
+        for codec in codecs:
+            load = timeit.timeit(lambda: codec.loads(raw), number=args.number) / args.number * 1e6
+            dump = timeit.timeit(lambda: codec.dumps(obj), number=args.number) / args.number * 1e6
+            row += f'{f"{load:.1f} / {dump:.1f}":>28}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
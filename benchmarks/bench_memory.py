@@ -0,0 +1,56 @@
+"""
+Compare memory held by API responses as raw dicts and as domain objects.
+
+Usage: python -m benchmarks.bench_memory [-n NUMBER]
+"""
+import argparse
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from app.codec import codec
+from app.services.models import CardSummary, Card, DeckSummary, Deck
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'data'
+
+
+def load_responses() -> dict[str, tuple[str, Callable]]:
+    """ Raw JSON of every response type, and the parser of its items """
+    fixtures = {name: codec.loads((DATA_DIR / f'{name}_fixture.json').read_bytes())
+                for name in ('cardlist', 'carddetail', 'decklist', 'deckdetail')}
+    return {
+        'card_list': (codec.dumps([card for page in fixtures['cardlist']['cardlist']['cards'] for card in page]),
+                      lambda response: [CardSummary.from_api(card) for card in response]),
+        'card_detail': (codec.dumps(fixtures['carddetail']['card_detail']), Card.from_api),
+        'deck_list': (codec.dumps([deck for page in fixtures['decklist']['deck_list']['decks'] for deck in page]),
+                      lambda response: [DeckSummary.from_api(deck) for deck in response]),
+        'deck_detail': (codec.dumps(fixtures['deckdetail']['deck_detail']), Deck.from_api),
+    }
+
+
+def measure(build: Callable[[], list]) -> int:
+    """ Bytes allocated by the objects ``build`` returns and which are still alive """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=1000, help='cached responses of every type')
+    args = parser.parse_args()
+
+    print(f'{"response":<14}{"dicts, KiB":>12}{"objects, KiB":>14}{"ratio":>8}')
+    for name, (raw, parse) in load_responses().items():
+        # Every response is decoded separately, like the ones received from the API
+        as_dicts = measure(lambda: [codec.loads(raw) for _ in range(args.number)])
+        as_objects = measure(lambda: [parse(codec.loads(raw)) for _ in range(args.number)])
+        print(f'{name:<14}{as_dicts / 1024:>12.0f}{as_objects / 1024:>14.0f}{as_objects / as_dicts:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Renderers and keyboard builders run on every interaction.
+
+The state data is built the way handlers store it: fixture responses parsed
+into domain objects and saved with ``as_dict``.
+
+Usage: python -m benchmarks.suite run -k render
+"""
+from pathlib import Path
+
+from app.codec import codec
+from app.services.answer_builders import AnswerBuilder
+from app.services.keyboards import Keyboard
+from app.services.messages import TextInfo
+from app.services.models import CardSummary, Card, DeckSummary, Deck
+from app.services.utils import paginate_list
+from .suite import benchmark
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'data'
+
+
+def load_state() -> dict:
+    """ FSM state data after a card search, a deck search and opening a card and a deck """
+    fixtures = {name: codec.loads((DATA_DIR / f'{name}_fixture.json').read_bytes())
+                for name in ('cardlist', 'carddetail', 'decklist', 'deckdetail')}
+    cards = [CardSummary.from_api(card).as_dict() for page in fixtures['cardlist']['cardlist']['cards'] for card in page]
+    decks = [DeckSummary.from_api(deck).as_dict() for page in fixtures['decklist']['deck_list']['decks'] for deck in page]
+    return {
+        'cset': 'Voyage to the Sunken City',
+        'on_close': '',
+        'cardlist': {'cards': list(paginate_list(cards, 9)), 'page': 1, 'total': len(cards), 'outdated': None},
+        'card_detail': Card.from_api(fixtures['carddetail']['card_detail']).as_dict(),
+        'deck_list': {'decks': list(paginate_list(decks, 9)), 'page': 1, 'total': len(decks), 'outdated': None},
+        'deck_detail': Deck.from_api(fixtures['deckdetail']['deck_detail']).as_dict(),
+    }
+
+
+@benchmark('render.card_list')
+def card_list():
+    data = load_state()
+    return lambda: TextInfo(data).card_list.as_text()
+
+
+@benchmark('render.card_detail')
+def card_detail():
+    data = load_state()
+    return lambda: TextInfo(data).card_detail.as_text()
+
+
+@benchmark('render.deck_list')
+def deck_list():
+    data = load_state()
+    return lambda: TextInfo(data).deck_list.as_text()
+
+
+@benchmark('render.deck_detail')
+def deck_detail():
+    data = load_state()
+    return lambda: TextInfo(data).deck_detail.as_text()
+
+
+@benchmark('keyboard.cards.wait_param.cset')
+def wait_param_cset():
+    data = load_state()
+    return lambda: Keyboard(data).cards.wait_param('cset')
+
+
+@benchmark('keyboard.cards.result_list')
+def card_result_list():
+    data = load_state()
+    return lambda: Keyboard(data).cards.result_list()
+
+
+@benchmark('keyboard.decks.result_list')
+def deck_result_list():
+    data = load_state()
+    return lambda: Keyboard(data).decks.result_list()
+
+
+@benchmark('answer.cards.result_list')
+def card_answer():
+    data = load_state()
+    return lambda: AnswerBuilder(data).cards.result_list()
+
+
+@benchmark('answer.decks.deck_detail')
+def deck_answer():
+    data = load_state()
+    return lambda: AnswerBuilder(data).decks.deck_detail()
@@ -0,0 +1,321 @@
+"""
+FSM storage cost of the card and deck search conversations, step by step.
+
+Every flow of the load test is replayed by a single user against the real handlers.
+After each step, the report shows the FSM operations of the handlers, the Redis round trips,
+the time spent serializing the state and the bytes stored for the chat.
+
+Backends:
+    memory      MemoryStorage
+    standin     RedisStorage over an in-process stand-in of the Redis server
+    URL         RedisStorage over a real server, f.e. redis://localhost:6379/5
+
+Usage: python -m benchmarks.bench_storage [-b BACKEND ...] [--json PATH]
+"""
+import argparse
+import asyncio
+import fnmatch
+import json
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+from aiohttp import ClientSession
+
+from .load_test import FLOWS, VirtualUser, make_dispatcher, setup_environment, start_fakes, wait_for_port
+
+USER_ID = 1000
+PREFIX = 'fsm_bench'     # keys of the real bot are not touched
+
+
+class InMemoryRedis:
+    """ Stand-in of the Redis server for ``RedisStorage2``: the commands it sends, kept in a dict """
+
+    def __init__(self):
+        self.values: dict[str, str | bytes] = {}
+
+    async def get(self, key: str):
+        return self.values.get(key)
+
+    async def set(self, key: str, value, ex: int = None):
+        self.values[key] = value
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def keys(self, pattern: str) -> list[str]:
+        return [key for key in self.values if fnmatch.fnmatchcase(key, pattern)]
+
+    async def strlen(self, key: str) -> int:
+        value = self.values.get(key, '')
+        return len(value.encode() if isinstance(value, str) else value)
+
+    async def flushdb(self):
+        self.values.clear()
+
+    async def ping(self) -> bool:
+        return True
+
+    def pipeline(self, transaction: bool = True) -> 'InMemoryPipeline':
+        return InMemoryPipeline(self)
+
+    async def get_redis(self):
+        return self
+
+    async def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class InMemoryPipeline:
+    """ Commands of ``InMemoryRedis`` queued till ``execute``, as an ``aioredis`` pipeline """
+
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.queue = []
+
+    def set(self, *args, **kwargs) -> 'InMemoryPipeline':
+        self.queue.append((self.redis.set, args, kwargs))
+        return self
+
+    def delete(self, *args) -> 'InMemoryPipeline':
+        self.queue.append((self.redis.delete, args, {}))
+        return self
+
+    async def execute(self) -> list:
+        queue, self.queue = self.queue, []
+        return [await command(*args, **kwargs) for command, args, kwargs in queue]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.queue.clear()
+
+
+class CountingClient:
+    """ Redis client counting its pipelines, a round trip each """
+
+    def __init__(self, client, commands: Counter):
+        self.client = client
+        self.commands = commands
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self.client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def counted_execute(*execute_args, **execute_kwargs):
+            self.commands['pipeline'] += 1
+            return await execute(*execute_args, **execute_kwargs)
+        pipe.execute = counted_execute
+        return pipe
+
+
+class CountingRedis:
+    """ Adapter counting the commands sent to the server """
+
+    COMMANDS = ('get', 'set', 'delete', 'keys', 'flushdb')
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.commands = Counter()
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.adapter, name)
+        if name not in self.COMMANDS:
+            return attribute
+
+        async def command(*args, **kwargs):
+            self.commands[name] += 1
+            return await attribute(*args, **kwargs)
+        return command
+
+    async def get_redis(self) -> CountingClient:
+        return CountingClient(await self.adapter.get_redis(), self.commands)
+
+
+class TimedCodec:
+    """ Codec wrapper accumulating the time spent in it """
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.elapsed = 0.0
+
+    def loads(self, raw):
+        started_at = time.perf_counter()
+        try:
+            return self.codec.loads(raw)
+        finally:
+            self.elapsed += time.perf_counter() - started_at
+
+    def dumps(self, obj):
+        started_at = time.perf_counter()
+        try:
+            return self.codec.dumps(obj)
+        finally:
+            self.elapsed += time.perf_counter() - started_at
+
+
+class Backend:
+    """ Storage under test and the way to measure it """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.storage = None
+        self.redis: CountingRedis | None = None
+        self.codec: TimedCodec | None = None
+
+    async def open(self):
+        if self.name == 'memory':
+            from aiogram.contrib.fsm_storage.memory import MemoryStorage
+            self.storage = MemoryStorage()
+            return
+
+        from app.services import redis_storage
+        from app.services.redis_storage import RedisStorage
+
+        if self.name == 'standin':
+            self.storage = RedisStorage(prefix=PREFIX)
+            self.storage._redis = CountingRedis(InMemoryRedis())
+        else:
+            url = urlparse(self.name)
+            self.storage = RedisStorage(host=url.hostname, port=url.port or 6379, db=int(url.path.strip('/') or 0),
+                                        password=url.password, prefix=PREFIX)
+            self.storage._redis = CountingRedis(await self.storage._get_adapter())
+        self.redis = self.storage._redis
+        await self.cleanup()
+        if not isinstance(redis_storage.codec, TimedCodec):
+            redis_storage.codec = TimedCodec(redis_storage.codec)
+        self.codec = redis_storage.codec
+
+    async def cleanup(self):
+        """ Remove the keys of the benchmark, leaving the rest of the database alone """
+        if self.redis is None:
+            return
+        redis = await self.redis.adapter.get_redis()
+        keys = await redis.keys(self.storage.generate_key('*'))
+        if keys:
+            await redis.delete(*keys)
+
+    async def close(self):
+        await self.cleanup()
+        await self.storage.close()
+        await self.storage.wait_closed()
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.redis.commands.values()) if self.redis else 0
+
+    @property
+    def codec_time(self) -> float:
+        return self.codec.elapsed if self.codec else 0.0
+
+    async def stored_bytes(self, chat: int) -> int:
+        """ Size of everything stored for the chat, as it's kept by the server """
+        if self.redis is None:
+            from app.codec import codec
+            record = self.storage.data.get(str(chat), {}).get(str(chat), {})
+            size = len((record.get('state') or '').encode())
+            return size + sum(len(codec.dumps(record[key]).encode()) for key in ('data', 'bucket') if record.get(key))
+
+        redis = await self.redis.adapter.get_redis()    # the client itself, its commands aren't counted
+        keys = await redis.keys(self.storage.generate_key(chat, '*'))
+        return sum([await redis.strlen(key) for key in keys])
+
+
+def fsm_operations() -> int:
+    """ FSM storage operations so far, as observed by ``StorageProxy`` """
+    from app.services.metrics import storage_duration
+    return int(sum(value for suffix, _, value in storage_duration.samples() if suffix == '_count'))
+
+
+def describe(update: dict) -> str:
+    if 'message' in update:
+        return update['message']['text'][:24]
+    return update['callback_query']['data']
+
+
+async def replay(backend: Backend, session: ClientSession, telegram_url: str) -> dict[str, list[dict]]:
+    """ Run every flow once, measure each step """
+    await backend.open()
+    dp = make_dispatcher(backend.storage, telegram_url)
+    user = VirtualUser(USER_ID, dp, session, telegram_url)
+    report = {}
+    try:
+        for flow, steps in FLOWS.items():
+            rows = report[flow] = []
+            for step in steps:
+                update = await user.update(step)
+                if update is None:
+                    rows.append({'step': str(step), 'error': 'button is not shown'})
+                    break
+                before = fsm_operations(), backend.round_trips, backend.codec_time
+                await user.process(update)
+                rows.append({
+                    'step': describe(update),
+                    'operations': fsm_operations() - before[0],
+                    'round_trips': backend.round_trips - before[1],
+                    'codec_ms': (backend.codec_time - before[2]) * 1000,
+                    'bytes': await backend.stored_bytes(USER_ID),
+                })
+    finally:
+        await (await dp.bot.get_session()).close()
+        await backend.close()
+    return report
+
+
+def render(backend: str, report: dict[str, list[dict]]) -> str:
+    lines = [f'== {backend}', f'{"flow":<8}{"step":<32}{"FSM ops":>9}{"round trips":>13}{"codec, ms":>11}{"bytes":>9}']
+    for flow, rows in report.items():
+        for row in rows:
+            if 'error' in row:
+                lines.append(f'{flow:<8}{row["step"]:<32}  {row["error"]}')
+                continue
+            lines.append(f'{flow:<8}{row["step"]:<32}{row["operations"]:>9}{row["round_trips"]:>13}'
+                         f'{row["codec_ms"]:>11.3f}{row["bytes"]:>9}')
+        lines.append(f'{flow:<8}{"peak":<32}{"":>33}{max(row.get("bytes", 0) for row in rows):>9}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-b', '--backend', action='append', help='memory, standin or redis:// URL; repeatable')
+    parser.add_argument('--json', metavar='PATH', help='also save the report as JSON, to track it over time')
+    args = parser.parse_args()
+    backends = args.backend or ['memory', 'standin']
+
+    fakes, telegram_port, api_port = start_fakes(telegram_latency=0, api_latency=0)
+    setup_environment(api_port)
+    telegram_url = f'http://127.0.0.1:{telegram_port}'
+
+    async def run() -> dict:
+        await wait_for_port(telegram_port)
+        await wait_for_port(api_port)
+        reports = {}
+        async with ClientSession() as session:
+            for name in backends:
+                try:
+                    reports[name] = await replay(Backend(name), session, telegram_url)
+                except Exception as e:    # f.e. aioredis doesn't import, or the server is down
+                    print(f'{name} skipped: {e!r}\n')
+                    continue
+                print(render(name, reports[name]), end='\n\n')
+        return reports
+
+    try:
+        reports = asyncio.run(run())
+    finally:
+        fakes.terminate()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,442 @@
+"""
+Load test: virtual users click through /cards, /decks and /decode flows.
+
+Updates are fed to the real Dispatcher with all the handlers and middlewares.
+The Telegram Bot API and the HS Deck Helper API are faked by local servers
+running in a child process, so they don't compete with the bot for the event loop.
+
+Usage: python -m benchmarks.load_test [-u USERS] [-d DURATION] [--api-latency SECONDS] [--telegram-latency SECONDS]
+                                      [--loop asyncio|uvloop|both]
+
+With ``--loop both`` the same load runs on the asyncio loop, then on uvloop, and the throughput is compared.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import socket
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'data'
+TOKEN = '123456:load-test-token'
+
+logger = logging.getLogger(__name__)
+
+
+def load_fixture(name: str) -> dict:
+    return json.loads((DATA_DIR / f'{name}_fixture.json').read_text(encoding='utf-8'))
+
+
+# ---------------------------------------------------------------------------------------------------- fakes
+
+
+def make_api_app(latency: float) -> web.Application:
+    """ HS Deck Helper API serving the test fixtures """
+    cards = [card for page in load_fixture('cardlist')['cardlist']['cards'] for card in page]
+    card = load_fixture('carddetail')['card_detail']
+    decks = [deck for page in load_fixture('decklist')['deck_list']['decks'] for deck in page]
+    deck = load_fixture('deckdetail')['deck_detail']
+
+    def responder(payload):
+        async def respond(request: web.Request) -> web.Response:
+            await asyncio.sleep(latency)
+            return web.json_response(payload)
+        return respond
+
+    app = web.Application()
+    app.router.add_get('/api/v1/cards', responder(cards))
+    app.router.add_get('/api/v1/cards/{dbf_id}/', responder(card))
+    app.router.add_get('/api/v1/decks/', responder(decks))
+    app.router.add_post('/api/v1/decks/', responder(deck))
+    app.router.add_get('/api/v1/decks/{deck_id}/', responder(deck))
+    return app
+
+
+def make_telegram_app(latency: float) -> web.Application:
+    """
+    Bot API accepting every call. Keeps inline keyboards of the sent messages,
+    so virtual users know which buttons they can press (``GET /keyboards/{chat_id}``)
+    """
+    message_ids = itertools.count(1)
+    keyboards: dict[int, dict[int, list[str]]] = {}     # chat -> message -> callback data of the buttons
+    calls: dict[str, int] = {}
+
+    def callback_data(reply_markup: str | None) -> list[str]:
+        if not reply_markup:
+            return []
+        markup = json.loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+        return [button['callback_data'] for row in markup.get('inline_keyboard', ()) for button in row
+                if 'callback_data' in button]
+
+    async def method(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        name = request.match_info['method']
+        calls[name] = calls.get(name, 0) + 1
+        data = await request.post()
+        chat_id = int(data['chat_id']) if 'chat_id' in data else 0
+        chat = keyboards.setdefault(chat_id, {})
+        result = True
+
+        match name:
+            case 'getMe':
+                result = {'id': 123456, 'is_bot': True, 'first_name': 'HDH', 'username': 'hdh_load_test_bot'}
+            case 'sendMessage' | 'sendDocument' | 'editMessageText' | 'editMessageReplyMarkup':
+                message_id = int(data['message_id']) if 'message_id' in data else next(message_ids)
+                chat[message_id] = callback_data(data.get('reply_markup'))
+                result = {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'text': data.get('text', ''),
+                }
+            case 'deleteMessage':
+                chat.pop(int(data['message_id']), None)
+
+        return web.json_response({'ok': True, 'result': result})
+
+    async def chat_keyboards(request: web.Request) -> web.Response:
+        chat = keyboards.get(int(request.match_info['chat_id']), {})
+        return web.json_response({str(message_id): buttons for message_id, buttons in chat.items() if buttons})
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(calls)
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', method)
+    app.router.add_get('/keyboards/{chat_id}', chat_keyboards)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def serve_fakes(telegram_port: int, api_port: int, telegram_latency: float, api_latency: float):
+    """ Entry point of the child process """
+    async def serve():
+        runners = []
+        for app, port in ((make_telegram_app(telegram_latency), telegram_port), (make_api_app(api_latency), api_port)):
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, '127.0.0.1', port).start()
+            runners.append(runner)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float = 10):
+    finish = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            if time.monotonic() > finish:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            writer.close()
+            return
+
+
+# ---------------------------------------------------------------------------------------------------- users
+
+
+@dataclass(frozen=True)
+class Send:
+    """ The user sends a text message """
+    text: str
+
+
+@dataclass(frozen=True)
+class Click:
+    """ The user presses the first button whose callback data matches the pattern """
+    pattern: str
+
+
+FLOWS = {
+    'cards': (
+        Send('/cards'),
+        Click(r'^cpd:ctype:add$'),
+        Click(r'^cpd:\w+:submit$'),
+        Click(r'^cmd:card_request:request:'),
+        Click(r'^cmd:card_pages:right:'),
+        Click(r'^cld:\d+:getcard$'),
+        Click(r'^cmd:card_detail:back:'),
+        Send('/cancel'),
+    ),
+    'decks': (
+        Send('/decks'),
+        Click(r'^dpd:dformat:add$'),
+        Click(r'^dpd:[^:]+:submit$'),
+        Click(r'^cmd:deck_request:request:'),
+        Click(r'^dld:\d+:get$'),
+        Send('/cancel'),
+    ),
+    'decode': (
+        Send('/decode'),
+        Send(load_fixture('deckdetail')['deck_detail']['string']),
+        Send('/cancel'),
+    ),
+}
+
+
+@dataclass
+class Results:
+    latencies: dict[str, list[float]] = field(default_factory=dict)     # by flow
+    failures: dict[str, int] = field(default_factory=dict)              # by flow
+    flows: int = 0
+
+    def record(self, flow: str, latency: float):
+        self.latencies.setdefault(flow, []).append(latency)
+
+    def fail(self, flow: str):
+        self.failures[flow] = self.failures.get(flow, 0) + 1
+
+    @property
+    def updates(self) -> int:
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+
+class VirtualUser:
+    """ Private chat with the bot """
+
+    update_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, dp, session: ClientSession, telegram_url: str):
+        self.user_id = user_id
+        self.dp = dp
+        self.session = session
+        self.telegram_url = telegram_url
+
+    def base(self) -> dict:
+        return {
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': f'User {self.user_id}'},
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'date': int(time.time()),
+        }
+
+    async def update(self, step: Send | Click) -> dict | None:
+        """ Update produced by the step, None if the button isn't shown """
+        update_id = next(self.update_ids)
+        if isinstance(step, Send):
+            return {'update_id': update_id, 'message': self.base() | {'message_id': update_id, 'text': step.text}}
+
+        async with self.session.get(f'{self.telegram_url}/keyboards/{self.user_id}') as resp:
+            keyboards = await resp.json()
+        for message_id, buttons in sorted(keyboards.items(), key=lambda item: -int(item[0])):
+            for data in buttons:
+                if re.search(step.pattern, data):
+                    message = self.base() | {'message_id': int(message_id), 'text': ''}
+                    return {'update_id': update_id, 'callback_query': {
+                        'id': str(update_id),
+                        'from': message['from'],
+                        'message': message,
+                        'chat_instance': str(self.user_id),
+                        'data': data,
+                    }}
+        return None
+
+    async def process(self, update: dict):
+        """ Pass the update to the dispatcher as polling does """
+        from aiogram import types
+
+        await self.dp.process_updates([types.Update(**update)])
+
+    async def run_flow(self, name: str, results: Results, think: float):
+        for step in FLOWS[name]:
+            update = await self.update(step)
+            if update is None:
+                results.fail(name)
+                return
+            started_at = time.perf_counter()
+            try:
+                await self.process(update)
+            except Exception as e:
+                logger.error(f'{name} flow failed at {step}: {e!r}')
+                results.fail(name)
+                return
+            results.record(name, time.perf_counter() - started_at)
+            if think:
+                await asyncio.sleep(random.uniform(0, think))
+        results.flows += 1
+
+    async def run(self, finish_at: float, results: Results, think: float):
+        while time.monotonic() < finish_at:
+            await self.run_flow(random.choice(tuple(FLOWS)), results, think)
+
+
+# ---------------------------------------------------------------------------------------------------- report
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    """ p50, p95, p99 in milliseconds """
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def current_rss() -> int:
+    """ Resident set size in KB """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def report(results: Results, elapsed: float, rss_before: int, telegram_calls: dict) -> str:
+    rows = [f'{"flow":<10}{"updates":>9}{"failed":>8}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}']
+    everything = []
+    for flow, latencies in sorted(results.latencies.items()):
+        everything += latencies
+        rows.append(f'{flow:<10}{len(latencies):>9}{results.failures.get(flow, 0):>8}'
+                    + ''.join(f'{value:>10.1f}' for value in percentiles(latencies)))
+    rows.append(f'{"total":<10}{len(everything):>9}{sum(results.failures.values()):>8}'
+                + ''.join(f'{value:>10.1f}' for value in percentiles(everything)))
+    rows += [
+        '',
+        f'throughput: {results.updates / elapsed:.1f} updates/s, {results.flows / elapsed:.1f} flows/s',
+        f'RSS: {rss_before / 1024:.1f} MB before, {current_rss() / 1024:.1f} MB after, '
+        f'{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB peak',
+        f'Bot API calls: {sum(telegram_calls.values())} '
+        + ', '.join(f'{name}={count}' for name, count in sorted(telegram_calls.items())),
+    ]
+    return '\n'.join(rows)
+
+
+# ---------------------------------------------------------------------------------------------------- main
+
+
+def setup_environment(api_port: int):
+    """ Point the bot to the fake API, before the configuration is loaded """
+    os.environ['HDH_API_DOMAIN'] = f'127.0.0.1:{api_port}'
+    os.environ.setdefault('TOKEN', TOKEN)
+    os.environ.setdefault('ADMIN_ID', '1')
+
+
+def make_dispatcher(storage, telegram_url: str):
+    """ Dispatcher set up like in production, talking to the fake Bot API """
+    from aiogram import Bot, Dispatcher
+    from aiogram.bot.api import TelegramAPIServer
+    from aiogram.types import ParseMode
+
+    from app.handlers import register_handlers
+    from app.middlewares import setup_middlewares
+    from app.services.storage import StorageProxy
+    from app.services.telegram import MeteredBot
+
+    bot = MeteredBot(token=TOKEN, parse_mode=ParseMode.HTML, server=TelegramAPIServer.from_base(telegram_url))
+    dp = Dispatcher(bot, storage=StorageProxy(storage))
+    setup_middlewares(dp)
+    register_handlers(dp)
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    return dp
+
+
+def start_fakes(telegram_latency: float, api_latency: float) -> tuple[multiprocessing.Process, int, int]:
+    """ :return: the child process, the ports of the fake Bot API and of the fake HDH API """
+    telegram_port, api_port = free_port(), free_port()
+    fakes = multiprocessing.Process(
+        target=serve_fakes,
+        args=(telegram_port, api_port, telegram_latency, api_latency),
+        daemon=True,
+    )
+    fakes.start()
+    return fakes, telegram_port, api_port
+
+
+async def telegram_stats(session: ClientSession, telegram_url: str) -> dict[str, int]:
+    async with session.get(f'{telegram_url}/stats') as resp:
+        return await resp.json()
+
+
+async def run(users: int, duration: float, think: float, telegram_port: int, api_port: int) -> tuple[str, float]:
+    """
+    :return: report and throughput, updates per second
+    """
+    from aiogram.contrib.fsm_storage.memory import MemoryStorage
+    from app.services.cache import response_cache
+
+    setup_environment(api_port)
+    telegram_url = f'http://127.0.0.1:{telegram_port}'
+    response_cache.clear()      # every run starts cold
+    dp = make_dispatcher(MemoryStorage(), telegram_url)
+
+    results = Results()
+    rss_before = current_rss()
+    async with ClientSession() as session:
+        calls_before = await telegram_stats(session, telegram_url)
+        finish_at = time.monotonic() + duration
+        started_at = time.perf_counter()
+        await asyncio.gather(*(
+            VirtualUser(user_id, dp, session, telegram_url).run(finish_at, results, think)
+            for user_id in range(1000, 1000 + users)
+        ))
+        elapsed = time.perf_counter() - started_at
+        telegram_calls = {name: count - calls_before.get(name, 0)
+                          for name, count in (await telegram_stats(session, telegram_url)).items()}
+
+    await (await dp.bot.get_session()).close()
+    return report(results, elapsed, rss_before, telegram_calls), results.updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-u', '--users', type=int, default=50, help='concurrent virtual users')
+    parser.add_argument('-d', '--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--think', type=float, default=0.0, help='max seconds a user waits between steps')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='seconds of the fake API response')
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='seconds of the fake Bot API response')
+    parser.add_argument('--loop', choices=['asyncio', 'uvloop', 'both'], default='asyncio',
+                        help='event loop of the bot, both to compare them')
+    args = parser.parse_args()
+
+    from app.services.eventloop import install_event_loop_policy
+
+    fakes, telegram_port, api_port = start_fakes(args.telegram_latency, args.api_latency)
+
+    async def start():
+        await wait_for_port(telegram_port)
+        await wait_for_port(api_port)
+        return await run(args.users, args.duration, args.think, telegram_port, api_port)
+
+    throughput = {}
+    try:
+        print(f'{args.users} users for {args.duration:.0f}s, API latency {args.api_latency * 1000:.0f} ms, '
+              f'Bot API latency {args.telegram_latency * 1000:.0f} ms')
+        for requested in (['asyncio', 'uvloop'] if args.loop == 'both' else [args.loop]):
+            loop = install_event_loop_policy(requested)
+            if loop in throughput:  # uvloop isn't installed
+                continue
+            text, throughput[loop] = asyncio.run(start())
+            print(f'\n== {loop}\n{text}')
+    finally:
+        fakes.terminate()
+        install_event_loop_policy('asyncio')
+
+    if len(throughput) == 2:
+        change = throughput['uvloop'] / throughput['asyncio'] - 1
+        print(f'\nuvloop: {throughput["uvloop"]:.1f} updates/s, asyncio: {throughput["asyncio"]:.1f} updates/s '
+              f'({change:+.1%})')
+
+
+if __name__ == '__main__':
+    main()
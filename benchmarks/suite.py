@@ -0,0 +1,172 @@
+"""
+Micro-benchmarks with JSON baselines.
+
+Usage:
+    python -m benchmarks.suite run [-k PATTERN] [--save NAME]
+    python -m benchmarks.suite compare BASELINE [CURRENT] [--threshold 0.1]
+
+Results are saved to .benchmarks/NAME.json. ``compare`` takes saved names or paths,
+runs the suite when CURRENT is omitted, and exits with 1 if any benchmark is slower
+than the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+RESULTS_DIR = Path(__file__).resolve().parent.parent / '.benchmarks'
+MODULES = ('benchmarks.bench_render',)      # modules registering benchmarks on import
+ROUNDS = 7
+MIN_ROUND_TIME = 0.1    # seconds, the number of calls per round is calibrated to it
+
+registry: dict[str, Callable[[], Callable]] = {}
+
+
+def benchmark(name: str):
+    """
+    Register the benchmark. The decorated function prepares the data and returns
+    the callable to time, a plain or a coroutine function with no arguments
+    """
+    def register(setup: Callable[[], Callable]):
+        if name in registry:
+            raise ValueError(f'Benchmark {name} is already registered')
+        registry[name] = setup
+        return setup
+    return register
+
+
+def measure_sync(target: Callable) -> tuple[int, list[float]]:
+    timer = timeit.Timer(target)
+    number, _ = timer.autorange()
+    number = max(int(number * MIN_ROUND_TIME / 0.2), 1)     # autorange aims at 0.2 s
+    return number, [t / number for t in timer.repeat(repeat=ROUNDS, number=number)]
+
+
+def measure_async(target: Callable) -> tuple[int, list[float]]:
+    async def run_round(number: int) -> float:
+        started_at = time.perf_counter()
+        for _ in range(number):
+            await target()
+        return time.perf_counter() - started_at
+
+    async def measure():
+        number = 1
+        while (elapsed := await run_round(number)) < MIN_ROUND_TIME:
+            number = max(number * 2, int(number * MIN_ROUND_TIME / max(elapsed, 1e-9)))
+        return number, [await run_round(number) / number for _ in range(ROUNDS)]
+
+    return asyncio.run(measure())
+
+
+def run(pattern: str = None) -> dict:
+    """
+    Run the registered benchmarks
+
+    :param pattern: regular expression the names should match
+    :return: results in the baseline format
+    """
+    for module in MODULES:
+        importlib.import_module(module)
+
+    results = {}
+    for name, setup in registry.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        target = setup()
+        measure = measure_async if inspect.iscoroutinefunction(target) else measure_sync
+        number, timings = measure(target)
+        results[name] = {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.mean(timings),
+            'stdev': statistics.stdev(timings),
+            'rounds': ROUNDS,
+            'number': number,
+        }
+        print(f'{name:<40}{results[name]["min"] * 1e6:>12.2f} us  (median {results[name]["median"] * 1e6:.2f})')
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f'{platform.system()} {platform.machine()} {platform.processor()}'.strip(),
+        'benchmarks': results,
+    }
+
+
+def resolve(name: str) -> Path:
+    path = Path(name)
+    return path if path.suffix == '.json' else RESULTS_DIR / f'{name}.json'
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Print the comparison table
+
+    Rounds are compared by the fastest one, the least disturbed by the rest of the system
+
+    :param threshold: relative slowdown considered a regression, f.e. 0.1 for 10%
+    :return: names of the regressed benchmarks
+    """
+    regressions = []
+    print(f'{"benchmark":<40}{"baseline, us":>14}{"current, us":>14}{"change":>10}')
+    for name, result in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            print(f'{name:<40}{"-":>14}{result["min"] * 1e6:>14.2f}{"new":>10}')
+            continue
+        change = result['min'] / base['min'] - 1
+        mark = ''
+        if change > threshold:
+            regressions.append(name)
+            mark = '  REGRESSION'
+        print(f'{name:<40}{base["min"] * 1e6:>14.2f}{result["min"] * 1e6:>14.2f}{change:>+10.1%}{mark}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-k', dest='pattern', help='run only the benchmarks matching the regular expression')
+    run_parser.add_argument('--save', metavar='NAME', help='save the results as .benchmarks/NAME.json')
+    compare_parser = commands.add_parser('compare', help='compare the results with the baseline')
+    compare_parser.add_argument('baseline', help='saved name or path of the baseline')
+    compare_parser.add_argument('current', nargs='?', help='saved name or path, the suite is run if omitted')
+    compare_parser.add_argument('-k', dest='pattern', help='run only the benchmarks matching the regular expression')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 for 10%%')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.pattern)
+        if args.save:
+            path = resolve(args.save)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2), encoding='utf-8')
+            print(f'Saved to {path}')
+        return
+
+    baseline = json.loads(resolve(args.baseline).read_text(encoding='utf-8'))
+    if args.current:
+        current = json.loads(resolve(args.current).read_text(encoding='utf-8'))
+    else:
+        current = run(args.pattern)
+        print()
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) above {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    # Benchmark modules register in ``benchmarks.suite``, not in ``__main__``
+    importlib.import_module('benchmarks.suite').main()
@@ -1,18 +1,74 @@
+from app.importtime import ImportTimer
+
+import_timer = ImportTimer.install()     # before anything else is imported
+
+import argparse
 import asyncio
 import logging
-import platform
+import signal
+import sys
+import time
+from multiprocessing.connection import Connection
 
+import aioredis
 from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand, ParseMode
-from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
-from aioredis.exceptions import ConnectionError as RedisConnectionError
+from aiogram.dispatcher.storage import BaseStorage
+from aiohttp import web
 
+from app.config import Config, get_config, get_hs_data, get_hs_version, RESPONSE_CACHE_TTL
 from app.handlers import register_handlers
+from app.middlewares import setup_middlewares
+from app.services.cache import cache_snapshot, shared_cache
+from app.services.eventloop import install_event_loop_policy
+from app.services.health import probe, wait_available
+from app.services.prefetch import prefetcher
+from app.services.storage import StorageProxy
+from app.services.redis_storage import RedisStorage
+from app.services.server import start_server
+from app.services.shutdown import DrainingDispatcher, run_until_stopped
+from app.services.streams import StreamIngress, StreamWorker, owned_partitions, poll_updates
+from app.services.telegram import MeteredBot
+from app.services.tracing import tracer, OtlpLogExporter, SlowUpdateLogger
+from app.services.workers import WorkerPool, serve_pipe
+
+import_timer.uninstall()
 
 logger = logging.getLogger('app')
 
 
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='{asctime} | {levelname:^8s} | {name:^34s} : : : {message}',
+        style='{',
+    )
+
+
+def configure():
+    """ Load the configuration at once, so the bot doesn't start misconfigured """
+    try:
+        logger.info('Load configuration...')
+        get_config()
+        get_hs_data()
+    except Exception as e:
+        logger.error(f'Configuration error: {e}')
+        sys.exit()
+    else:
+        logger.info('Successfully configured')
+
+
+def setup_tracing():
+    monitoring = get_config().monitoring
+    exporters = []
+    if monitoring.TRACE_SAMPLE_RATE:
+        exporters.append(OtlpLogExporter())
+    if monitoring.SLOW_UPDATE:
+        exporters.append(SlowUpdateLogger(threshold=monitoring.SLOW_UPDATE))
+    tracer.configure(sample_rate=monitoring.TRACE_SAMPLE_RATE, exporters=exporters)
+
+
 async def set_commands(bot: Bot):
     """ Register commands for displaying in Telegram interface """
     commands = [
@@ -24,52 +80,236 @@ async def set_commands(bot: Bot):
     await bot.set_my_commands(commands)
 
 
-async def main():
-    logger.info('Starting bot')
+async def connect(name: str, check, config: Config) -> bool:
+    """ Wait for the Redis server, watch it for the readiness probe if it's available """
+    available = await wait_available(   # PING, not a scan of the keys
+        check,
+        attempts=config.storage.CONNECT_ATTEMPTS,
+        timeout=config.monitoring.READINESS_TIMEOUT,
+        backoff_base=config.storage.CONNECT_BACKOFF_BASE,
+        backoff_max=config.storage.CONNECT_BACKOFF_MAX,
+    )
+    if available:
+        probe.add(name, check)
+    return available
 
-    from app.config import config
 
-    bot = Bot(token=config.bot.TOKEN, parse_mode=ParseMode.HTML)
+async def create_storage(config: Config, required: bool = False) -> BaseStorage:
+    """
+    Redis storage if it's available, the memory one otherwise
 
-    try:
-        storage = RedisStorage2(
-            host='redis',
-            port=6379,
-            db=5,
-            password=config.storage.PASSWORD,
-            prefix='fsm',
-        )
-        await storage.get_states_list()     # check Redis availability
+    :param required: exit instead of falling back, f.e. for workers sharing the state
+    """
+    storage = RedisStorage(
+        host='redis',
+        port=6379,
+        db=5,
+        password=config.storage.PASSWORD,
+        pool_size=config.storage.POOL_SIZE,
+        prefix=f'fsm:{get_hs_version()}',   # the state keeps HSEntities codes, it's reset when they change
+        state_ttl=config.storage.STATE_TTL,     # so the keys of the previous versions expire
+        data_ttl=config.storage.STATE_TTL,
+        health_check_interval=config.storage.HEALTH_CHECK_INTERVAL,
+    )
+    if await connect('redis', storage.ping, config):
         logger.info('Using Redis')
-    except RedisConnectionError:
-        storage = MemoryStorage()
-        logger.info('Using memory storage')
+        return storage
+    await storage.close()
+    if required:
+        logger.error('Redis is unavailable')
+        sys.exit()
+    logger.info('Using memory storage')
+    return MemoryStorage()
+
+
+def create_redis_client(config: Config) -> aioredis.Redis:
+    """ Redis client apart from the storage pool, f.e. blocking reads of the streams hold their connections """
+    return aioredis.Redis(
+        host='redis',
+        port=6379,
+        db=5,
+        password=config.storage.PASSWORD,
+        decode_responses=True,
+        health_check_interval=config.storage.HEALTH_CHECK_INTERVAL,
+    )
 
-    dp = Dispatcher(bot, storage=storage)
 
+def create_dispatcher(bot: Bot, storage: BaseStorage) -> DrainingDispatcher:
+    dp = DrainingDispatcher(bot, storage=StorageProxy(storage))
+    setup_tracing()
+    setup_middlewares(dp)
     register_handlers(dp)
+    return dp
 
-    await set_commands(bot)
 
+def load_cache_snapshot(config: Config, name: str = 'response_cache'):
+    """
+    Warm the response cache up with the snapshot saved before the restart, save it periodically
+
+    :param name: of the snapshot file, every process running the handlers has its own one
+    """
+    directory = config.cache.SNAPSHOT_DIR
+    cache_snapshot.configure(directory / f'{name}.pickle' if directory else None, config.cache.SNAPSHOT_INTERVAL)
+    cache_snapshot.load()
+    cache_snapshot.start()
+
+
+async def shutdown(bot: Bot, dp: Dispatcher, runner: web.AppRunner | None, redis: aioredis.Redis | None = None):
+    """ Close everything once the updates are drained: the state is written by the handlers themselves """
+    prefetcher.clear()
+    await cache_snapshot.stop()
+    await probe.stop()
+    if runner:
+        await runner.cleanup()
+    if redis is not None:
+        await redis.close()
+    await dp.storage.close()
+    await dp.storage.wait_closed()
+    session = await bot.get_session()
+    await session.close()
+
+
+async def main(mode: str = 'polling', worker: int = 0, workers: int = 1):
+    """
+    :param mode: ``polling`` to run the handlers in this process, ``ingress`` to push the updates
+        into the Redis streams, ``worker`` to run the handlers for the updates of the streams
+    :param worker: index of the worker
+    :param workers: number of the workers sharing the streams
+    """
+    logger.info(f'Starting bot ({mode})')
+
+    config = get_config()
+    monitoring = config.monitoring
+    probe.configure(interval=monitoring.READINESS_INTERVAL, timeout=monitoring.READINESS_TIMEOUT)
+    bot = MeteredBot(token=config.bot.TOKEN, parse_mode=ParseMode.HTML)
+    redis = None if mode == 'polling' else create_redis_client(config)
+
+    if mode == 'ingress':
+        if not await connect('streams', redis.ping, config):
+            logger.error('Redis is unavailable')
+            sys.exit()
+        dp = Dispatcher(bot)
+    else:
+        dp = create_dispatcher(bot, await create_storage(config, required=mode == 'worker'))
+        if mode == 'worker':
+            shared_cache.configure(redis, ttl=RESPONSE_CACHE_TTL)
+        load_cache_snapshot(config, 'response_cache' if mode == 'polling' else f'response_cache-worker-{worker}')
+
+    if mode != 'worker':
+        await set_commands(bot)
+        await dp.skip_updates()
+
+    runner = await start_server(monitoring.HOST, monitoring.PORT)
+    probe.start()
+    try:
+        if mode == 'ingress':
+            ingress = StreamIngress(redis, config.streams.PREFIX, config.streams.PARTITIONS, config.streams.MAXLEN)
+            await run_until_stopped(poll_updates(bot, ingress.push))
+        elif mode == 'worker':
+            Dispatcher.set_current(dp)
+            Bot.set_current(bot)
+            stream_worker = StreamWorker(
+                dp, redis, config.streams.PREFIX,
+                partitions=owned_partitions(worker, workers, config.streams.PARTITIONS),
+                consumer=f'worker-{worker}',
+                batch=config.streams.BATCH,
+                concurrency=config.streams.CONCURRENCY,
+                claim_idle=int(config.streams.CLAIM_IDLE * 1000),
+            )
+            await run_until_stopped(stream_worker.run(), stop=stream_worker.stop, timeout=config.bot.DRAIN_TIMEOUT)
+        else:
+            await run_until_stopped(dp.start_polling())
+        if mode != 'ingress':
+            await dp.drain(config.bot.DRAIN_TIMEOUT)
+    finally:
+        await shutdown(bot, dp, runner, redis)
+
+
+async def supervise(processes: int):
+    """ Poll in this process, run the handlers in the children """
+    logger.info(f'Starting bot ({processes} processes)')
+
+    config = get_config()
+    monitoring = config.monitoring
+    bot = MeteredBot(token=config.bot.TOKEN, parse_mode=ParseMode.HTML)
+    dp = Dispatcher(bot)
+    await set_commands(bot)
     await dp.skip_updates()
+
+    pool = WorkerPool(processes, target=child_process)
+    pool.start()
+    runner = await start_server(monitoring.HOST, monitoring.PORT)
     try:
-        await dp.start_polling()
+        await run_until_stopped(poll_updates(bot, pool.push))
     finally:
-        await dp.storage.close()
-        await dp.storage.wait_closed()
-        session = await bot.get_session()
-        await session.close()
+        started = time.monotonic()
+        await asyncio.to_thread(pool.stop, config.bot.DRAIN_TIMEOUT + 5)    # the children drain their updates
+        logger.info(f'Workers stopped in {time.monotonic() - started:.2f}s')
+        await shutdown(bot, dp, runner)
+
+
+async def serve_child(index: int, connection: Connection):
+    """ Handlers of a child process, for the updates sent by ``supervise`` """
+    config = get_config()
+    monitoring = config.monitoring
+    probe.configure(interval=monitoring.READINESS_INTERVAL, timeout=monitoring.READINESS_TIMEOUT)
+    bot = MeteredBot(token=config.bot.TOKEN, parse_mode=ParseMode.HTML)
+    storage = await create_storage(config)
+    redis = None
+    if isinstance(storage, RedisStorage):
+        redis = create_redis_client(config)
+        shared_cache.configure(redis, ttl=RESPONSE_CACHE_TTL)
+    dp = create_dispatcher(bot, storage)
+    Dispatcher.set_current(dp)
+    Bot.set_current(bot)
+    load_cache_snapshot(config, f'response_cache-{index}')     # a child always gets the same chats
+
+    # /metrics of the children are next to the port of the parent
+    runner = await start_server(monitoring.HOST, monitoring.PORT + 1 + index if monitoring.PORT else 0)
+    probe.start()
+    try:
+        await serve_pipe(connection, dp)
+        await dp.drain(config.bot.DRAIN_TIMEOUT)
+    finally:
+        await shutdown(bot, dp, runner, redis)
+
+
+def child_process(index: int, connection: Connection):
+    """ Entry point of a child process """
+    for sig in (signal.SIGINT, signal.SIGTERM):     # the parent stops the children by closing the pipes
+        signal.signal(sig, signal.SIG_IGN)
+    setup_logging()
+    install_event_loop_policy(get_config().bot.EVENT_LOOP)
+    asyncio.run(serve_child(index, connection))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='HS Deck Helper Telegram bot')
+    parser.add_argument('mode', nargs='?', choices=['polling', 'ingress', 'worker'], default='polling',
+                        help='polling runs everything in one process; ingress and workers share the updates '
+                             'through Redis streams, a chat is always handled by the same worker')
+    parser.add_argument('--worker', type=int, default=0, help='index of the worker, from 0')
+    parser.add_argument('--of', dest='workers', type=int, default=1, help='number of the workers')
+    parser.add_argument('--workers', dest='processes', type=int, default=1,
+                        help='polling only: run the handlers in N processes, a chat is always handled by the same one')
+    return parser.parse_args()
 
 
 def cli():
     """ Wrapper for command line """
+    setup_logging()
+    import_timer.report(logger)
+    args = parse_args()
+    configure()
+    logger.info(f'Using the {install_event_loop_policy(get_config().bot.EVENT_LOOP)} event loop')
     try:
-        asyncio.run(main())
+        if args.mode == 'polling' and args.processes > 1:
+            asyncio.run(supervise(args.processes))
+        else:
+            asyncio.run(main(args.mode, args.worker, args.workers))
     except (KeyboardInterrupt, SystemExit):
         logger.error('Bot stopped')
 
 
 if __name__ == '__main__':
-    if platform.system() == 'Windows':
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     cli()
@@ -0,0 +1,246 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.config import LIST_CACHE_TTL, RESPONSE_CACHE_TTL
+from app.services.api import Request, RequestCards, RequestSingleCard
+from app.services.cache import CacheSnapshot, ResponseCache, SharedCache, shared_cache
+from app.services.models import Deck
+
+
+class TestResponseCache:
+
+    def test_get_set(self):
+        cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+        assert cache.get('key') is None
+        cache.set('key', {'id': 1})
+        assert cache.get('key') == {'id': 1}
+
+    def test_expired(self):
+        cache = ResponseCache(ttl=-1, stale_ttl=-1, max_size=10)
+        cache.set('key', {'id': 1})
+        assert cache.get('key') is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(ttl=60, stale_ttl=60, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    @pytest.mark.asyncio
+    async def test_get_or_fetch(self):
+        cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+        fetch_mock = AsyncMock(return_value={'id': 1})
+
+        assert await cache.get_or_fetch('key', fetch_mock) == {'id': 1}
+        assert await cache.get_or_fetch('key', fetch_mock) == {'id': 1}
+        fetch_mock.assert_called_once()
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_fetches_are_shared(self):
+        cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(cache.get_or_fetch('key', fetch) for _ in range(5)))
+        assert results == [1] * 5
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_fetch_is_cancelled(self):
+        cache = ResponseCache(ttl=60, stale_ttl=60, max_size=10)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(cache.get_or_fetch('key', fetch))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert cache.get('key') is None
+
+    @pytest.mark.asyncio
+    async def test_stale_while_revalidate(self):
+        cache = ResponseCache(ttl=0, stale_ttl=60, max_size=10)
+        cache.set('key', 'old')
+        fetch_mock = AsyncMock(return_value='new')
+
+        assert await cache.get_or_fetch('key', fetch_mock) == 'old'
+        await asyncio.sleep(0)
+        fetch_mock.assert_called_once()
+        assert cache.entry('key').value == 'new'
+        assert cache.stale_hits == 1
+        assert cache.outdated_age('key') is None
+
+    @pytest.mark.asyncio
+    async def test_stale_is_served_when_refresh_fails(self):
+        cache = ResponseCache(ttl=0, stale_ttl=60, max_size=10)
+        cache.set('key', 'old')
+        fetch_mock = AsyncMock(side_effect=ConnectionError)
+
+        assert await cache.get_or_fetch('key', fetch_mock) == 'old'
+        await asyncio.sleep(0)
+        assert cache.outdated_age('key') is not None
+        assert await cache.get_or_fetch('key', fetch_mock) == 'old'
+        await asyncio.sleep(0)
+        assert fetch_mock.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_shorter_ttl_of_the_key(self):
+        cache = ResponseCache(ttl=60, stale_ttl=120, max_size=10)
+        cache.set('key', 'old')
+        fetch_mock = AsyncMock(return_value='new')
+
+        assert await cache.get_or_fetch('key', fetch_mock, ttl=0, stale_ttl=60) == 'old'
+        await asyncio.sleep(0)
+        assert cache.stale_hits == 1
+        assert cache.entry('key').value == 'new'
+
+        with patch('time.monotonic', return_value=time.monotonic() + 90):
+            assert await cache.get_or_fetch('key', fetch_mock, ttl=0, stale_ttl=60) == 'new'
+        assert cache.misses == 1    # too old to be served stale for the key
+
+    def test_export_restore(self):
+        cache = ResponseCache(ttl=60, stale_ttl=120, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        restored = ResponseCache(ttl=60, stale_ttl=120, max_size=2)
+        restored.set('b', 'new')
+
+        assert restored.restore([(key, value, age + 90) for key, value, age in cache.export()]) == 1
+        assert restored.get('a') is None        # stale after 90 seconds
+        assert restored.entry('a').value == 1
+        assert restored.get('b') == 'new'
+        assert restored.restore([('c', 3, 121)]) == 0
+
+
+class TestCacheSnapshot:
+
+    @staticmethod
+    def snapshot(tmp_path, cache: ResponseCache) -> CacheSnapshot:
+        snapshot = CacheSnapshot(cache)
+        snapshot.configure(tmp_path / 'snapshots' / 'response_cache.pickle', interval=0)
+        return snapshot
+
+    @pytest.mark.asyncio
+    async def test_save_load(self, tmp_path, deck_detail_full_data):
+        cache = ResponseCache(ttl=60, stale_ttl=120, max_size=10)
+        deck = Deck.from_api(deck_detail_full_data['deck_detail'])
+        cache.set('deck', deck)
+        await self.snapshot(tmp_path, cache).stop()     # saved on shutdown
+
+        restored = ResponseCache(ttl=60, stale_ttl=120, max_size=10)
+        with patch('time.time', return_value=time.time() + 30):
+            assert self.snapshot(tmp_path, restored).load() == 1
+        assert restored.get('deck') == deck
+        assert 30 <= restored.entry('deck').age < 31
+
+    @pytest.mark.asyncio
+    async def test_other_entities(self, tmp_path):
+        cache = ResponseCache(ttl=60, stale_ttl=120, max_size=10)
+        cache.set('key', 1)
+        await self.snapshot(tmp_path, cache).save()
+
+        snapshot = self.snapshot(tmp_path, ResponseCache(ttl=60, stale_ttl=120, max_size=10))
+        snapshot.digest = b'0' * len(snapshot.digest)   # hs_entities.json has changed
+        assert snapshot.load() == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, tmp_path):
+        snapshot = CacheSnapshot(ResponseCache(ttl=60, stale_ttl=120, max_size=10))
+        snapshot.configure(None, interval=300)
+        snapshot.start()
+        await snapshot.stop()
+        assert snapshot.load() == 0
+        assert not list(tmp_path.iterdir())
+
+
+class TestSharedCache:
+
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        cache = SharedCache()
+        assert await cache.get('key') is None
+        await cache.set('key', {'id': 1})
+
+    @pytest.mark.asyncio
+    async def test_get_set(self):
+        redis = AsyncMock()
+        redis.get.return_value = None
+        cache = SharedCache()
+        cache.configure(redis, ttl=60)
+        assert await cache.get('cards/?name=a') is None
+        await cache.set('cards/?name=a', [{'id': 1}])
+        redis.set.assert_called_with('cache:cards/?name=a', '[{"id":1}]', ex=60)
+
+        redis.get.return_value = '[{"id":1}]'
+        assert await cache.get('cards/?name=a') == [{'id': 1}]
+
+    @pytest.mark.asyncio
+    async def test_unavailable_is_a_miss(self):
+        redis = AsyncMock()
+        redis.get.side_effect = ConnectionError
+        redis.set.side_effect = ConnectionError
+        cache = SharedCache()
+        cache.configure(redis, ttl=60)
+        assert await cache.get('key') is None
+        await cache.set('key', {'id': 1})
+
+    @pytest.mark.asyncio
+    async def test_request_shares_raw_response(self):
+        redis = AsyncMock()
+        redis.get.return_value = None
+        shared_cache.configure(redis, ttl=60)
+        try:
+            with patch('app.services.api.Request.call', new_callable=AsyncMock) as call_mock:
+                call_mock.return_value = {'id': 1}
+                assert await Request('cards/1/').shared('cards/1/?', 'GET', retries=0) == {'id': 1}
+                redis.get.assert_not_called()    # not cacheable
+
+                request = Request('cards/1/')
+                request.cacheable = True
+                assert await request.shared('cards/1/?', 'GET', retries=0) == {'id': 1}
+                redis.set.assert_called_with('cache:cards/1/?', '{"id":1}', ex=60)
+
+                redis.get.return_value = '{"id":2}'
+                assert await request.shared('cards/1/?', 'GET', retries=0) == {'id': 2}
+                assert call_mock.call_count == 2
+        finally:
+            shared_cache.configure(None, ttl=0)
+
+    @pytest.mark.asyncio
+    async def test_lists_are_shared_shorter(self, card_request_full_data):
+        redis = AsyncMock()
+        redis.get.return_value = None
+        shared_cache.configure(redis, ttl=RESPONSE_CACHE_TTL)
+        try:
+            with patch('app.services.api.Request.call', new_callable=AsyncMock) as call_mock:
+                call_mock.return_value = []
+                await RequestCards(card_request_full_data).fetch()
+                assert redis.set.call_args.kwargs['ex'] == LIST_CACHE_TTL
+
+                call_mock.return_value = {}
+                await RequestSingleCard(1).shared('cards/1/?', 'GET', retries=0)
+                assert redis.set.call_args.kwargs['ex'] == RESPONSE_CACHE_TTL
+        finally:
+            shared_cache.configure(None, ttl=0)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.callbacks import CallbackAck, answer_callback, current_ack
+from app.services.metrics import callback_answer_duration
+from app.middlewares.callback_answer import CallbackAnswerMiddleware
+
+
+class TestCallbackAck:
+
+    @pytest.mark.asyncio
+    async def test_answer_once(self):
+        call_mock = AsyncMock()
+        ack = CallbackAck(call_mock)
+        before = callback_answer_duration.count()
+
+        assert await ack.answer('hint')
+        assert not await ack.answer()
+        call_mock.answer.assert_called_once_with('hint')
+        assert ack.gap is not None
+        assert callback_answer_duration.count() == before + 1
+
+    @pytest.mark.asyncio
+    async def test_answer_callback_without_middleware(self):
+        call_mock = AsyncMock()
+        await answer_callback(call_mock, 'hint')
+        call_mock.answer.assert_called_once_with('hint')
+
+    @pytest.mark.asyncio
+    async def test_late_hint_is_sent_as_message(self):
+        call_mock = AsyncMock()
+        ack = CallbackAck(call_mock)
+        current_ack.set(ack)
+        await ack.answer()
+
+        await answer_callback(call_mock, 'hint')
+
+        call_mock.answer.assert_called_once_with(None)
+        call_mock.bot.send_message.assert_called_once()
+
+
+class TestCallbackAnswerMiddleware:
+
+    @pytest.mark.asyncio
+    async def test_answered_within_budget(self):
+        call_mock = AsyncMock()
+        middleware = CallbackAnswerMiddleware(budget=0.01)
+
+        await middleware.on_pre_process_callback_query(call_mock, {})
+        await asyncio.sleep(0.05)     # slow handler
+
+        call_mock.answer.assert_called_once_with(None)
+        await middleware.on_post_process_callback_query(call_mock, [], {})
+        call_mock.answer.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_handler_hint_in_time(self):
+        call_mock = AsyncMock()
+        middleware = CallbackAnswerMiddleware(budget=1)
+
+        await middleware.on_pre_process_callback_query(call_mock, {})
+        await answer_callback(call_mock, 'hint')
+        await middleware.on_post_process_callback_query(call_mock, [], {})
+
+        call_mock.answer.assert_called_once_with('hint')
+        call_mock.bot.send_message.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unanswered_query_is_answered_after_handler(self):
+        call_mock = AsyncMock()
+        middleware = CallbackAnswerMiddleware(budget=1)
+
+        await middleware.on_pre_process_callback_query(call_mock, {})
+        await middleware.on_post_process_callback_query(call_mock, [], {})
+
+        call_mock.answer.assert_called_once_with(None)
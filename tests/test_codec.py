@@ -0,0 +1,26 @@
+import pytest
+
+from app.codec import BACKENDS, get_codec
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_roundtrip(name):
+    codec = get_codec(name)
+    data = {'card': {'name': 'Ragnaros, Огненный Лорд', 'cost': 8, 'card_class': ['Neutral']}, 'page': 1}
+    assert codec.loads(codec.dumps(data)) == data
+    assert codec.loads(codec.dumps(data).encode()) == data
+    assert 'Огненный' in codec.dumps(data)
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_non_string_keys(name):
+    assert get_codec(name).loads(get_codec(name).dumps({1: 'a'})) == {'1': 'a'}
+
+
+def test_default_backend():
+    assert get_codec().name == 'orjson'
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_codec('pickle')
@@ -1,8 +1,10 @@
 import pytest
 
-from app.config import hs_data
+from app.config import get_hs_data, get_hs_version
 from app.exceptions import ArgumentError
 
+hs_data = get_hs_data()
+
 
 class TestHsData:
 
@@ -55,3 +57,27 @@ class TestHsData:
         assert hs_data.getrarity(name='Rare').sign == 'R'
         assert hs_data.getrarity(name='Common').sign == 'C'
         assert hs_data.getrarity(name='No rarity').sign == 'NO'
+
+
+class TestHsDataCodes:
+
+    def test_encode(self):
+        code = hs_data.encode('rarities', 'Legendary')
+        assert isinstance(code, int)
+        assert hs_data.entity('rarities', code) is hs_data.getrarity(name='Legendary')
+        assert hs_data.label('rarities', code) == 'Legendary'
+
+    def test_names_are_accepted(self):
+        assert hs_data.entity('types', 'Minion') is hs_data.gettype(name='Minion')
+        assert hs_data.label('types', 'Minion') == 'Minion'
+
+    def test_unknown(self):
+        assert hs_data.encode('sets', 'Future Set') == 'Future Set'
+        assert hs_data.entity('sets', 'Future Set') is None
+        assert hs_data.entity('sets', 10 ** 6) is None
+        assert hs_data.label('sets', 'Future Set') == 'Future Set'
+
+    def test_version(self):
+        version = get_hs_version()
+        assert len(version) == 12
+        int(version, 16)
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from app.config import get_config
+from app.exceptions import DeadlineExceeded
+from app.services.api import RequestSingleCard, RequestDecks, breakers
+from app.services.deadline import set_deadline, time_left, within_deadline
+from app.services.storage import StorageProxy
+from app.middlewares.deadline import DeadlineMiddleware
+
+
+async def run_in_context(coro_function, *args):
+    """ Run in a separate task, so the deadline doesn't leak into other tests """
+    return await asyncio.create_task(coro_function(*args))
+
+
+class TestDeadline:
+
+    @pytest.mark.asyncio
+    async def test_no_deadline(self):
+        async def check():
+            assert time_left() is None
+            assert await within_deadline(asyncio.sleep(0, result=1)) == 1
+        await run_in_context(check)
+
+    @pytest.mark.asyncio
+    async def test_time_left(self):
+        async def check():
+            set_deadline(10)
+            assert 9 < time_left() <= 10
+        await run_in_context(check)
+
+    @pytest.mark.asyncio
+    async def test_passed_deadline(self):
+        async def check():
+            set_deadline(0)
+            with pytest.raises(DeadlineExceeded):
+                time_left()
+        await run_in_context(check)
+
+    @pytest.mark.asyncio
+    async def test_slow_operation_is_abandoned(self):
+        async def check():
+            set_deadline(0.01)
+            with pytest.raises(DeadlineExceeded):
+                await within_deadline(asyncio.sleep(1))
+        await run_in_context(check)
+
+    @pytest.mark.asyncio
+    async def test_middleware_sets_deadline(self):
+        async def check():
+            await DeadlineMiddleware(timeout=5).on_pre_process_update(None, {})
+            assert 4 < time_left() <= 5
+        await run_in_context(check)
+
+
+class TestStorageProxy:
+
+    @pytest.mark.asyncio
+    async def test_delegates(self):
+        storage = StorageProxy(MemoryStorage())
+        await storage.set_state(chat=1, user=1, state='state')
+        await storage.update_data(chat=1, user=1, data={'a': 1})
+        assert await storage.get_state(chat=1, user=1) == 'state'
+        assert await storage.get_data(chat=1, user=1) == {'a': 1}
+        await storage.finish(chat=1, user=1)
+        assert await storage.get_state(chat=1, user=1) is None
+
+    @pytest.mark.asyncio
+    async def test_slow_storage_is_abandoned(self):
+        async def check():
+            async def slow_get_data(**kwargs):
+                await asyncio.sleep(1)
+
+            inner = MemoryStorage()
+            inner.get_data = slow_get_data
+            set_deadline(0.01)
+            with pytest.raises(DeadlineExceeded):
+                await StorageProxy(inner).get_data(chat=1, user=1)
+        await run_in_context(check)
+
+
+class TestRequestTimeouts:
+
+    @pytest.fixture(autouse=True)
+    def clear_breakers(self):
+        breakers.clear()
+        yield
+        breakers.clear()
+
+    def test_endpoint_timeouts(self):
+        assert RequestSingleCard(1).timeouts == get_config().api.TIMEOUTS['cards']
+        assert RequestDecks({}).timeouts == get_config().api.TIMEOUTS['decks']
+
+    @pytest.mark.asyncio
+    async def test_attempt_timeout(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock, return_value={}) as send_mock:
+            await RequestSingleCard(1).fetch()
+            timeout = send_mock.call_args.kwargs['timeout']
+            timeouts = get_config().api.TIMEOUTS['cards']
+            assert timeout.sock_connect == timeouts.CONNECT
+            assert timeout.sock_read == timeouts.READ
+            assert timeout.total <= timeouts.TOTAL
+
+    @pytest.mark.asyncio
+    async def test_update_deadline_limits_attempt(self):
+        async def check():
+            set_deadline(0.5)
+            with patch('app.services.api.Request.send', new_callable=AsyncMock, return_value={}) as send_mock:
+                await RequestSingleCard(1).fetch()
+                assert send_mock.call_args.kwargs['timeout'].total <= 0.5
+        await run_in_context(check)
+
+    @pytest.mark.asyncio
+    async def test_passed_update_deadline(self):
+        async def check():
+            set_deadline(0)
+            with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+                with pytest.raises(DeadlineExceeded):
+                    await RequestSingleCard(1).fetch()
+                send_mock.assert_not_called()
+        await run_in_context(check)
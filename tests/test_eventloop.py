@@ -0,0 +1,39 @@
+import asyncio
+import sys
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.services.eventloop import install_event_loop_policy
+
+
+@pytest.fixture(autouse=True)
+def default_policy():
+    yield
+    asyncio.set_event_loop_policy(None)
+
+
+def test_asyncio():
+    assert install_event_loop_policy('asyncio') == 'asyncio'
+    assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+
+
+@pytest.mark.parametrize('name', ['uvloop', 'auto'])
+def test_uvloop_installed(name):
+    uvloop = MagicMock()
+    uvloop.EventLoopPolicy.return_value = asyncio.DefaultEventLoopPolicy()
+    with patch.dict(sys.modules, {'uvloop': uvloop}), patch('platform.system', return_value='Linux'):
+        assert install_event_loop_policy(name) == 'uvloop'
+    uvloop.EventLoopPolicy.assert_called_once()
+
+
+@pytest.mark.parametrize('name', ['uvloop', 'auto'])
+def test_uvloop_missing(name):
+    with patch.dict(sys.modules, {'uvloop': None}), patch('platform.system', return_value='Linux'):
+        assert install_event_loop_policy(name) == 'asyncio'
+    assert type(asyncio.get_event_loop_policy()) is asyncio.DefaultEventLoopPolicy
+
+
+def test_unknown():
+    with pytest.raises(ValueError):
+        install_event_loop_policy('trio')
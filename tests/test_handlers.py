@@ -8,6 +8,7 @@ from app.handlers.deck_decode import *
 from app.handlers.deck_request import *
 from app.handlers.deck_response import *
 from app.handlers.common import cmd_start, cmd_cancel
+from app.services.models import CardSummary, Card, DeckSummary, Deck
 
 
 class TestCommonHandlers:
@@ -43,7 +44,7 @@ class TestCardHandlers:
     async def test_card_search_start_from_main_menu(self, card_request_full_data, remove_keyboard):
         message_mock = AsyncMock()
         context_mock = AsyncMock()
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.request_info') as builder_mock:
             context_mock.get_data.return_value = card_request_full_data
             await card_search_start_from_main_menu(message=message_mock, state=context_mock)
@@ -52,9 +53,8 @@ class TestCardHandlers:
 
             message_mock.answer.assert_called_with(text=CommonMessage.NEW_CARD_SEARCH, reply_markup=remove_keyboard)
             message_mock.reply.assert_called_with(text=ANY, reply_markup=ANY)
-            state_mock.assert_called()
             context_mock.get_data.assert_called_with()
-            context_mock.update_data.assert_called_with(card_request_msg_id=ANY)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, card_request_msg_id=ANY)
 
     @pytest.mark.asyncio
     async def test_update_card_request(self, card_request_full_data):
@@ -112,14 +112,13 @@ class TestCardHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.wait_name.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.wait_param') as builder_mock:
             await card_search_name_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('name')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.wait_name, card_prompt_msg_id=prompt_mock.message_id)
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -135,7 +134,7 @@ class TestCardHandlers:
         context_mock = AsyncMock()
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.invalid_param') as builder_mock:
@@ -144,8 +143,7 @@ class TestCardHandlers:
             builder_mock.assert_not_called()
             message_mock.delete.assert_called_with()
             clear_prompt_mock.assert_called_with(message_mock, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(name=message_mock.text)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, name=message_mock.text)
             update_mock.assert_called_with(message_mock, context_mock, card_request_full_data)
 
             message_mock.bot.edit_message_text.assert_not_called()
@@ -164,7 +162,7 @@ class TestCardHandlers:
         context_mock = AsyncMock()
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.invalid_param') as builder_mock:
@@ -175,8 +173,7 @@ class TestCardHandlers:
             message_mock.bot.edit_message_text.assert_called_once()
 
             clear_prompt_mock.assert_not_called()
-            state_mock.assert_not_called()
-            context_mock.update_data.assert_not_called()
+            transition_mock.assert_not_called()
             update_mock.assert_not_called()
 
     @pytest.mark.asyncio
@@ -188,14 +185,13 @@ class TestCardHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.wait_type.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.wait_param') as builder_mock:
             await card_search_type_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('ctype')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.wait_type, card_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -209,15 +205,13 @@ class TestCardHandlers:
         callback_data = {'param': type_sign}
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock:
             await card_search_type_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(ctype=type_sign)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, ctype=type_sign)
             update_mock.assert_called_with(ANY, context_mock, card_request_full_data)
 
     @pytest.mark.asyncio
@@ -229,14 +223,13 @@ class TestCardHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.wait_class.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.wait_param') as builder_mock:
             await card_search_class_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('classes')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.wait_class, card_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -250,15 +243,13 @@ class TestCardHandlers:
         callback_data = {'param': cls}
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock:
             await card_search_class_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(classes=ANY)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, classes=ANY)
             update_mock.assert_called_with(ANY, context_mock, card_request_full_data)
 
     @pytest.mark.asyncio
@@ -270,14 +261,13 @@ class TestCardHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.wait_set.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.wait_param') as builder_mock:
             await card_search_set_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('cset')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.wait_set, card_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -295,15 +285,13 @@ class TestCardHandlers:
         callback_data = {'param': cset}
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock:
             await card_search_set_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(cset=cset)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, cset=cset)
             update_mock.assert_called_with(ANY, context_mock, card_request_full_data)
 
     @pytest.mark.asyncio
@@ -315,14 +303,13 @@ class TestCardHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.wait_rarity.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.wait_param') as builder_mock:
             await card_search_rarity_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('rarity')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.wait_rarity, card_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -336,15 +323,13 @@ class TestCardHandlers:
         callback_data = {'param': rarity_sign}
         context_mock.get_data.return_value = card_request_full_data
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock:
             await card_search_rarity_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(rarity=rarity_sign)
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, rarity=rarity_sign)
             update_mock.assert_called_with(ANY, context_mock, card_request_full_data)
 
     @pytest.mark.asyncio
@@ -388,7 +373,7 @@ class TestCardHandlers:
         context_mock.get_data.return_value = card_request_full_data
         context_mock.get_state.return_value = f'insignificant:{param}'
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.invalid_param') as builder_mock:
@@ -396,8 +381,7 @@ class TestCardHandlers:
 
             message_mock.delete.assert_called_with()
             clear_prompt_mock.assert_called_with(message_mock, card_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with({param: message_mock.text})
+            transition_mock.assert_called_with(context_mock, BuildCardRequest.base, {param: message_mock.text})
             update_mock.assert_called_with(message_mock, context_mock, card_request_full_data)
 
             builder_mock.assert_not_called()
@@ -420,15 +404,14 @@ class TestCardHandlers:
         context_mock.get_data.return_value = card_request_full_data
         context_mock.get_state.return_value = f'insignificant:{param}'
 
-        with asynctest.patch('app.states.cards.BuildCardRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.card_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.card_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.card_request.update_card_request') as update_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.invalid_param') as builder_mock:
             await card_search_digit_param_entered(message=message_mock, state=context_mock)
 
             clear_prompt_mock.assert_not_called()
-            state_mock.assert_not_called()
-            context_mock.update_data.assert_not_called()
+            transition_mock.assert_not_called()
             update_mock.assert_not_called()
 
             message_mock.delete.assert_called_with()
@@ -470,8 +453,10 @@ class TestCardHandlers:
 
         with asynctest.patch('app.handlers.card_request.RequestCards.get') as api_mock, \
                 patch('app.states.cards.CardResponse.list.set') as state_mock, \
-                patch('app.services.answer_builders.CardAnswerBuilder.result_list') as builder_mock:
-            api_mock.return_value = card_list_full_data['cardlist']['cards']
+                patch('app.services.answer_builders.CardAnswerBuilder.result_list') as builder_mock, \
+                patch('app.handlers.card_request.prefetch_card_details') as prefetch_mock:
+            api_mock.return_value = [CardSummary.from_api(card)
+                                     for page in card_list_full_data['cardlist']['cards'] for card in page]
             await card_search(call=call_mock, state=context_mock)
 
             api_mock.assert_called_with()
@@ -481,6 +466,7 @@ class TestCardHandlers:
             context_mock.update_data.assert_any_call(card_response_msg_id=ANY)
             state_mock.assert_called_with()
             call_mock.answer.assert_called_once()
+            prefetch_mock.assert_called_once()
 
     # -----------------------------------------------------------------------------------------
 
@@ -495,12 +481,14 @@ class TestCardHandlers:
         context_mock.get_data.return_value = card_list_full_data
         callback_data = {'action': direction}
 
-        with patch('app.services.answer_builders.CardAnswerBuilder.result_list') as builder_mock:
+        with patch('app.services.answer_builders.CardAnswerBuilder.result_list') as builder_mock, \
+                patch('app.handlers.card_response.prefetch_card_details') as prefetch_mock:
             await card_list_pages(call=call_mock, callback_data=callback_data, state=context_mock)
 
             context_mock.update_data.assert_called_with(cardlist=ANY)
             builder_mock.assert_called_with()
             call_mock.bot.edit_message_text.assert_called_once()
+            prefetch_mock.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_card_list_pages_pages_btn(self):
@@ -546,11 +534,14 @@ class TestCardHandlers:
 
         with asynctest.patch('app.handlers.card_response.RequestSingleCard.get') as api_mock, \
                 patch('app.services.answer_builders.CardAnswerBuilder.result_detail') as builder_mock:
-            api_mock.return_value = card_detail_full_data['card_detail']
+            api_mock.return_value = Card.from_api(card_detail_full_data['card_detail'])
             await card_list_get_card(call=call_mock, callback_data=callback_data, state=context_mock)
 
             api_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(card_detail=card_detail_full_data['card_detail'])
+            context_mock.update_data.assert_called_with(
+                card_detail=Card.from_api(card_detail_full_data['card_detail']).as_dict(),
+                card_detail_outdated=None,
+            )
             builder_mock.assert_called_with()
             call_mock.bot.edit_message_text.assert_called_once()
 
@@ -628,7 +619,7 @@ class TestDeckHandlers:
     async def test_deck_search_start(self, deck_request_full_data, remove_keyboard):
         message_mock = AsyncMock()
         context_mock = AsyncMock()
-        with asynctest.patch('app.states.decks.BuildDeckRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.request_info') as builder_mock:
             context_mock.get_data.return_value = deck_request_full_data
             await deck_search_start(message=message_mock, state=context_mock)
@@ -640,9 +631,8 @@ class TestDeckHandlers:
                 call(text=ANY, reply_markup=ANY),
             ]
             message_mock.answer.assert_has_calls(answer_calls)
-            state_mock.assert_called()
             context_mock.get_data.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_request_msg_id=ANY, on_close='')
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.base, deck_request_msg_id=ANY, on_close='')
 
     @pytest.mark.asyncio
     async def test_deck_search_param_cancel(self):
@@ -680,14 +670,13 @@ class TestDeckHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.wait_format.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.wait_param') as builder_mock:
             await deck_search_format_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('dformat')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.wait_format, deck_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -701,15 +690,13 @@ class TestDeckHandlers:
         callback_data = {'param': format_}
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.deck_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.deck_request.update_deck_request') as update_mock:
             await deck_search_format_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, deck_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(dformat=format_)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.base, dformat=format_)
             update_mock.assert_called_with(ANY, context_mock, deck_request_full_data)
 
     @pytest.mark.asyncio
@@ -721,14 +708,13 @@ class TestDeckHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.wait_class.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.wait_param') as builder_mock:
             await deck_search_class_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('dclass')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.wait_class, deck_prompt_msg_id=prompt_mock.message_id)
             call_mock.answer.assert_called_once()
 
     @pytest.mark.asyncio
@@ -742,15 +728,13 @@ class TestDeckHandlers:
         callback_data = {'param': class_}
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.deck_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.deck_request.update_deck_request') as update_mock:
             await deck_search_class_chosen(call=call_mock, callback_data=callback_data, state=context_mock)
 
-            context_mock.update_data.assert_called()
             clear_prompt_mock.assert_called_with(ANY, deck_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_any_call(dclass=class_)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.base, dclass=class_)
             update_mock.assert_called_with(ANY, context_mock, deck_request_full_data)
 
     @pytest.mark.asyncio
@@ -762,14 +746,13 @@ class TestDeckHandlers:
         call_mock.message.reply.return_value = prompt_mock
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.wait_date.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.wait_param') as builder_mock:
             await deck_search_date_input(call=call_mock, state=context_mock)
 
             builder_mock.assert_called_with('deck_created_after')
             call_mock.message.reply.assert_called_once()
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_prompt_msg_id=prompt_mock.message_id)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.wait_date, deck_prompt_msg_id=prompt_mock.message_id)
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -785,7 +768,7 @@ class TestDeckHandlers:
         context_mock = AsyncMock()
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.deck_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.deck_request.update_deck_request') as update_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.invalid_param') as builder_mock:
@@ -794,8 +777,7 @@ class TestDeckHandlers:
             builder_mock.assert_not_called()
             message_mock.delete.assert_called_with()
             clear_prompt_mock.assert_called_with(message_mock, deck_request_full_data, context_mock)
-            state_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_created_after=message_mock.text)
+            transition_mock.assert_called_with(context_mock, BuildDeckRequest.base, deck_created_after=message_mock.text)
             update_mock.assert_called_with(message_mock, context_mock, deck_request_full_data)
 
             message_mock.bot.edit_message_text.assert_not_called()
@@ -814,7 +796,7 @@ class TestDeckHandlers:
         context_mock = AsyncMock()
         context_mock.get_data.return_value = deck_request_full_data
 
-        with asynctest.patch('app.states.decks.BuildDeckRequest.base.set') as state_mock, \
+        with asynctest.patch('app.handlers.deck_request.transition') as transition_mock, \
                 asynctest.patch('app.handlers.deck_request.clear_prompt') as clear_prompt_mock, \
                 asynctest.patch('app.handlers.deck_request.update_deck_request') as update_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.invalid_param') as builder_mock:
@@ -825,8 +807,7 @@ class TestDeckHandlers:
             message_mock.bot.edit_message_text.assert_called_once()
 
             clear_prompt_mock.assert_not_called()
-            state_mock.assert_not_called()
-            context_mock.update_data.assert_not_called()
+            transition_mock.assert_not_called()
             update_mock.assert_not_called()
 
     @pytest.mark.asyncio
@@ -864,8 +845,10 @@ class TestDeckHandlers:
 
         with asynctest.patch('app.handlers.deck_request.RequestDecks.get') as api_mock, \
                 patch('app.states.decks.DeckResponse.list.set') as state_mock, \
-                patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock:
-            api_mock.return_value = deck_list_full_data['deck_list']['decks']
+                patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock, \
+                patch('app.handlers.deck_request.prefetch_deck_details') as prefetch_mock:
+            api_mock.return_value = [DeckSummary.from_api(deck)
+                                     for page in deck_list_full_data['deck_list']['decks'] for deck in page]
             await deck_search(call=call_mock, state=context_mock)
 
             api_mock.assert_called_with()
@@ -875,6 +858,7 @@ class TestDeckHandlers:
             context_mock.update_data.assert_any_call(deck_response_msg_id=ANY)
             state_mock.assert_called_with()
             call_mock.answer.assert_called_once()
+            prefetch_mock.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_deck_search_from_card_detail(self, deck_request_full_data, deck_list_full_data, card_detail_data):
@@ -885,8 +869,10 @@ class TestDeckHandlers:
 
         with asynctest.patch('app.handlers.deck_request.RequestDecks.get') as api_mock, \
                 patch('app.states.decks.DeckResponse.list.set') as state_mock, \
-                patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock:
-            api_mock.return_value = deck_list_full_data['deck_list']['decks']
+                patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock, \
+                patch('app.handlers.deck_request.prefetch_deck_details') as prefetch_mock:
+            api_mock.return_value = [DeckSummary.from_api(deck)
+                                     for page in deck_list_full_data['deck_list']['decks'] for deck in page]
             await deck_search_from_card_detail(call=call_mock, callback_data=callback_data, state=context_mock)
 
             api_mock.assert_called_with()
@@ -896,6 +882,7 @@ class TestDeckHandlers:
             context_mock.update_data.assert_any_call(deck_response_msg_id=ANY)
             state_mock.assert_called_with()
             call_mock.answer.assert_called_once()
+            prefetch_mock.assert_called_once()
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -908,12 +895,14 @@ class TestDeckHandlers:
         context_mock.get_data.return_value = deck_list_full_data
         callback_data = {'action': direction}
 
-        with patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock:
+        with patch('app.services.answer_builders.DeckAnswerBuilder.result_list') as builder_mock, \
+                patch('app.handlers.deck_response.prefetch_deck_details') as prefetch_mock:
             await deck_list_pages(call=call_mock, callback_data=callback_data, state=context_mock)
 
             context_mock.update_data.assert_called_with(deck_list=ANY)
             builder_mock.assert_called_with()
             call_mock.bot.edit_message_text.assert_called_once()
+            prefetch_mock.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_deck_list_pages_pages_btn(self):
@@ -964,11 +953,14 @@ class TestDeckHandlers:
 
         with asynctest.patch('app.handlers.deck_response.RequestSingleDeck.get') as api_mock, \
                 patch('app.services.answer_builders.DeckAnswerBuilder.result_detail') as builder_mock:
-            api_mock.return_value = deck_detail_full_data['deck_detail']
+            api_mock.return_value = Deck.from_api(deck_detail_full_data['deck_detail'])
             await deck_list_get_deck(call=call_mock, callback_data=callback_data, state=context_mock)
 
             api_mock.assert_called_with()
-            context_mock.update_data.assert_called_with(deck_detail=deck_detail_full_data['deck_detail'])
+            context_mock.update_data.assert_called_with(
+                deck_detail=Deck.from_api(deck_detail_full_data['deck_detail']).as_dict(),
+                deck_detail_outdated=None,
+            )
             builder_mock.assert_called_with()
             call_mock.bot.edit_message_text.assert_called_once()
 
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.services.health import ReadinessProbe, run_check, wait_available
+from app.services.server import make_app
+
+
+@pytest.mark.asyncio
+async def test_run_check():
+    assert await run_check(AsyncMock(return_value=True), timeout=1)
+    assert await run_check(AsyncMock(return_value=None), timeout=1)
+    assert not await run_check(AsyncMock(return_value=False), timeout=1)
+    assert not await run_check(AsyncMock(side_effect=ConnectionError), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_run_check_timeout():
+    async def hanging():
+        await asyncio.sleep(10)
+    assert not await run_check(hanging, timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_wait_available_retries():
+    check = AsyncMock(side_effect=[ConnectionError, ConnectionError, True])
+    with patch('app.services.health.asyncio.sleep') as sleep_mock:
+        assert await wait_available(check, attempts=5, timeout=1, backoff_base=0.5, backoff_max=5)
+    assert check.call_count == 3
+    assert sleep_mock.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_wait_available_gives_up():
+    check = AsyncMock(side_effect=ConnectionError)
+    with patch('app.services.health.asyncio.sleep') as sleep_mock:
+        assert not await wait_available(check, attempts=3, timeout=1, backoff_base=0.5, backoff_max=5)
+    assert check.call_count == 3
+    assert sleep_mock.call_count == 2
+
+
+class TestReadinessProbe:
+
+    @pytest.mark.asyncio
+    async def test_checks(self):
+        probe = ReadinessProbe()
+        assert probe.ready
+        check = AsyncMock(return_value=True)
+        probe.add('redis', check)
+        await probe.run_checks()
+        assert probe.ready
+
+        check.side_effect = ConnectionError
+        await probe.run_checks()
+        assert not probe.ready
+        assert probe.results == {'redis': False}
+
+    @pytest.mark.asyncio
+    async def test_background(self):
+        probe = ReadinessProbe(interval=0.01, timeout=1)
+        check = AsyncMock(return_value=True)
+        probe.add('redis', check)
+        probe.start()
+        await asyncio.sleep(0.05)
+        await probe.stop()
+        assert check.call_count >= 2
+        assert probe.checked_at is not None
+
+    @pytest.mark.asyncio
+    async def test_ready_endpoint(self):
+        probe = ReadinessProbe()
+        probe.add('redis', AsyncMock(side_effect=ConnectionError))
+        with patch('app.services.server.probe', probe):
+            async with TestClient(TestServer(make_app())) as client:
+                resp = await client.get('/ready')
+                assert resp.status == 200
+                assert await resp.text() == 'redis ok\n'
+
+                await probe.run_checks()
+                resp = await client.get('/ready')
+                assert resp.status == 503
+                assert await resp.text() == 'redis fail\n'
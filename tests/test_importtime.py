@@ -0,0 +1,43 @@
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.config import BASE_DIR, get_config, load_config
+from app.exceptions import ConfigurationError
+from app.importtime import ImportTimer
+
+
+def test_import_timer(caplog):
+    sys.modules.pop('colorsys', None)
+    timer = ImportTimer.install()
+    try:
+        import colorsys     # noqa: F401
+    finally:
+        timer.uninstall()
+
+    assert [record.name for record in timer.records] == ['colorsys']
+    assert timer.records[0].cumulative >= timer.records[0].self_time >= 0
+    assert timer.total >= timer.records[0].cumulative
+    assert timer.by_package()[0][0] == 'colorsys'
+
+    with caplog.at_level(logging.INFO, logger='app'):
+        timer.report(logging.getLogger('app'))
+    assert 'colorsys' in caplog.text
+
+
+def test_import_has_no_side_effects():
+    """ Modules can be imported without configuration """
+    env = {key: value for key, value in os.environ.items() if key not in ('TOKEN', 'ADMIN_ID', 'HDH_API_DOMAIN')}
+    code = 'import app.services.messages, app.services.keyboards, app.handlers; import logging; ' \
+           'assert not logging.getLogger().handlers'
+    subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, env=env, check=True)
+
+
+def test_missing_configuration(monkeypatch):
+    monkeypatch.delenv('TOKEN', raising=False)
+    with pytest.raises(ConfigurationError):
+        load_config()
+    assert get_config() is get_config()     # the cached one is still available
@@ -1,3 +1,7 @@
+from app.services.messages import TextInfo, CommonMessage
+from app.services.models import Card
+
+
 class TestCardRequestInfo:
 
     def test_card_request_info_init(self, card_request_info_obj):
@@ -26,6 +30,11 @@ class TestCardListInfo:
         card_list_info_obj.format()
         assert len(card_list_info_obj.rows) == 1 + 6 + 1    # header row + card rows + footer row
 
+    def test_card_list_info_outdated(self, card_list_data):
+        card_list_data['cardlist']['outdated'] = 600
+        text = TextInfo(card_list_data).card_list.as_text()
+        assert text.endswith(CommonMessage.OUTDATED_.format('10 min'))
+
 
 class TestCardDetailInfo:
 
@@ -45,6 +54,14 @@ class TestCardDetailInfo:
         card_detail_info_obj.format()
         assert card_detail_info_obj.rows
 
+    def test_null_optional_fields(self, card_detail_full_data):
+        data = dict(card_detail_full_data['card_detail'], text=None, flavor=None, tribe=None, artist=None,
+                    mechanic=None)
+        info = TextInfo(data={'card_detail': Card.from_api(data).as_dict()}).card_detail
+        assert not (info.text or info.flavor or info.tribe or info.artist or info.mechanics)
+        info.format()
+        assert info.header in info.rows[0]
+
 
 class TestDeckDetailInfo:
 
@@ -61,6 +78,10 @@ class TestDeckDetailInfo:
         deck_detail_info_obj.format()
         assert deck_detail_info_obj.rows
 
+    def test_deck_detail_info_outdated(self, deck_detail_data):
+        text = TextInfo(deck_detail_data | {'deck_detail_outdated': 7300}).deck_detail.as_text()
+        assert text.endswith(CommonMessage.OUTDATED_.format('2 h'))
+
 
 class TestDeckListInfo:
 
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from aiogram import Bot
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.handler import current_handler
+from aiogram.utils.exceptions import RetryAfter
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.middlewares.metrics import MetricsMiddleware
+from app.services.metrics import (
+    Counter, Gauge, Histogram, Registry,
+    handler_duration, storage_duration, telegram_request_duration, telegram_retry_after,
+)
+from app.services.server import make_app
+from app.services.storage import StorageProxy
+from app.services.telegram import MeteredBot
+
+
+class TestMetrics:
+
+    def test_counter(self):
+        counter = Counter('test_total', 'Test counter', ['kind'])
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        counter.inc(kind='b')
+        assert counter.render() == (
+            '# HELP test_total Test counter\n'
+            '# TYPE test_total counter\n'
+            'test_total{kind="a"} 3\n'
+            'test_total{kind="b"} 1'
+        )
+
+    def test_wrong_labels(self):
+        counter = Counter('test_total', 'Test counter', ['kind'])
+        with pytest.raises(ValueError):
+            counter.inc(other='a')
+
+    def test_gauge_function(self):
+        gauge = Gauge('test_ratio', 'Test gauge', function=lambda: {(): 0.25})
+        assert gauge.render().endswith('test_ratio 0.25')
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test histogram', ['op'], buckets=(0.1, 1))
+        histogram.observe(0.05, op='get')
+        histogram.observe(0.5, op='get')
+        histogram.observe(5, op='get')
+        lines = histogram.render().splitlines()
+        assert lines[2:] == [
+            'test_seconds_bucket{op="get",le="0.1"} 1',
+            'test_seconds_bucket{op="get",le="1"} 2',
+            'test_seconds_bucket{op="get",le="+Inf"} 3',
+            'test_seconds_sum{op="get"} 5.55',
+            'test_seconds_count{op="get"} 3',
+        ]
+        assert histogram.count(op='get') == 3
+        assert histogram.count(op='set') == 0
+
+    def test_histogram_quantile(self):
+        histogram = Histogram('test_seconds', 'Test histogram', ['op'], buckets=(0.1, 1))
+        assert histogram.quantile(0.5, op='get') is None
+        for value in (0.05, 0.05, 0.5, 0.5, 5):
+            histogram.observe(value, op='get')
+        assert histogram.quantile(0.2, op='get') == pytest.approx(0.05)
+        assert histogram.quantile(0.6, op='get') == pytest.approx(0.55)
+        assert histogram.quantile(0.99, op='get') == 1     # in +Inf, the highest finite bound
+        assert histogram.label_sets() == [{'op': 'get'}]
+
+    def test_escape(self):
+        counter = Counter('test_total', 'Quotes "and"\nnewlines', ['kind'])
+        counter.inc(kind='a"b')
+        assert '# HELP test_total Quotes "and"\\nnewlines' in counter.render()
+        assert 'test_total{kind="a\\"b"} 1' in counter.render()
+
+    def test_registry(self):
+        registry = Registry()
+        registry.register(Counter('test_total', 'Test counter'))
+        with pytest.raises(ValueError):
+            registry.register(Counter('test_total', 'Test counter'))
+        assert registry.render().endswith('\n')
+
+
+class TestInstrumentation:
+
+    @pytest.mark.asyncio
+    async def test_handler_duration(self):
+        async def cards_handler():
+            pass
+
+        async def process():
+            middleware = MetricsMiddleware()
+            data = {}
+            current_handler.set(cards_handler)
+            await middleware.on_process_message(None, data)
+            await middleware.on_post_process_message(None, [], data)
+
+        before = handler_duration.count(handler='cards_handler')
+        await asyncio.create_task(process())
+        assert handler_duration.count(handler='cards_handler') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_unhandled_update_is_not_observed(self):
+        middleware = MetricsMiddleware()
+        await middleware.on_post_process_message(None, [], {})
+
+    @pytest.mark.asyncio
+    async def test_storage_duration(self):
+        storage = StorageProxy(MemoryStorage())
+        before = storage_duration.count(operation='set_data')
+        await storage.set_data(chat=1, user=1, data={'a': 1})
+        assert storage_duration.count(operation='set_data') == before + 1
+        assert await storage.get_data(chat=1, user=1) == {'a': 1}
+
+    @pytest.mark.asyncio
+    async def test_update_state_data_fallback(self):
+        storage = StorageProxy(MemoryStorage())
+        await storage.set_data(chat=1, user=1, data={'a': 1})
+        await storage.update_state_data(chat=1, user=1, state='Form:base', data={'b': 2}, c=3)
+        assert await storage.get_state(chat=1, user=1) == 'Form:base'
+        assert await storage.get_data(chat=1, user=1) == {'a': 1, 'b': 2, 'c': 3}
+
+    @pytest.mark.asyncio
+    async def test_update_state_data_delegated(self):
+        wrapped = MemoryStorage()
+        wrapped.update_state_data = AsyncMock()
+        storage = StorageProxy(wrapped)
+        before = storage_duration.count(operation='update_state_data')
+        await storage.update_state_data(chat=1, user=1, state='Form:base', data={'b': 2})
+        wrapped.update_state_data.assert_called_with(chat=1, user=1, state='Form:base', data={'b': 2})
+        assert await wrapped.get_state(chat=1, user=1) is None
+        assert storage_duration.count(operation='update_state_data') == before + 1
+
+    @pytest.mark.asyncio
+    async def test_telegram_retry_after(self):
+        bot = MeteredBot(token='123456:test-token')
+        with patch.object(Bot, 'request', AsyncMock(side_effect=RetryAfter(5))):
+            with pytest.raises(RetryAfter):
+                await bot.request('sendMessage', {'chat_id': 1})
+        assert telegram_request_duration.count(method='sendMessage') >= 1
+        assert any(labels == {'method': 'sendMessage'} and value >= 1
+                   for _, labels, value in telegram_retry_after.samples())
+
+
+class TestMonitoringServer:
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self):
+        async with TestClient(TestServer(make_app())) as client:
+            resp = await client.get('/metrics')
+            assert resp.status == 200
+            assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            body = await resp.text()
+        assert '# TYPE hdh_handler_duration_seconds histogram' in body
+        assert 'hdh_response_cache_lookups_total{result="hit"}' in body
+        assert 'hdh_response_cache_oldest_entry_seconds ' in body
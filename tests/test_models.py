@@ -0,0 +1,77 @@
+import pytest
+
+from app.config import get_hs_data
+from app.exceptions import DeckstringError
+from app.services.api import RequestDecks
+from app.services.messages import TextInfo
+from app.services.models import CardSummary, Card, DeckSummary, Deck
+
+
+def test_card_keeps_rendered_fields(card_detail_full_data):
+    data = card_detail_full_data['card_detail']
+    card = Card.from_api(data)
+    assert card.name == data['name']
+    assert not hasattr(card, '__dict__')
+
+    plain = card.as_dict()
+    assert 'collectible' not in plain
+    assert set(plain) == set(Card.FIELDS)
+    assert Card.from_api(plain) == card
+
+
+def test_categorical_fields_are_coded(card_detail_full_data):
+    data = card_detail_full_data['card_detail']
+    card = Card.from_api(data)
+    hs_data = get_hs_data()
+    assert isinstance(card.rarity, int)
+    assert hs_data.label('rarities', card.rarity) == data['rarity']
+    assert hs_data.label('types', card.card_type) == data['card_type']
+    assert hs_data.label('sets', card.card_set) == data['card_set']
+    assert [hs_data.label('classes', c) for c in card.card_class] == data['card_class']
+
+
+def test_unknown_categories_are_interned():
+    cards = [CardSummary.from_api({'rarity': ''.join(['My', 'thic']), 'card_type': 'Minion'}) for _ in range(2)]
+    assert cards[0].rarity == 'Mythic'
+    assert cards[0].rarity is cards[1].rarity
+    assert isinstance(cards[0].card_type, int)
+
+
+def test_deck(deck_detail_full_data):
+    data = deck_detail_full_data['deck_detail']
+    deck = Deck.from_api(data)
+    assert len(deck.cards) == len(data['cards'])
+    assert deck.cards[0].card.name == data['cards'][0]['card']['name']
+    assert deck.cards[0].number == data['cards'][0]['number']
+    assert Deck.from_api(deck.as_dict()) == deck
+
+
+def test_decode_error():
+    with pytest.raises(DeckstringError):
+        RequestDecks({}).parse_submitted({'error': 'Invalid deckstring'})
+
+
+class TestRenderCoded:
+    """ Texts rendered from coded state are the same as from API responses """
+
+    def test_card_list(self, card_list_full_data):
+        cardlist = card_list_full_data['cardlist']
+        coded = {'cardlist': cardlist | {
+            'cards': [[CardSummary.from_api(card).as_dict() for card in page] for page in cardlist['cards']],
+        }}
+        assert TextInfo(coded).card_list.as_text() == TextInfo(card_list_full_data).card_list.as_text()
+
+    def test_card_detail(self, card_detail_full_data):
+        coded = {'card_detail': Card.from_api(card_detail_full_data['card_detail']).as_dict()}
+        assert TextInfo(coded).card_detail.as_text() == TextInfo(card_detail_full_data).card_detail.as_text()
+
+    def test_deck_list(self, deck_list_full_data):
+        deck_list = deck_list_full_data['deck_list']
+        coded = {'deck_list': deck_list | {
+            'decks': [[DeckSummary.from_api(deck).as_dict() for deck in page] for page in deck_list['decks']],
+        }}
+        assert TextInfo(coded).deck_list.as_text() == TextInfo(deck_list_full_data).deck_list.as_text()
+
+    def test_deck_detail(self, deck_detail_full_data):
+        coded = {'deck_detail': Deck.from_api(deck_detail_full_data['deck_detail']).as_dict()}
+        assert TextInfo(coded).deck_detail.as_text() == TextInfo(deck_detail_full_data).deck_detail.as_text()
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from app.services.pagination import PageFlipDebouncer
+
+
+class TestPageFlipDebouncer:
+
+    @pytest.mark.asyncio
+    async def test_single_flip(self):
+        debouncer = PageFlipDebouncer(window=0.01)
+        assert await debouncer.push('msg', 1) == 1
+
+    @pytest.mark.asyncio
+    async def test_burst_is_coalesced(self):
+        debouncer = PageFlipDebouncer(window=0.05)
+        results = await asyncio.gather(
+            debouncer.push('msg', 1),
+            debouncer.push('msg', 1),
+            debouncer.push('msg', -1),
+            debouncer.push('msg', 1),
+        )
+        assert results == [2, None, None, None]
+
+    @pytest.mark.asyncio
+    async def test_messages_are_independent(self):
+        debouncer = PageFlipDebouncer(window=0.01)
+        results = await asyncio.gather(debouncer.push('msg1', 1), debouncer.push('msg2', -1))
+        assert results == [1, -1]
+
+    @pytest.mark.asyncio
+    async def test_window_is_reopened(self):
+        debouncer = PageFlipDebouncer(window=0.01)
+        assert await debouncer.push('msg', 1) == 1
+        assert await debouncer.push('msg', 1) == 1
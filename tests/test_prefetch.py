@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from unittest.mock import patch
+
+from app.services.prefetch import Prefetcher, neighbour_pages, prefetch_card_details, prefetch_deck_details
+
+
+class FakeRequest:
+
+    def __init__(self, endpoint: str, log: list, delay: float = 0.01):
+        self.endpoint = endpoint
+        self.log = log
+        self.delay = delay
+
+    async def get(self):
+        self.log.append(self.endpoint)
+        await asyncio.sleep(self.delay)
+
+
+class TestPrefetcher:
+
+    @pytest.mark.asyncio
+    async def test_schedule(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=2)
+        prefetcher.schedule(1, [FakeRequest(str(i), log) for i in range(5)])
+        assert prefetcher.pending(1) == 5
+
+        await asyncio.sleep(0.1)
+        assert log == [str(i) for i in range(5)]
+        assert prefetcher.pending(1) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=2)
+        prefetcher.schedule(1, [FakeRequest(str(i), log, delay=1) for i in range(5)])
+
+        await asyncio.sleep(0.05)
+        assert len(log) == 2
+        assert prefetcher.pending(1) == 5
+        prefetcher.cancel(1)
+
+    @pytest.mark.asyncio
+    async def test_priority_by_position(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=1)
+        prefetcher.schedule('a', [FakeRequest(f'a{i}', log) for i in range(3)])
+        prefetcher.schedule('b', [FakeRequest(f'b{i}', log) for i in range(3)])
+
+        await asyncio.sleep(0.2)
+        assert log == ['a0', 'b0', 'a1', 'b1', 'a2', 'b2']
+
+    @pytest.mark.asyncio
+    async def test_cancel(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=1)
+        prefetcher.schedule(1, [FakeRequest(str(i), log, delay=1) for i in range(3)])
+        await asyncio.sleep(0.01)
+
+        prefetcher.cancel(1)
+        await asyncio.sleep(0.01)
+        assert log == ['0']
+        assert prefetcher.pending(1) == 0
+
+    @pytest.mark.asyncio
+    async def test_clear(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=1)
+        prefetcher.schedule(1, [FakeRequest('1', log, delay=1)])
+        prefetcher.schedule(2, [FakeRequest('2', log, delay=1)])
+        await asyncio.sleep(0.01)
+
+        prefetcher.clear()
+        await asyncio.sleep(0.01)
+        assert log == ['1']
+        assert prefetcher.pending(1) == prefetcher.pending(2) == 0
+
+    @pytest.mark.asyncio
+    async def test_reschedule_replaces_group(self):
+        log = []
+        prefetcher = Prefetcher(concurrency=1)
+        prefetcher.schedule(1, [FakeRequest('old', log, delay=1), FakeRequest('old', log)])
+        await asyncio.sleep(0.01)
+        prefetcher.schedule(1, [FakeRequest('new', log)])
+
+        await asyncio.sleep(0.05)
+        assert log == ['old', 'new']
+
+
+@pytest.mark.parametrize(
+    'page,npages,expected',
+    [
+        (1, 1, [1]),
+        (1, 3, [1, 2]),
+        (3, 3, [3, 1]),
+    ]
+)
+def test_neighbour_pages(page, npages, expected):
+    assert neighbour_pages(page, npages) == expected
+
+
+def test_prefetch_card_details(card_list_data):
+    cardlist = card_list_data['cardlist']
+    with patch('app.services.prefetch.prefetcher.schedule') as schedule_mock:
+        prefetch_card_details(1, cardlist)
+
+        key, requests = schedule_mock.call_args.args
+        page = cardlist['page']
+        expected = cardlist['cards'][page - 1] + cardlist['cards'][page % len(cardlist['cards'])]
+        assert key == ('cards', 1)
+        assert [r.endpoint for r in requests] == [f'cards/{card["dbf_id"]}/' for card in expected]
+
+
+def test_prefetch_deck_details(deck_list_data):
+    deck_list = deck_list_data['deck_list']
+    with patch('app.services.prefetch.prefetcher.schedule') as schedule_mock:
+        prefetch_deck_details(1, deck_list)
+
+        key, requests = schedule_mock.call_args.args
+        assert key == ('decks', 1)
+        assert requests[0].endpoint == f'decks/{deck_list["decks"][deck_list["page"] - 1][0]["id"]}/'
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.filters import IDFilter
+
+from app.config import get_config
+from app.handlers.admin import cmd_profile_start, cmd_profile_stop, cmd_storage_latency, register_admin_handlers
+from app.services.messages import AdminMessage
+from app.services.metrics import storage_duration
+from app.services.profiler import SamplingProfiler, Profile, profiler
+
+
+def busy_function(seconds: float):
+    finish = time.perf_counter() + seconds
+    while time.perf_counter() < finish:
+        pass
+
+
+class TestSamplingProfiler:
+
+    def test_samples_running_code(self):
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.start()
+        busy_function(0.2)
+        profile = sampler.stop()
+        assert not sampler.running
+        assert profile.samples > 10
+        assert 0.2 <= profile.duration < 1
+        label, _ = profile.hot_functions(top=1)[0]
+        assert label.startswith('busy_function (tests/test_profiler.py:')
+
+    def test_collapsed_format(self):
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.start()
+        busy_function(0.05)
+        profile = sampler.stop()
+        for line in profile.collapsed().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            assert int(count) > 0
+            assert 'test_collapsed_format' in stack
+        assert sum(int(line.rsplit(' ', 1)[1]) for line in profile.collapsed().splitlines()) == profile.samples
+
+    def test_max_duration(self):
+        sampler = SamplingProfiler(interval=0.001, max_duration=0.05)
+        sampler.start()
+        busy_function(0.2)
+        profile = sampler.stop()
+        assert profile.duration < 0.15
+
+    def test_start_twice(self):
+        sampler = SamplingProfiler()
+        sampler.start()
+        with pytest.raises(RuntimeError):
+            sampler.start()
+        sampler.stop()
+        with pytest.raises(RuntimeError):
+            sampler.stop()
+
+    def test_hot_functions(self):
+        profile = Profile(stacks={'main;a': 3, 'main;b;a': 2, 'main;b': 4}, duration=1, interval=0.01)
+        assert profile.hot_functions() == [('a', 5), ('b', 4)]
+
+
+class TestAdminHandlers:
+
+    @pytest.fixture(autouse=True)
+    def stop_profiler(self):
+        yield
+        if profiler.running:
+            profiler.stop()
+
+    @pytest.mark.asyncio
+    async def test_profile_window(self):
+        message_mock = AsyncMock()
+        await cmd_profile_start(message=message_mock)
+        message_mock.answer.assert_called_with(text=AdminMessage.PROFILER_STARTED)
+        assert profiler.running
+
+        await cmd_profile_stop(message=message_mock)
+        assert not profiler.running
+        document = message_mock.answer_document.call_args.kwargs['document']
+        assert document.filename.endswith('.collapsed.txt')
+        assert 'samples' in message_mock.answer_document.call_args.kwargs['caption']
+
+    @pytest.mark.asyncio
+    async def test_start_twice(self):
+        message_mock = AsyncMock()
+        await cmd_profile_start(message=message_mock)
+        await cmd_profile_start(message=message_mock)
+        message_mock.answer.assert_called_with(text=AdminMessage.PROFILER_RUNNING)
+
+    @pytest.mark.asyncio
+    async def test_stop_without_start(self):
+        message_mock = AsyncMock()
+        await cmd_profile_stop(message=message_mock)
+        message_mock.answer.assert_called_with(text=AdminMessage.PROFILER_NOT_RUNNING)
+        message_mock.answer_document.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_storage_latency(self):
+        message_mock = AsyncMock()
+        storage_duration.observe(0.002, operation='get_data')
+        await cmd_storage_latency(message=message_mock)
+        text = message_mock.answer.call_args.kwargs['text']
+        assert '<code>get_data</code>' in text
+        assert 'p99' in text
+
+    def test_admin_only(self):
+        dp = Dispatcher(Bot(token='123456:test-token'))
+        register_admin_handlers(dp)
+        for handler in dp.message_handlers.handlers:
+            id_filters = [f.filter for f in handler.filters if isinstance(f.filter, IDFilter)]
+            assert id_filters and id_filters[0].user_id == {get_config().bot.ADMIN_ID}
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch, MagicMock
+from aiohttp import ClientConnectionError, ClientResponseError
+
+from app.services.resilience import CircuitBreaker, backoff_delay
+from app.services.api import RequestSingleCard, RequestDecks, breakers
+from app.exceptions import ApiUnavailableError, DeadlineExceeded
+from app.services.deadline import set_deadline
+
+
+def response_error(status: int) -> ClientResponseError:
+    return ClientResponseError(request_info=MagicMock(), history=(), status=status)
+
+
+async def hang(*args, **kwargs):
+    await asyncio.sleep(10)
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker('cards', threshold=3, cooldown=60)
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker('cards', threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker('cards', threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()     # only one trial at a time
+
+        breaker.record_failure()
+        assert breaker.allow()         # the next trial after cooldown
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_released_trial(self):
+        breaker = CircuitBreaker('cards', threshold=1, cooldown=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.release_trial()
+        assert breaker.allow()
+
+
+@pytest.mark.parametrize('attempt', range(6))
+def test_backoff_delay(attempt):
+    for _ in range(20):
+        assert 0 <= backoff_delay(attempt, base=0.2, cap=1) <= min(1, 0.2 * 2 ** attempt)
+
+
+class TestRequestCall:
+
+    @pytest.fixture(autouse=True)
+    def clear_breakers(self):
+        breakers.clear()
+        with patch('app.services.api.backoff_delay', return_value=0):
+            yield
+        breakers.clear()
+
+    @pytest.mark.asyncio
+    async def test_transient_error_is_retried(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = [ClientConnectionError(), response_error(502), {'dbf_id': 1}]
+            assert (await RequestSingleCard(1).fetch()).dbf_id == 1
+            assert send_mock.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_retries_are_limited(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = asyncio.TimeoutError()
+            with pytest.raises(asyncio.TimeoutError):
+                await RequestSingleCard(1).fetch()
+            assert send_mock.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_client_error_is_not_retried(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = response_error(404)
+            with pytest.raises(ClientResponseError):
+                await RequestSingleCard(1).fetch()
+            assert send_mock.call_count == 1
+            assert breakers['cards'].failures == 0
+
+    @pytest.mark.asyncio
+    async def test_post_is_not_retried(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = ClientConnectionError()
+            with pytest.raises(ClientConnectionError):
+                await RequestDecks({}).post({'string': 'AAE'})
+            assert send_mock.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = ClientConnectionError()
+            with pytest.raises(ClientConnectionError):
+                await RequestSingleCard(1).fetch()
+            with pytest.raises(ApiUnavailableError):     # the circuit opens on the 5th failure
+                await RequestSingleCard(1).fetch()
+            assert send_mock.call_count == 5
+
+            with pytest.raises(ApiUnavailableError):
+                await RequestSingleCard(2).fetch()
+            assert send_mock.call_count == 5
+            # the circuit of another family is still closed
+            with pytest.raises(ClientConnectionError):
+                await RequestDecks({}).post({'string': 'AAE'})
+
+    @pytest.mark.asyncio
+    async def test_cancelled_trial(self):
+        breaker = CircuitBreaker('cards', threshold=1, cooldown=0)
+        breaker.record_failure()
+        breakers['cards'] = breaker
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = hang
+            task = asyncio.create_task(RequestSingleCard(1).fetch())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            send_mock.side_effect = None
+            send_mock.return_value = {'dbf_id': 2}
+            assert (await RequestSingleCard(2).fetch()).dbf_id == 2     # the next request is the trial
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_timeout_capped_by_update_deadline(self):
+        async def fetch():
+            set_deadline(1)     # less than the total timeout of a request
+            return await RequestSingleCard(1).fetch()
+
+        with patch('app.services.api.Request.send', new_callable=AsyncMock) as send_mock:
+            send_mock.side_effect = asyncio.TimeoutError()
+            with pytest.raises(DeadlineExceeded):
+                await asyncio.create_task(fetch())     # the deadline doesn't leak into other tests
+            assert send_mock.call_count == 1
+        assert breakers['cards'].failures == 0
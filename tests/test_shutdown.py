@@ -0,0 +1,88 @@
+import asyncio
+import os
+import signal
+
+import pytest
+from unittest.mock import patch
+from aiogram import Bot, Dispatcher, types
+
+from app.services.shutdown import DrainingDispatcher, run_until_stopped
+from tests.test_streams import message_update
+
+
+async def slow_process_updates(self, updates, fast=True):
+    await asyncio.sleep(updates[0].update_id / 100)
+
+
+class TestDrainingDispatcher:
+
+    @pytest.fixture
+    def dp(self):
+        with patch.object(Dispatcher, 'process_updates', slow_process_updates):
+            yield DrainingDispatcher(Bot(token='123456:test-token'))
+
+    @pytest.mark.asyncio
+    async def test_drain(self, dp):
+        tasks = [asyncio.create_task(dp.process_updates([types.Update(**message_update(i, 1))])) for i in (1, 5)]
+        await asyncio.sleep(0)
+        assert dp.in_flight == 2
+
+        assert await dp.drain(timeout=1)
+        assert dp.in_flight == 0
+        assert all(task.done() for task in tasks)
+
+    @pytest.mark.asyncio
+    async def test_drain_timeout(self, dp):
+        task = asyncio.create_task(dp.process_updates([types.Update(**message_update(50, 1))]))
+        await asyncio.sleep(0)
+
+        assert not await dp.drain(timeout=0.01)
+        assert dp.in_flight == 1
+        await task
+        assert dp.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_idle(self, dp):
+        assert await dp.drain(timeout=0)
+
+
+class TestRunUntilStopped:
+
+    @staticmethod
+    def terminate_soon():
+        asyncio.get_running_loop().call_later(0.01, os.kill, os.getpid(), signal.SIGTERM)
+
+    @pytest.mark.asyncio
+    async def test_intake_is_cancelled(self):
+        intake = asyncio.create_task(asyncio.sleep(10))
+        self.terminate_soon()
+        await run_until_stopped(intake)
+        assert intake.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_intake_is_stopped(self):
+        finished = asyncio.Event()
+
+        async def intake():
+            await finished.wait()
+            return 'stopped'
+
+        self.terminate_soon()
+        await run_until_stopped(intake(), stop=finished.set, timeout=1)
+        assert finished.is_set()
+
+    @pytest.mark.asyncio
+    async def test_stop_timeout(self):
+        intake = asyncio.create_task(asyncio.sleep(10))
+        self.terminate_soon()
+        await run_until_stopped(intake, stop=lambda: None, timeout=0.01)
+        assert intake.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_intake_failure(self):
+        async def intake():
+            raise ConnectionError
+
+        with pytest.raises(ConnectionError):
+            await run_until_stopped(intake())
+        assert signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock
+
+from app.config import DATA_DIR, HSEntities, parse_hearthstone_data
+from app.snapshot import load_with_snapshot
+
+
+def test_snapshot_is_built_and_reused(tmp_path):
+    source = tmp_path / 'data.json'
+    snapshot = tmp_path / 'data.pickle'
+    source.write_bytes(b'{"a": 1}')
+    parse = MagicMock(return_value={'a': 1})
+
+    assert load_with_snapshot(source, snapshot, parse) == {'a': 1}
+    assert snapshot.exists()
+    assert load_with_snapshot(source, snapshot, parse) == {'a': 1}
+    parse.assert_called_once()
+
+
+def test_snapshot_is_rebuilt_when_source_changes(tmp_path):
+    source = tmp_path / 'data.json'
+    snapshot = tmp_path / 'data.pickle'
+    source.write_bytes(b'{"a": 1}')
+    load_with_snapshot(source, snapshot, lambda raw: {'a': 1})
+
+    source.write_bytes(b'{"a": 2}')
+    assert load_with_snapshot(source, snapshot, lambda raw: {'a': 2}) == {'a': 2}
+
+
+def test_broken_snapshot_is_rebuilt(tmp_path):
+    source = tmp_path / 'data.json'
+    snapshot = tmp_path / 'data.pickle'
+    source.write_bytes(b'{"a": 1}')
+    snapshot.write_bytes(b'garbage')
+    assert load_with_snapshot(source, snapshot, lambda raw: {'a': 1}) == {'a': 1}
+    assert load_with_snapshot(source, snapshot, MagicMock()) == {'a': 1}
+
+
+def test_hearthstone_data_snapshot(tmp_path):
+    source = DATA_DIR / 'hs_entities.json'
+    snapshot = tmp_path / 'hs_entities.pickle'
+    built = load_with_snapshot(source, snapshot, parse_hearthstone_data)
+    loaded = load_with_snapshot(source, snapshot, MagicMock())
+    assert isinstance(loaded, HSEntities)
+    assert loaded == built
@@ -0,0 +1,289 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.codec import codec
+from app.services.pagination import PageFlipDebouncer
+from app.services.streams import GROUP, StreamIngress, StreamWorker, owned_partitions, partition, update_chat_id
+
+
+def message_update(update_id: int, chat_id: int) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': '/cards'},
+    }
+
+
+@pytest.mark.parametrize(
+    'update,expected',
+    [
+        (message_update(1, 42), 42),
+        ({'update_id': 1, 'callback_query': {'id': '1', 'from': {'id': 7}, 'message': {'chat': {'id': 42}}}}, 42),
+        ({'update_id': 1, 'callback_query': {'id': '1', 'from': {'id': 7}, 'inline_message_id': 'x'}}, 7),
+        ({'update_id': 1, 'inline_query': {'id': '1', 'from': {'id': 7}, 'query': ''}}, 7),
+        ({'update_id': 1, 'poll': {'id': '1'}}, None),
+    ]
+)
+def test_update_chat_id(update, expected):
+    assert update_chat_id(update) == expected
+
+
+def test_partition():
+    assert partition(42, 16) == partition(42, 16) == 10
+    assert 0 <= partition(-1001234567890, 16) < 16
+    assert partition(None, 16) == 0
+
+
+def test_owned_partitions():
+    owned = [owned_partitions(index, 3, 8) for index in range(3)]
+    assert owned == [[0, 3, 6], [1, 4, 7], [2, 5]]
+    with pytest.raises(ValueError):
+        owned_partitions(3, 3, 8)
+    with pytest.raises(ValueError):
+        owned_partitions(0, 9, 8)
+
+
+@pytest.mark.asyncio
+async def test_ingress_push():
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    pipe.execute = AsyncMock()
+    redis = MagicMock()
+    redis.pipeline.return_value = pipe
+    ingress = StreamIngress(redis, prefix='updates', partitions=16, maxlen=1000)
+
+    await ingress.push([message_update(1, 42), message_update(2, 43)])
+
+    pipe.xadd.assert_any_call('updates:10', {'update': codec.dumps(message_update(1, 42))}, maxlen=1000)
+    pipe.xadd.assert_any_call('updates:11', {'update': codec.dumps(message_update(2, 43))}, maxlen=1000)
+    pipe.execute.assert_called_once()
+
+
+class FakeStream:
+    """ A stream with its consumer group, as far as the workers use them """
+
+    def __init__(self):
+        self.entries: list[tuple[str, dict]] = []
+        self.delivered = 0     # the last entry delivered to the group
+        self.pending: dict[str, tuple[str, float]] = {}    # entry -> consumer, delivery time
+
+    @staticmethod
+    def number(entry_id: str) -> int:
+        return int(entry_id.lstrip('(').split('-')[0])
+
+    def add(self, fields: dict) -> str:
+        entry_id = f'{len(self.entries) + 1}-0'
+        self.entries.append((entry_id, fields))
+        return entry_id
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, last_id), = streams.items()
+        if last_id == '>':
+            entries = self.entries[self.delivered:self.delivered + count]
+            self.delivered += len(entries)
+            for entry_id, _ in entries:
+                self.pending[entry_id] = consumer, time.monotonic()
+            if not entries:
+                await asyncio.sleep(0.01)
+        else:
+            entries = [(entry_id, fields) for entry_id, fields in self.entries
+                       if entry_id in self.pending and self.pending[entry_id][0] == consumer
+                       and self.number(entry_id) > self.number(last_id)][:count]
+        return [[stream, entries]] if entries else []
+
+    async def xpending_range(self, stream, group, min, max, count):
+        after = self.number(min) if min.startswith('(') else 0
+        return [
+            {'message_id': entry_id, 'consumer': consumer, 'times_delivered': 1,
+             'time_since_delivered': int((time.monotonic() - delivered_at) * 1000)}
+            for entry_id, (consumer, delivered_at) in sorted(self.pending.items(), key=lambda i: self.number(i[0]))
+            if self.number(entry_id) > after
+        ][:count]
+
+    async def xclaim(self, stream, group, consumer, min_idle_time, message_ids, justid=False):
+        claimed = []
+        for entry_id in message_ids:
+            owner, delivered_at = self.pending[entry_id]
+            if (time.monotonic() - delivered_at) * 1000 >= min_idle_time:
+                self.pending[entry_id] = consumer, time.monotonic()
+                claimed.append(entry_id)
+        return claimed
+
+    async def xack(self, stream, group, entry_id):
+        self.pending.pop(entry_id, None)
+
+
+class TestStreamWorker:
+
+    @staticmethod
+    def entry(entry_id: str, chat_id: int) -> tuple[str, dict]:
+        return entry_id, {'update': codec.dumps(message_update(int(entry_id[0]), chat_id))}
+
+    @pytest.mark.asyncio
+    async def test_pending_then_new(self):
+        redis = AsyncMock()
+        redis.xreadgroup.side_effect = [
+            [['updates:0', [self.entry('1-0', 16)]]],   # left pending by the previous run
+            [['updates:0', []]],
+            [['updates:0', [self.entry('2-0', 16), self.entry('3-0', 32)]]],
+            asyncio.CancelledError,
+        ]
+        dp = AsyncMock()
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0')
+
+        with pytest.raises(asyncio.CancelledError):
+            await worker.consume('updates:0')
+        await worker.wait_handled()
+
+        read_ids = [c.args[2]['updates:0'] for c in redis.xreadgroup.call_args_list]
+        assert read_ids == ['0', '1-0', '>', '>']
+        handled = [c.args[0][0].update_id for c in dp.process_updates.call_args_list]
+        assert sorted(handled) == [1, 2, 3]
+        assert handled.index(1) < handled.index(2)     # the same chat
+        assert sorted(c.args for c in redis.xack.call_args_list) == [
+            ('updates:0', GROUP, '1-0'), ('updates:0', GROUP, '2-0'), ('updates:0', GROUP, '3-0'),
+        ]
+
+    @staticmethod
+    def reads(*responses):
+        """ ``xreadgroup`` returning the responses, then nothing, waiting like a blocking read """
+        responses = iter(responses)
+
+        async def xreadgroup(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return next(responses, [])
+        return xreadgroup
+
+    @pytest.mark.asyncio
+    async def test_stop(self):
+        redis = AsyncMock()
+        redis.xreadgroup.side_effect = self.reads(
+            [['updates:0', []]],
+            [['updates:0', [self.entry('1-0', 16), self.entry('2-0', 16), self.entry('3-0', 32)]]],
+        )
+        dp = AsyncMock()
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0')
+        dp.process_updates.side_effect = lambda updates: worker.stop()
+
+        await worker.consume('updates:0')
+        await worker.wait_handled()
+
+        assert [c.args[2] for c in redis.xack.call_args_list] == ['1-0']    # the rest stays pending
+
+    @pytest.mark.asyncio
+    async def test_chats_are_handled_concurrently(self):
+        redis = AsyncMock()
+        redis.xreadgroup.side_effect = self.reads(
+            [['updates:0', []]],
+            [['updates:0', [self.entry('1-0', 16), self.entry('2-0', 16), self.entry('3-0', 32)]]],
+        )
+        events = []
+
+        async def process_updates(updates):
+            update_id = updates[0].update_id
+            events.append(f'start {update_id}')
+            await asyncio.sleep(0.05 if update_id == 1 else 0)
+            events.append(f'end {update_id}')
+
+        dp = AsyncMock()
+        dp.process_updates.side_effect = process_updates
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0', concurrency=2)
+        consumer = asyncio.create_task(worker.consume('updates:0'))
+        await asyncio.sleep(0.1)
+        worker.stop()
+        await consumer
+        await worker.wait_handled()
+
+        assert events == ['start 1', 'start 3', 'end 3', 'end 1', 'start 2', 'end 2']
+        assert [c.args[2] for c in redis.xack.call_args_list] == ['3-0', '1-0', '2-0']
+
+    @staticmethod
+    def flip(entry_id: str, chat_id: int) -> tuple[str, dict]:
+        update = {'update_id': int(entry_id[0]), 'callback_query': {
+            'id': entry_id, 'from': {'id': 7}, 'chat_instance': '1', 'data': 'right',
+            'message': {'message_id': 1, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}},
+        }}
+        return entry_id, {'update': codec.dumps(update)}
+
+    async def run_worker(self, worker: StreamWorker, seconds: float):
+        consumer = asyncio.create_task(worker.consume('updates:0'))
+        await asyncio.sleep(seconds)
+        worker.stop()
+        await consumer
+        await worker.wait_handled()
+
+    @pytest.mark.asyncio
+    async def test_callback_queries_are_serialized(self):
+        redis = AsyncMock()
+        redis.xreadgroup.side_effect = self.reads(
+            [['updates:0', []]],
+            [['updates:0', [self.entry('1-0', 16), self.flip('2-0', 16)]]],
+        )
+        events = []
+
+        async def process_updates(updates):
+            events.append(f'start {updates[0].update_id}')
+            await asyncio.sleep(0.02)
+            events.append(f'end {updates[0].update_id}')
+
+        dp = AsyncMock()
+        dp.process_updates.side_effect = process_updates
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0')
+        await self.run_worker(worker, 0.1)
+
+        assert events == ['start 1', 'end 1', 'start 2', 'end 2']
+
+    @pytest.mark.asyncio
+    async def test_page_flips_are_coalesced(self):
+        redis = AsyncMock()
+        redis.xreadgroup.side_effect = self.reads(
+            [['updates:0', []]],
+            [['updates:0', [self.flip('1-0', 16), self.flip('2-0', 16), self.flip('3-0', 16)]]],
+        )
+        debouncer = PageFlipDebouncer(window=0.05)
+        offsets = []
+
+        async def process_updates(updates):
+            offsets.append(await debouncer.push((16, 1), 1))
+
+        dp = AsyncMock()
+        dp.process_updates.side_effect = process_updates
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0')
+        await self.run_worker(worker, 0.15)
+
+        assert offsets == [None, None, 3]   # the first flip steps aside for the next ones and applies all of them
+        assert sorted(c.args[2] for c in redis.xack.call_args_list) == ['1-0', '2-0', '3-0']
+
+    @pytest.mark.asyncio
+    async def test_failed_update_is_acknowledged(self):
+        redis = AsyncMock()
+        dp = AsyncMock()
+        dp.process_updates.side_effect = RuntimeError
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0')
+        await worker.handle('updates:0', '1-0', self.entry('1-0', 16)[1])
+        redis.xack.assert_called_with('updates:0', GROUP, '1-0')
+
+    @pytest.mark.asyncio
+    async def test_setup_existing_group(self):
+        redis = AsyncMock()
+        redis.xgroup_create.side_effect = Exception('BUSYGROUP Consumer Group name already exists')
+        worker = StreamWorker(AsyncMock(), redis, 'updates', partitions=[0, 2], consumer='worker-0')
+        await worker.setup()
+        assert redis.xgroup_create.call_count == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('claim_idle,handled', [(0, [1]), (60000, [])])
+    async def test_entries_of_another_consumer_are_claimed(self, claim_idle, handled):
+        redis = FakeStream()
+        redis.add(self.entry('1-0', 16)[1])
+        await redis.xreadgroup(GROUP, 'worker-retired', {'updates:0': '>'}, count=10)     # and never acknowledged
+        dp = AsyncMock()
+        worker = StreamWorker(dp, redis, 'updates', partitions=[0], consumer='worker-0', claim_idle=claim_idle)
+
+        await self.run_worker(worker, 0.05)
+
+        assert [c.args[0][0].update_id for c in dp.process_updates.call_args_list] == handled
+        assert bool(redis.pending) != bool(handled)
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.handler import SkipHandler, current_handler
+
+from app.middlewares.tracing import TracingMiddleware
+from app.services.api import RequestSingleCard, breakers
+from app.services.messages import CardListInfo
+from app.services.storage import StorageProxy
+from app.services.tracing import tracer, current_span, InMemoryExporter, SlowUpdateLogger, breakdown
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter(only_sampled=False)
+    tracer.configure(sample_rate=1.0, exporters=[exporter])
+    breakers.clear()
+    yield exporter
+    tracer.configure(sample_rate=0.0, exporters=[])
+    breakers.clear()
+
+
+async def process_update(work, update_id: int = 1):
+    """ Pass the update through the middleware in a separate task, like the dispatcher does """
+    async def decks_handler():
+        await work()
+
+    async def process():
+        middleware = TracingMiddleware()
+        update = types.Update(update_id=update_id, message={'message_id': 1})
+        update_data, message_data = {}, {}
+        await middleware.on_pre_process_update(update, update_data)
+        current_handler.set(decks_handler)
+        await middleware.on_process_message(update.message, message_data)
+        await decks_handler()
+        await middleware.on_post_process_message(update.message, [], message_data)
+        await middleware.on_post_process_update(update, [], update_data)
+
+    await asyncio.create_task(process())
+
+
+class TestTracer:
+
+    @pytest.mark.asyncio
+    async def test_span_tree(self, exporter, card_list_data):
+        storage = StorageProxy(MemoryStorage())
+
+        async def work():
+            await storage.get_data(chat=1, user=1)
+            with patch('app.services.api.Request.send', new_callable=AsyncMock, return_value={}):
+                await RequestSingleCard(1).fetch()
+            CardListInfo(card_list_data).as_text()
+
+        await process_update(work)
+        trace, = exporter.traces
+        names = [(span.depth, span.name) for span in trace.spans]
+        assert names == [
+            (0, 'update'),
+            (1, 'handler'),
+            (2, 'storage.get_data'),
+            (2, 'api.RequestSingleCard'),
+            (2, 'CardListInfo.as_text'),
+        ]
+        root, handler = trace.spans[:2]
+        assert root.attributes == {'update_id': 1, 'update_type': 'message'}
+        assert handler.attributes == {'handler': 'decks_handler'}
+        assert all(span.end_time is not None for span in trace.spans)
+        assert len({span.trace.trace_id for span in trace.spans}) == 1
+
+    @pytest.mark.asyncio
+    async def test_error_is_recorded(self, exporter):
+        async def work():
+            with patch('app.services.api.Request.send', new_callable=AsyncMock, side_effect=ValueError('boom')):
+                with pytest.raises(ValueError):
+                    await RequestSingleCard(1).fetch()
+
+        await process_update(work)
+        span = exporter.traces[0].spans[-1]
+        assert span.error == "ValueError('boom')"
+        assert span.to_otlp()['status'] == {'code': 2, 'message': "ValueError('boom')"}
+
+    @pytest.mark.asyncio
+    async def test_current_span_restored(self, exporter):
+        async def work():
+            handler_span = current_span.get()
+            with tracer.span('inner') as span:
+                assert current_span.get() is span
+            assert current_span.get() is handler_span
+
+        await process_update(work)
+        assert current_span.get() is None
+
+    @pytest.mark.asyncio
+    async def test_skipped_handler_span_is_ended(self, exporter):
+        dp = Dispatcher(Bot(token='123456:test-token'))
+        dp.middleware.setup(TracingMiddleware())
+
+        async def skipping_handler(message: types.Message):
+            raise SkipHandler
+
+        async def decks_handler(message: types.Message):
+            assert current_span.get().parent.name == 'update'
+
+        dp.register_message_handler(skipping_handler)
+        dp.register_message_handler(decks_handler)
+        await dp.process_updates([types.Update(update_id=1, message={
+            'message_id': 1,
+            'text': 'hi',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'A'},
+        })])
+
+        trace, = exporter.traces
+        names = [(span.depth, span.name, span.attributes) for span in trace.spans]
+        assert names == [
+            (0, 'update', {'update_id': 1, 'update_type': 'message'}),
+            (1, 'handler', {'handler': 'skipping_handler', 'skipped': True}),
+            (1, 'handler', {'handler': 'decks_handler'}),
+        ]
+        assert all(span.end_time is not None for span in trace.spans)
+
+    @pytest.mark.asyncio
+    async def test_no_span_outside_update(self, exporter):
+        with tracer.span('orphan') as span:
+            assert span is None
+        assert exporter.traces == []
+
+    @pytest.mark.asyncio
+    async def test_sampling(self):
+        sampled = InMemoryExporter()
+        tracer.configure(sample_rate=0.0, exporters=[sampled])
+        try:
+            await process_update(AsyncMock())
+            assert tracer.start_trace('update') is None
+            tracer.configure(sample_rate=1.0, exporters=[sampled])
+            await process_update(AsyncMock())
+        finally:
+            tracer.configure(sample_rate=0.0, exporters=[])
+        assert len(sampled.traces) == 1
+
+    @pytest.mark.asyncio
+    async def test_unsampled_traces_reach_every_update_exporters(self):
+        sampled, every = InMemoryExporter(), InMemoryExporter(only_sampled=False)
+        tracer.configure(sample_rate=0.0, exporters=[sampled, every])
+        try:
+            await process_update(AsyncMock())
+        finally:
+            tracer.configure(sample_rate=0.0, exporters=[])
+        assert sampled.traces == []
+        assert len(every.traces) == 1
+
+    @pytest.mark.asyncio
+    async def test_otlp_encoding(self, exporter):
+        await process_update(AsyncMock(), update_id=7)
+        root, handler = (span.to_otlp() for span in exporter.traces[0].spans)
+        assert 'parentSpanId' not in root
+        assert handler['parentSpanId'] == root['spanId']
+        assert handler['traceId'] == root['traceId'] and len(root['traceId']) == 32
+        assert {'key': 'update_id', 'value': {'intValue': '7'}} in root['attributes']
+        assert int(root['endTimeUnixNano']) >= int(root['startTimeUnixNano'])
+
+
+class TestSlowUpdateLogger:
+
+    @pytest.mark.asyncio
+    async def test_slow_update_is_logged(self, caplog):
+        tracer.configure(sample_rate=0.0, exporters=[SlowUpdateLogger(threshold=0.01)])
+
+        async def work():
+            with tracer.span('storage.get_data'):
+                await asyncio.sleep(0.02)
+
+        try:
+            with caplog.at_level(logging.WARNING, logger='app'):
+                await process_update(work)
+        finally:
+            tracer.configure(sample_rate=0.0, exporters=[])
+        record, = caplog.records
+        lines = record.getMessage().splitlines()
+        assert lines[0].startswith('Slow update')
+        assert lines[1].startswith('update ')
+        assert lines[2].startswith('  handler ') and 'handler=decks_handler' in lines[2]
+        assert lines[3].startswith('    storage.get_data ')
+
+    @pytest.mark.asyncio
+    async def test_fast_update_is_not_logged(self, caplog):
+        tracer.configure(sample_rate=0.0, exporters=[SlowUpdateLogger(threshold=10)])
+        try:
+            with caplog.at_level(logging.WARNING, logger='app'):
+                await process_update(AsyncMock())
+        finally:
+            tracer.configure(sample_rate=0.0, exporters=[])
+        assert caplog.records == []
+
+    @pytest.mark.asyncio
+    async def test_breakdown(self, exporter):
+        await process_update(AsyncMock())
+        assert breakdown(exporter.traces[0]).splitlines()[1].startswith('  handler ')
@@ -1,8 +1,13 @@
 import pytest
 import asynctest
 from unittest.mock import AsyncMock, patch
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher import FSMContext
 
 from app.services import utils
+from app.services.models import Deck
+from app.services.storage import StorageProxy
+from app.states import BuildCardRequest
 from app.exceptions import DeckstringError
 
 
@@ -35,21 +40,20 @@ def test_paginate_list(lst, n, expected):
 
 
 @pytest.mark.parametrize(
-    'direction,current,npages,expected',
+    'current,offset,npages,expected',
     [
-        ('right', 3, 5, 4),
-        ('left', 3, 5, 2),
-        ('right', 5, 5, 1),
-        ('left', 1, 5, 5),
-        ('right', 6, 7, 7),
-        ('left', 2, 10, 1),
+        (3, 1, 5, 4),
+        (3, -1, 5, 2),
+        (5, 1, 5, 1),
+        (1, -1, 5, 5),
+        (2, 7, 5, 4),
+        (2, -7, 5, 5),
+        (4, 0, 5, 4),
+        (1, 1, 0, 1),
     ]
 )
-def test_flip_page(direction, current, npages, expected):
-    with pytest.raises(ValueError):
-        utils.flip_page(direction='up', current_page=1, npages=2)
-
-    assert utils.flip_page(direction, current, npages) == expected
+def test_shift_page(current, offset, npages, expected):
+    assert utils.shift_page(current, offset, npages) == expected
 
 
 def test_extract_deckstring(decklist_from_game, pure_deckstring):
@@ -94,10 +98,23 @@ async def test_deck_decode(pure_deckstring, deck_detail_data):
 
     with asynctest.patch('app.services.utils.RequestDecks.post') as api_mock, \
             patch('app.services.answer_builders.DeckAnswerBuilder.deck_detail') as builder_mock:
-        api_mock.return_value = deck_detail_data
+        api_mock.return_value = Deck.from_api(deck_detail_data['deck_detail'])
         await utils.deck_decode(message=message_mock, state=context_mock, deckstring=pure_deckstring)
 
         api_mock.assert_called_with({'string': pure_deckstring})
-        context_mock.update_data.assert_called_with(deck_detail=deck_detail_data)
+        context_mock.update_data.assert_called_with(
+            deck_detail=Deck.from_api(deck_detail_data['deck_detail']).as_dict(),
+            deck_detail_outdated=None,
+        )
         builder_mock.assert_called_with()
         message_mock.reply.assert_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('storage', [MemoryStorage(), StorageProxy(MemoryStorage())])
+async def test_transition(storage):
+    state = FSMContext(storage=storage, chat=1, user=1)
+    await state.update_data(name='Ragnaros')
+    await utils.transition(state, BuildCardRequest.wait_name, card_prompt_msg_id=5)
+    assert await state.get_state() == BuildCardRequest.wait_name.state
+    assert await state.get_data() == {'name': 'Ragnaros', 'card_prompt_msg_id': 5}
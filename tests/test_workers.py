@@ -0,0 +1,54 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.codec import codec
+from app.services.workers import WorkerPool, serve_pipe
+from tests.test_streams import message_update
+
+
+def record_batches(index: int, connection):
+    """ Child writing the update ids it receives to a file """
+    received = []
+    while True:
+        try:
+            batch = json.loads(connection.recv_bytes())
+        except EOFError:
+            break
+        received.extend(update['update_id'] for update in batch)
+    Path(os.environ['WORKERS_TEST_DIR'], f'{index}.json').write_text(json.dumps(received))
+
+
+def test_pool_chat_affinity(tmp_path, monkeypatch):
+    monkeypatch.setenv('WORKERS_TEST_DIR', str(tmp_path))
+    pool = WorkerPool(2, target=record_batches)
+    pool.start()
+    try:
+        asyncio.run(pool.push([message_update(1, 10), message_update(2, 11), message_update(3, 10)]))
+        asyncio.run(pool.push([message_update(4, 11), message_update(5, 12)]))
+    finally:
+        pool.stop(timeout=30)
+
+    assert json.loads((tmp_path / '0.json').read_text()) == [1, 3, 5]
+    assert json.loads((tmp_path / '1.json').read_text()) == [2, 4]
+    assert not any(process.is_alive() for process in pool.processes)
+
+
+@pytest.mark.asyncio
+async def test_serve_pipe():
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    sender.send_bytes(codec.dumps([message_update(1, 10), message_update(2, 10)]).encode())
+    sender.send_bytes(codec.dumps([message_update(3, 10)]).encode())
+    sender.close()
+    dp = AsyncMock()
+
+    await serve_pipe(receiver, dp)
+    await asyncio.sleep(0)      # the batches are processed without waiting for them
+
+    batches = [[update.update_id for update in c.args[0]] for c in dp.process_updates.call_args_list]
+    assert batches == [[1, 2], [3]]